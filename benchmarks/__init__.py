@@ -0,0 +1 @@
+# Marks the 'benchmarks' directory as a Python package
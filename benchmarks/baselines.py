@@ -0,0 +1,68 @@
+"""The code paths that optimized commands replaced, kept to benchmark against."""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+import discord
+
+from cogs.candyspin import CANDY_ITEMS, RESET_HOURS, SPINS_PER_CYCLE
+
+# CandySpin.spin before it became one statement: ensure the row, check for a
+# reset, read it, update it and read it again, each on its own connection
+ENSURE_SPIN_ROW = (
+    "INSERT INTO spins (user_id, total_points, spins_used, last_spin, weekly_points) "
+    "VALUES ($1, 0, 0, '2000-01-01 00:00:00', 0) ON CONFLICT (user_id) DO NOTHING"
+)
+FETCH_SPIN_ROW = "SELECT * FROM spins WHERE user_id = $1"
+RESET_SPINS = "UPDATE spins SET spins_used = 0 WHERE user_id = $1"
+UPDATE_AFTER_SPIN = (
+    "UPDATE spins SET total_points = total_points + $1, weekly_points = weekly_points + $1, "
+    "spins_used = spins_used + 1, last_spin = $2 WHERE user_id = $3"
+)
+
+
+async def _execute(pool, query: str, *args) -> None:
+    async with pool.acquire() as conn:
+        await conn.execute(query, *args)
+
+
+async def _fetch_row(pool, user_id: int):
+    async with pool.acquire() as conn:
+        return await conn.fetchrow(FETCH_SPIN_ROW, user_id)
+
+
+async def spin(ctx, pool, pick: int) -> None:
+    """The old ``z!spin``, minus the participation role; ``pick`` chooses the candy."""
+    user_id = ctx.author.id
+    now = datetime.utcnow()
+
+    await _execute(pool, ENSURE_SPIN_ROW, user_id)
+    row = await _fetch_row(pool, user_id)
+    if row is None:
+        await _execute(pool, ENSURE_SPIN_ROW, user_id)
+    elif now - row["last_spin"] >= timedelta(hours=RESET_HOURS) and row["spins_used"] > 0:
+        await _execute(pool, RESET_SPINS, user_id)
+
+    row = await _fetch_row(pool, user_id)
+    if row["spins_used"] >= SPINS_PER_CYCLE:
+        await ctx.send("🍭 You’ve used all your spins!")
+        return
+
+    item, pts = CANDY_ITEMS[pick % len(CANDY_ITEMS)]
+    await _execute(pool, UPDATE_AFTER_SPIN, pts, now, user_id)
+    row = await _fetch_row(pool, user_id)
+    embed = discord.Embed(
+        description=f"🎉 {ctx.author.mention} spun and got **{item}** worth **{pts} points!**\n"
+                    f"({row['spins_used']}/{SPINS_PER_CYCLE} spins used)",
+        color=0xFFB6C1,
+    )
+    await ctx.send(embed=embed)
+
+
+def substring_counts(messages: Iterable, terms: List[str]) -> Dict[str, int]:
+    """Fun.scan before the term matcher: one lowercased substring test per term and message."""
+    counts = dict.fromkeys(terms, 0)
+    for message in messages:
+        for word in terms:
+            if word.lower() in message.content.lower():
+                counts[word] += 1
+    return counts
@@ -0,0 +1,163 @@
+import datetime
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+import discord
+
+
+class FakeMember:
+    def __init__(self, user_id: int, name: Optional[str] = None, bot: bool = False):
+        self.id = user_id
+        self.display_name = name or f"user{user_id}"
+        self.name = self.display_name
+        self.mention = f"<@{user_id}>"
+        self.bot = bot
+        self.avatar = None
+        self.roles: List[discord.Role] = []
+
+    async def add_roles(self, *roles, **kwargs) -> None:
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles, **kwargs) -> None:
+        self.roles = [r for r in self.roles if r not in roles]
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.roles: List[discord.Role] = []
+        self.members: Dict[int, FakeMember] = {}
+        self.filesize_limit = discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+    def member(self, user_id: int) -> FakeMember:
+        member = self.members.get(user_id)
+        if member is None:
+            member = self.members[user_id] = FakeMember(user_id)
+        return member
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self.members.get(user_id)
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, content: str, author: FakeMember, channel: "FakeChannel", **kwargs):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.embed = kwargs.get("embed")
+        self.view = kwargs.get("view")
+        self.attachments = []
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        return discord.utils.snowflake_time(self.id)
+
+    async def edit(self, **kwargs) -> "FakeMessage":
+        if "content" in kwargs:
+            self.content = kwargs["content"]
+        return self
+
+    async def delete(self, **kwargs) -> None:
+        pass
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    """
+    A text channel whose history is a fixed list of messages and whose
+    sends are only counted, so commands run without Discord.
+    """
+
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.sent = 0
+        self._history: List[FakeMessage] = []
+        self._ids: List[int] = []
+        self._next_id = discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+
+    def fill_history(self, messages: List[FakeMessage]) -> None:
+        self._history = sorted(messages, key=lambda m: m.id)
+        self._ids = [m.id for m in self._history]
+
+    @property
+    def messages(self) -> List[FakeMessage]:
+        """The history, oldest first."""
+        return self._history
+
+    async def history(
+        self,
+        limit: Optional[int] = 100,
+        before=None,
+        after=None,
+        oldest_first: Optional[bool] = None,
+        **kwargs,
+    ):
+        lo = bisect_right(self._ids, after.id) if after is not None else 0
+        hi = bisect_left(self._ids, before.id) if before is not None else len(self._ids)
+        if oldest_first is None:
+            oldest_first = after is not None
+        window = self._history[lo:hi]
+        if oldest_first:
+            picked = window[:limit] if limit is not None else window
+        else:
+            picked = window[::-1][:limit] if limit is not None else window[::-1]
+        for message in picked:
+            yield message
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        self.sent += 1
+        self._next_id += 1
+        return FakeMessage(self._next_id, content or "", self.guild.member(0), self, **kwargs)
+
+    def typing(self) -> _Typing:
+        return _Typing()
+
+
+class FakeContext:
+    """The parts of ``commands.Context`` the cogs use: author, guild, channel and sending."""
+
+    def __init__(self, bot, author: FakeMember, channel: FakeChannel):
+        self.bot = bot
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.message = FakeMessage(0, "", author, channel)
+        self.prefix = bot.command_prefix
+        self.interaction = None
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+    async def reply(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+    def typing(self) -> _Typing:
+        return _Typing()
+
+
+class FakeBot:
+    """Just enough of the bot for the cogs' constructors and callbacks."""
+
+    def __init__(self, pool, handler, word_index=None, command_prefix: str = "z!"):
+        self.db_pool = pool
+        self.db_handler = handler
+        self.word_index = word_index
+        self.scheduler = None
+        self.command_prefix = command_prefix
+
+    async def wait_until_ready(self) -> None:
+        pass
+
+    def get_channel(self, channel_id: int):
+        return None
@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+import heapq
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks import baselines
+from core import queries
+
+
+class MemoryDatabase:
+    """
+    In-memory stand-in for ``DatabaseHandler``, with the same results as
+    its statements for the calls the benchmarked commands make. Every call
+    suspends once (``latency`` seconds, 0 by default) like a round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.cache = None
+        self.ledger = None
+        self.users: Dict[int, Dict] = {}
+        self.spins: Dict[int, Dict] = {}
+        self.bets: List[Tuple[int, str, int, int, str]] = []
+
+    async def _round_trip(self) -> None:
+        await asyncio.sleep(self.latency)
+
+    def _user(self, user_id: int) -> Dict:
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = {
+                "points": 0,
+                "daily_count": 0,
+                "last_daily": datetime.datetime(2000, 1, 1),
+            }
+        return user
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_user_balance(self, user_id: int) -> Dict:
+        await self._round_trip()
+        user = self._user(user_id)
+        return {"points": user["points"], "daily_count": user["daily_count"], "last_daily": user["last_daily"]}
+
+    async def add_points(self, user_id: int, amount: int, reason: str = "add") -> int:
+        await self._round_trip()
+        user = self._user(user_id)
+        user["points"] += amount
+        return user["points"]
+
+    async def reduce_points(self, user_id: int, amount: int, reason: str = "reduce") -> int:
+        return await self.add_points(user_id, -amount, reason)
+
+    async def process_daily_claim(self, user_id, daily_amount: int, interest_rate: float, cooldown: int):
+        await self._round_trip()
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        user = self._user(user_id)
+        remaining = (user["last_daily"] + datetime.timedelta(seconds=cooldown) - now).total_seconds()
+        if remaining > 0:
+            return False, 0, 0, 0, remaining
+        bonus = round(daily_amount * (1 + interest_rate) ** user["daily_count"])
+        streak = user["daily_count"]
+        user["points"] += bonus
+        user["daily_count"] += 1
+        user["last_daily"] = now
+        return True, bonus, user["points"], streak, None
+
+    async def transfer_point(self, src_user_id: int, end_user_id: int, amount: int) -> Tuple[bool, Optional[int]]:
+        await self._round_trip()
+        src = self._user(src_user_id)
+        if src["points"] < amount:
+            return True, None
+        src["points"] -= amount
+        self._user(end_user_id)["points"] += amount
+        return True, src["points"]
+
+    async def settle_bets(self, user_id: int, game: str, wager: int, plays: List[Tuple[int, str]]) -> Optional[int]:
+        await self._round_trip()
+        user = self._user(user_id)
+        if user["points"] < wager * len(plays):
+            return None
+        user["points"] += sum(payout for payout, _ in plays) - wager * len(plays)
+        self.bets.extend((user_id, game, wager, payout, outcome) for payout, outcome in plays)
+        return user["points"]
+
+    async def spin(self, user_id: int, points: int, now: datetime.datetime, spins_per_cycle: int, reset_hours: int):
+        await self._round_trip()
+        row = self.spins.get(user_id)
+        if row is None:
+            row = self.spins[user_id] = {
+                "total_points": points,
+                "spins_used": 1,
+                "last_spin": now,
+                "weekly_points": points,
+            }
+            return {"spun": True, **row}
+        expired = row["last_spin"] <= now - datetime.timedelta(hours=reset_hours)
+        if row["spins_used"] >= spins_per_cycle and not expired:
+            return {"spun": False, **row}
+        row["total_points"] += points
+        row["weekly_points"] += points
+        row["spins_used"] = 1 if expired else row["spins_used"] + 1
+        row["last_spin"] = now
+        return {"spun": True, **row}
+
+    async def load_spins(self, rows: List[Tuple[int, int, int, datetime.datetime, int]]) -> None:
+        for user_id, total_points, spins_used, last_spin, weekly_points in rows:
+            self.spins[user_id] = {
+                "total_points": total_points,
+                "spins_used": spins_used,
+                "last_spin": last_spin,
+                "weekly_points": weekly_points,
+            }
+
+    def _top(self, column: str, limit: int, positive: bool = False) -> List[Dict]:
+        rows = heapq.nsmallest(
+            limit, ((-row[column], user_id) for user_id, row in self.spins.items() if row[column] > 0 or not positive)
+        )
+        return [{"user_id": user_id, column: -score} for score, user_id in rows]
+
+    async def get_spin_leaderboard(self, limit: int) -> List[Dict]:
+        await self._round_trip()
+        return self._top("total_points", limit)
+
+    async def get_weekly_spin_leaderboard(self, limit: int) -> List[Dict]:
+        await self._round_trip()
+        return self._top("weekly_points", limit, positive=True)
+
+    async def get_weekly_spin_participants(self) -> List[int]:
+        await self._round_trip()
+        return [user_id for user_id, row in self.spins.items() if row["weekly_points"] > 0]
+
+    async def reset_weekly_spin_points(self) -> None:
+        await self._round_trip()
+        for row in self.spins.values():
+            row["weekly_points"] = 0
+
+
+class _MemoryConnection:
+    def __init__(self, pool: "MemoryPool"):
+        self.pool = pool
+
+    async def add_listener(self, channel: str, callback) -> None:
+        self.pool.listeners.append(callback)
+
+    async def remove_listener(self, channel: str, callback) -> None:
+        self.pool.listeners.remove(callback)
+
+    async def execute(self, query: str, *args):
+        return await self.pool.execute(query, *args)
+
+    async def fetchrow(self, query: str, *args):
+        return await self.pool.fetchrow(query, *args)
+
+    def is_closed(self) -> bool:
+        return False
+
+
+class _MemoryAcquire:
+    def __init__(self, pool: "MemoryPool"):
+        self.pool = pool
+
+    async def __aenter__(self) -> _MemoryConnection:
+        return _MemoryConnection(self.pool)
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+class MemoryPool:
+    """
+    Answers the memetics page queries from a list, for ``MemeticsPages``,
+    and the baseline spin statements from the ``MemoryDatabase`` spins.
+    """
+
+    def __init__(self, memetics: List[Dict], latency: float = 0.0, spins: Optional[Dict[int, Dict]] = None):
+        # Sorted by id, like the keyset the real table is paged on
+        self.memetics = sorted(memetics, key=lambda r: r["id"])
+        self._ids = [r["id"] for r in self.memetics]
+        self.latency = latency
+        self.spins = spins if spins is not None else {}
+        self.listeners = []
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _MemoryAcquire:
+        return _MemoryAcquire(self)
+
+    async def execute(self, query: str, *args) -> str:
+        await asyncio.sleep(self.latency)
+        if query == baselines.ENSURE_SPIN_ROW:
+            (user_id,) = args
+            self.spins.setdefault(user_id, {
+                "total_points": 0,
+                "spins_used": 0,
+                "last_spin": datetime.datetime(2000, 1, 1),
+                "weekly_points": 0,
+            })
+            return "INSERT 0 1"
+        if query == baselines.RESET_SPINS:
+            (user_id,) = args
+            self.spins[user_id]["spins_used"] = 0
+            return "UPDATE 1"
+        if query == baselines.UPDATE_AFTER_SPIN:
+            points, now, user_id = args
+            row = self.spins[user_id]
+            row["total_points"] += points
+            row["weekly_points"] += points
+            row["spins_used"] += 1
+            row["last_spin"] = now
+            return "UPDATE 1"
+        raise NotImplementedError(query)
+
+    async def fetchrow(self, query: str, *args):
+        await asyncio.sleep(self.latency)
+        if query == baselines.FETCH_SPIN_ROW:
+            (user_id,) = args
+            row = self.spins.get(user_id)
+            return None if row is None else {"user_id": user_id, **row}
+        raise NotImplementedError(query)
+
+    async def fetch(self, query: str, *args):
+        await asyncio.sleep(self.latency)
+        if query == queries.MEMETICS_PAGE:
+            after, skip, limit = args
+            start = bisect_right(self._ids, after) + skip
+            return self.memetics[start:start + limit]
+        raise NotImplementedError(query)
+
+    async def fetchval(self, query: str, *args):
+        await asyncio.sleep(self.latency)
+        if query == queries.COUNT_MEMETICS:
+            return len(self.memetics)
+        raise NotImplementedError(query)
@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import discord
+
+from benchmarks.fakes import FakeBot, FakeChannel, FakeContext, FakeGuild, FakeMessage
+from benchmarks.memory_db import MemoryDatabase, MemoryPool
+from benchmarks.scenarios import HISTORY_WORDS, SCENARIOS, USER_BASE, Scenario
+from cogs.candyspin import CandySpin
+from cogs.economy import Economy
+from cogs.fun import Fun
+from cogs.gamba import Gamba
+from cogs.memetics import Memetics
+
+CHANNEL_ID = USER_BASE
+GUILD_ID = USER_BASE
+MEMETICS_ROWS = 500
+HISTORY_MESSAGES = 5000
+HISTORY_AUTHORS = 50
+SPIN_COLUMNS = ["user_id", "total_points", "spins_used", "last_spin", "weekly_points"]
+
+
+@dataclass
+class Result:
+    ops: int
+    concurrency: int
+    errors: int
+    seconds: float
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    max_ms: float
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def memetics_rows() -> List[Dict]:
+    return [
+        {"id": k + 1, "name": f"bench-{k}", "icon": "🧠", "description": f"Benchmark memetic number {k}."}
+        for k in range(MEMETICS_ROWS)
+    ]
+
+
+def history(channel: FakeChannel, seed: int) -> List[FakeMessage]:
+    """Human messages from the last month, older than the word index's session start."""
+    rng = random.Random(seed)
+    start = discord.utils.time_snowflake(
+        datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+    )
+    messages = []
+    for k in range(HISTORY_MESSAGES):
+        author = channel.guild.member(USER_BASE + rng.randrange(HISTORY_AUTHORS))
+        content = " ".join(rng.choices(HISTORY_WORDS, k=rng.randint(1, 8)))
+        messages.append(FakeMessage(start + k * (1 << 22), content, author, channel))
+    return messages
+
+
+class BenchEnv:
+    """The cogs under test, built on a fake bot over either Postgres or the in-memory stand-in."""
+
+    def __init__(self, bot: FakeBot, load_spins, close=None):
+        self.bot = bot
+        self.handler = bot.db_handler
+        self.guild = FakeGuild(GUILD_ID)
+        self.channel = FakeChannel(CHANNEL_ID, self.guild)
+        self.channel.name = "bench"
+        self.economy = Economy(bot)
+        self.candy = CandySpin(bot)
+        self.memetics = Memetics(bot)
+        self.fun = Fun(bot)
+        self.gamba = Gamba(bot)
+        self.load_spins = load_spins
+        self.leaderboard_loaded = False
+        self._close = close
+
+    def context(self, user_id: int) -> FakeContext:
+        return FakeContext(self.bot, self.guild.member(user_id), self.channel)
+
+    async def fund(self, user_ids: Iterable[int], points: int) -> None:
+        await asyncio.gather(*(self.handler.add_points(user_id, points) for user_id in user_ids))
+
+    async def close(self) -> None:
+        for cog in (self.memetics, self.gamba):
+            await cog.cog_unload()
+        if self._close is not None:
+            await self._close()
+
+
+async def memory_env(latency: float) -> BenchEnv:
+    db = MemoryDatabase(latency)
+    bot = FakeBot(MemoryPool(memetics_rows(), latency, db.spins), db)
+    return BenchEnv(bot, db.load_spins)
+
+
+async def scratch_database(dsn: str) -> str:
+    """Create an empty database on the server of ``dsn``; returns its name."""
+    import asyncpg as acpg
+
+    name = f"bench_{uuid.uuid4().hex[:12]}"
+    server = await acpg.connect(dsn)
+    try:
+        await server.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await server.close()
+    return name
+
+
+async def drop_database(dsn: str, name: str) -> None:
+    import asyncpg as acpg
+
+    server = await acpg.connect(dsn)
+    try:
+        # FORCE: connections a failed run left open must not keep the database around
+        await server.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    finally:
+        await server.close()
+
+
+async def postgres_env(dsn: str, pool_size: int, cache_size: int, ledger_size: int) -> BenchEnv:
+    # Each run migrates a database of its own, dropped afterwards: runs start
+    # from the same state without deleting from the append-only ledger, and
+    # the real rows of the server are never touched
+    name = await scratch_database(dsn)
+    print(f"Benchmark database {name}")
+    try:
+        return await _postgres_env(dsn, name, pool_size, cache_size, ledger_size)
+    except BaseException:
+        await drop_database(dsn, name)
+        raise
+
+
+async def _postgres_env(dsn: str, name: str, pool_size: int, cache_size: int, ledger_size: int) -> BenchEnv:
+    from core.databasehandler import BalanceCache, DatabaseHandler
+    from core.ledger import LedgerBuffer
+    from core.migrations import MigrationRunner
+    from core.pool_manager import PoolConfig, PoolManager
+    from core.query_tracer import QueryTracer
+    from core.word_index import WordIndex
+
+    manager = PoolManager(
+        PoolConfig(
+            urlsplit(dsn)._replace(path=f"/{name}").geturl(),
+            min_size=min(2, pool_size),
+            max_size=pool_size,
+            acquire_timeout=0,
+        ),
+        QueryTracer(slow_ms=math.inf),
+        on_connect=lambda pool: MigrationRunner(pool).run(),
+    )
+    if not await manager.connect():
+        await manager.close()
+        raise SystemExit(f"Cannot connect to the database: {manager.last_error}")
+    pool = manager.pool
+
+    rows = [(r["name"], r["icon"], r["description"]) for r in memetics_rows()]
+    await pool.executemany("INSERT INTO memetics (name, icon, description) VALUES ($1, $2, $3)", rows)
+
+    cache = BalanceCache(pool, max_size=cache_size) if cache_size > 0 else None
+    ledger = LedgerBuffer(pool, max_size=ledger_size) if ledger_size > 0 else None
+    handler = DatabaseHandler(pool, cache=cache, pool_manager=manager, ledger=ledger)
+    await handler.start()
+    word_index = WordIndex(pool, "z!")
+    word_index.start()
+
+    async def load_spins(rows):
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table("spins", records=rows, columns=SPIN_COLUMNS)
+            await conn.execute("ANALYZE spins")
+
+    async def close():
+        try:
+            await word_index.close()
+            await handler.close()
+            await manager.close()
+        finally:
+            await drop_database(dsn, name)
+
+    return BenchEnv(FakeBot(pool, handler, word_index), load_spins, close)
+
+
+async def run_scenario(env: BenchEnv, scenario: Scenario, scale: float, concurrency: Optional[int], seed: int) -> Result:
+    ops = max(1, int(scenario.ops * scale))
+    concurrency = max(1, min(concurrency or scenario.concurrency, ops))
+    random.seed(seed)
+    if scenario.setup is not None:
+        await scenario.setup(env, ops + scenario.warmup)
+    # Warmup calls take the indices after the measured ones
+    for i in range(ops, ops + scenario.warmup):
+        await scenario.op(env, i)
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await scenario.op(env, i)
+            except Exception as e:
+                if not errors:
+                    print(f"  {scenario.name}: {type(e).__name__}: {e}")
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(ops)))
+    seconds = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return Result(
+        ops=ops,
+        concurrency=concurrency,
+        errors=errors,
+        seconds=round(seconds, 3),
+        ops_per_sec=round(ops / seconds, 1),
+        p50_ms=round(percentile(ordered, 0.50) * 1000, 3),
+        p99_ms=round(percentile(ordered, 0.99) * 1000, 3),
+        mean_ms=round(sum(ordered) / len(ordered) * 1000, 3),
+        max_ms=round(ordered[-1] * 1000, 3),
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results: Dict[str, Result], baseline: Optional[Dict] = None) -> List[str]:
+    header = f"{'scenario':<24}{'ops':>7}{'conc':>7}{'ops/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    if baseline:
+        header += f"{'ops/s Δ':>10}{'p99 Δ':>9}"
+    lines = [header]
+    for name, r in results.items():
+        line = f"{name:<24}{r.ops:>7}{r.concurrency:>7}{r.ops_per_sec:>11.1f}{r.p50_ms:>10.3f}{r.p99_ms:>10.3f}{r.errors:>8}"
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"{change(r.ops_per_sec, before['ops_per_sec']):>10}{change(r.p99_ms, before['p99_ms']):>9}"
+        lines.append(line)
+    return lines
+
+
+def change(now: float, before: float) -> str:
+    return f"{(now - before) / before:+.0%}" if before else "n/a"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the bot's commands against Postgres or an in-memory stand-in")
+    parser.add_argument("--db", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--dsn", default=None, help="Postgres mode; defaults to BENCH_DATABASE_URL. Each run creates and drops a database on its server.")
+    parser.add_argument("--only", nargs="+", default=None, metavar="SCENARIO", help="scenario names or prefixes")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every scenario's number of calls")
+    parser.add_argument("--concurrency", type=int, default=None, help="overrides every scenario's concurrency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="memory mode: simulated round trip per call")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--cache-size", type=int, default=0, help="balance cache size, 0 disables it")
+    parser.add_argument("--ledger-size", type=int, default=50000, help="ledger buffer size, 0 disables the ledger")
+    parser.add_argument("--output", default=None, help="JSON results, defaults to benchmarks/results/<db>.json")
+    parser.add_argument("--compare", default=None, help="earlier JSON results to show the change against")
+    args = parser.parse_args()
+
+    scenarios = [
+        s for s in SCENARIOS
+        if not args.only or any(s.name == o or s.name.startswith(o + ".") for o in args.only)
+    ]
+    if not scenarios:
+        parser.error(f"no scenario matches; choose from {', '.join(s.name for s in SCENARIOS)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+
+    async def run() -> Dict[str, Result]:
+        if args.db == "postgres":
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            dsn = args.dsn or os.getenv("BENCH_DATABASE_URL")
+            if not dsn:
+                parser.error("postgres mode needs --dsn or BENCH_DATABASE_URL")
+            env = await postgres_env(dsn, args.pool_size, args.cache_size, args.ledger_size)
+        else:
+            env = await memory_env(args.latency_ms / 1000)
+        env.channel.fill_history(history(env.channel, args.seed))
+        results = {}
+        try:
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(env, scenario, args.scale, args.concurrency, args.seed)
+                r = results[scenario.name]
+                print(f"  {scenario.name}: {r.ops_per_sec:.1f} ops/s, p99 {r.p99_ms:.3f} ms")
+        finally:
+            await env.close()
+        return results
+
+    results = asyncio.run(run())
+    print("\n".join(report(results, baseline)))
+
+    output = args.output or os.path.join(os.path.dirname(__file__), "results", f"{args.db}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    document = {
+        "environment": {
+            "db": args.db,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "scale": args.scale,
+            "latency_ms": args.latency_ms if args.db == "memory" else None,
+            "pool_size": args.pool_size if args.db == "postgres" else None,
+            "cache_size": args.cache_size if args.db == "postgres" else None,
+            "ledger_size": args.ledger_size if args.db == "postgres" else None,
+        },
+        "scenarios": {name: asdict(r) for name, r in results.items()},
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Results written to {output}")
@@ -0,0 +1,171 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from benchmarks import baselines
+from cogs.candyspin import RANK_SIZE, RESET_HOURS, SPINS_PER_CYCLE, WEEKLY_WINNERS
+from core.term_matcher import TermMatcher
+
+USER_BASE = 1_000_000_000
+# Disjoint ranges below any real snowflake, so scenarios never share state
+DAILY_USERS = USER_BASE
+BALANCE_USERS = USER_BASE + 1_000_000
+SHARE_USERS = USER_BASE + 2_000_000
+SPIN_USERS = USER_BASE + 3_000_000
+BET_USERS = USER_BASE + 4_000_000
+SPIN_BEFORE_USERS = USER_BASE + 5_000_000
+LEADERBOARD_USERS = USER_BASE + 6_000_000
+
+BALANCE_ACCOUNTS = 200
+SHARE_ACCOUNTS = 100
+BET_ACCOUNTS = 1000
+BET_WAGER = 10
+LEADERBOARD_ROWS = 1_000_000
+
+HISTORY_WORDS = ["zamn", "hello", "candy", "spin", "bruh", "gg", "lol", "daily", "points", "meme"]
+# The history's words plus filler that never matches
+MANY_TERMS = HISTORY_WORDS + [f"term{k}" for k in range(100 - len(HISTORY_WORDS))]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """``ops`` calls of ``op(env, i)``, at most ``concurrency`` at a time, after ``warmup`` unmeasured ones."""
+
+    name: str
+    ops: int
+    concurrency: int
+    op: Callable[["BenchEnv", int], Awaitable[object]]
+    warmup: int = 0
+    # Run once before the warmup with the total number of calls
+    setup: Optional[Callable[["BenchEnv", int], Awaitable[None]]] = None
+
+
+async def daily(env, i: int):
+    # A fresh account per call, so every call takes the claim path
+    await env.economy.daily.callback(env.economy, env.context(DAILY_USERS + i))
+
+
+async def balance(env, i: int):
+    await env.economy.balance.callback(env.economy, env.context(BALANCE_USERS + i % BALANCE_ACCOUNTS))
+
+
+async def fund_share(env, calls: int):
+    await env.fund(range(SHARE_USERS, SHARE_USERS + SHARE_ACCOUNTS), calls)
+
+
+async def share(env, i: int):
+    ctx = env.context(SHARE_USERS + i % SHARE_ACCOUNTS)
+    member = env.guild.member(SHARE_USERS + (i + 1) % SHARE_ACCOUNTS)
+    await env.economy.share_credits.callback(env.economy, ctx, member, 1)
+
+
+async def spin(env, i: int):
+    # Each account spins its whole cycle
+    await env.candy.spin.callback(env.candy, env.context(SPIN_USERS + i // SPINS_PER_CYCLE))
+
+
+async def spin_before(env, i: int):
+    # The same calls through the pipeline spin replaced
+    ctx = env.context(SPIN_BEFORE_USERS + i // SPINS_PER_CYCLE)
+    await baselines.spin(ctx, env.bot.db_pool, i)
+
+
+async def rank(env, i: int):
+    await env.candy.rank.callback(env.candy, env.context(SPIN_USERS))
+
+
+async def fill_leaderboard(env, calls: int):
+    # One load of synthetic spins rows shared by every leaderboard scenario,
+    # with cycles long expired so the rows can spin again
+    if env.leaderboard_loaded:
+        return
+    rng = random.Random(LEADERBOARD_ROWS)
+    expired = datetime.utcnow() - timedelta(hours=RESET_HOURS + 1)
+    await env.load_spins([
+        (LEADERBOARD_USERS + k, rng.randrange(100_000), SPINS_PER_CYCLE, expired, rng.randrange(1000))
+        for k in range(LEADERBOARD_ROWS)
+    ])
+    env.leaderboard_loaded = True
+    await env.candy.seed_leaderboards()
+
+
+async def seed_leaderboard(env, i: int):
+    # Cold start: both boards from the index-backed seeding queries
+    await env.candy.seed_leaderboards()
+
+
+async def leaderboard_spin(env, i: int):
+    # Spins that keep both boards up to date over the full table
+    await env.candy.spin.callback(env.candy, env.context(LEADERBOARD_USERS + i * 7919 % LEADERBOARD_ROWS))
+
+
+async def check_leaderboard(env, i: int):
+    # The rankcheck comparison; a mismatch counts as an error
+    handler = env.handler
+    total = await handler.get_spin_leaderboard(RANK_SIZE)
+    weekly = await handler.get_weekly_spin_leaderboard(WEEKLY_WINNERS)
+    problems = env.candy.total_board.diff((r["user_id"], r["total_points"]) for r in total)
+    problems += env.candy.weekly_board.diff((r["user_id"], r["weekly_points"]) for r in weekly)
+    if problems:
+        raise AssertionError(problems[0])
+
+
+async def memetics(env, i: int):
+    await env.memetics.show_memetics.callback(env.memetics, env.context(USER_BASE))
+
+
+async def scan(env, i: int):
+    await env.fun.scan_for_word.callback(env.fun, env.context(USER_BASE), "zamn")
+
+
+def matcher_counts(messages, terms: List[str]) -> Dict[str, int]:
+    """The scan's counting loop: one pass of a substring ``TermMatcher`` per message."""
+    matcher = TermMatcher(terms, whole_word=False)
+    counts = dict.fromkeys(matcher.terms, 0)
+    for message in messages:
+        for i in matcher.match(message.content):
+            counts[matcher.terms[i]] += 1
+    return counts
+
+
+def term_scan(count, terms: List[str]):
+    # Counts the whole channel history, matcher built per call like the command does
+    async def op(env, i: int):
+        count(env.channel.messages, terms)
+    return op
+
+
+async def fund_bets(env, calls: int):
+    await env.fund(range(BET_USERS, BET_USERS + BET_ACCOUNTS), BET_WAGER * calls)
+
+
+async def bet(env, i: int):
+    await env.gamba.slots.callback(env.gamba, env.context(BET_USERS + i % BET_ACCOUNTS), BET_WAGER, 1)
+
+
+SCENARIOS = [
+    Scenario("economy.daily", 2000, 50, daily),
+    Scenario("economy.balance", 5000, 50, balance, warmup=BALANCE_ACCOUNTS),
+    Scenario("economy.share", 2000, 50, share, setup=fund_share),
+    # Spin throughput before and after it became one statement
+    Scenario("candyspin.spin_before", 2000, 50, spin_before),
+    Scenario("candyspin.spin", 2000, 50, spin),
+    # Reads the board the spins above filled
+    Scenario("candyspin.rank", 5000, 50, rank, warmup=1),
+    # 1M spins rows: reseeding, reading and updating the boards, then checking them
+    Scenario("leaderboard.seed", 10, 1, seed_leaderboard, setup=fill_leaderboard),
+    Scenario("leaderboard.rank", 5000, 50, rank, setup=fill_leaderboard),
+    Scenario("leaderboard.spin", 2000, 50, leaderboard_spin, setup=fill_leaderboard),
+    Scenario("leaderboard.check", 10, 1, check_leaderboard, setup=fill_leaderboard),
+    Scenario("memetics.show", 1000, 20, memetics, warmup=1),
+    # The first scan indexes the channel's history when there is a word index
+    Scenario("fun.scan", 200, 10, scan, warmup=1),
+    # Counting the history for 1 and 100 terms, the old substring loop against the matcher
+    Scenario("terms.substring_1", 20, 1, term_scan(baselines.substring_counts, ["zamn"])),
+    Scenario("terms.matcher_1", 20, 1, term_scan(matcher_counts, ["zamn"])),
+    Scenario("terms.substring_100", 20, 1, term_scan(baselines.substring_counts, MANY_TERMS)),
+    Scenario("terms.matcher_100", 20, 1, term_scan(matcher_counts, MANY_TERMS)),
+    # Wagered slots from 1000 accounts, all 10k bets in flight at once
+    Scenario("gamba.bets", 10000, 10000, bet, setup=fund_bets),
+]
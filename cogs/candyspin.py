@@ -1,13 +1,17 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import random
 import asyncio
 from datetime import datetime, timedelta
+from core.leaderboard import TopK
+from core.role_assigner import RoleAssigner
 
 SPINS_PER_CYCLE = 5
 RESET_HOURS = 8
-WEEK_SECONDS = 7 * 24 * 3600
+WEEKLY_ANNOUNCE_CRON = "0 0 * * 1"  # Mondays 00:00 UTC
 WEEKLY_ROLE_DURATION_DAYS = 6  
+RANK_SIZE = 10
+WEEKLY_WINNERS = 3
 
 ROLES = {
     "participation": "🍭SweetLover",
@@ -50,63 +54,60 @@ class CandySpin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self._last_spin_channel = None  
-        self.weekly_job_started = False
-
-    async def ensure_table(self):
-        """Ensure spins table exists (run once on ready)."""
-        if not hasattr(self.bot, "db_pool") or self.bot.db_pool is None:
-            print("CandySpin: db_pool not found on bot; table creation skipped.")
-            return
-        create_sql = """
-        CREATE TABLE IF NOT EXISTS spins (
-            user_id BIGINT PRIMARY KEY,
-            total_points INTEGER DEFAULT 0,
-            spins_used INTEGER DEFAULT 0,
-            last_spin TIMESTAMP WITHOUT TIME ZONE DEFAULT '2000-01-01 00:00:00',
-            weekly_points INTEGER DEFAULT 0
-        );
-        """
-        async with self.bot.db_pool.acquire() as conn:
-            await conn.execute(create_sql)
-
-    async def fetch_user_row(self, user_id: int):
-        async with self.bot.db_pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM spins WHERE user_id = $1", user_id)
-            return row
-
-    async def ensure_user_row(self, user_id: int):
-        async with self.bot.db_pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO spins (user_id, total_points, spins_used, last_spin, weekly_points) "
-                "VALUES ($1, 0, 0, '2000-01-01 00:00:00', 0) ON CONFLICT (user_id) DO NOTHING", user_id
-            )
-
-    async def update_after_spin(self, user_id: int, pts: int, now: datetime):
-        async with self.bot.db_pool.acquire() as conn:
-            await conn.execute(
-                "UPDATE spins SET total_points = total_points + $1, weekly_points = weekly_points + $1, "
-                "spins_used = spins_used + 1, last_spin = $2 WHERE user_id = $3",
-                pts, now, user_id
-            )
+        # Channel stored with the weekly job, so restarts still know where to announce
+        self._announce_channel_id = None
+        self.weekly_job_scheduled = False
+        # In-memory leaderboards, seeded from the db and fed by every spin
+        self.total_board = TopK(RANK_SIZE)
+        self.weekly_board = TopK(WEEKLY_WINNERS)
+        self.role_assigner = RoleAssigner()
+
+    async def seed_leaderboards(self):
+        """Load both leaderboards from the db (cold start or after a mismatch)."""
+        handler = self.bot.db_handler
+        rows = await handler.get_spin_leaderboard(RANK_SIZE)
+        self.total_board.seed((r["user_id"], r["total_points"]) for r in rows)
+        rows = await handler.get_weekly_spin_leaderboard(WEEKLY_WINNERS)
+        self.weekly_board.seed((r["user_id"], r["weekly_points"]) for r in rows)
+
+    async def cog_load(self):
+        scheduler = self.bot.scheduler
+        if scheduler is not None:
+            scheduler.register("candyspin.weekly_announce", self.weekly_announce)
+            scheduler.register("candyspin.remove_role", self._remove_expired_role)
+
+    async def cog_unload(self):
+        scheduler = self.bot.scheduler
+        if scheduler is not None:
+            scheduler.unregister("candyspin.weekly_announce")
+            scheduler.unregister("candyspin.remove_role")
+
+    async def schedule_weekly_announce(self, channel_id=None):
+        """Register the weekly cron job; the stored channel survives restarts."""
+        payload = {"channel_id": channel_id} if channel_id else {}
+        await self.bot.scheduler.schedule_cron(
+            "candyspin.weekly_announce", "candyspin.weekly_announce", WEEKLY_ANNOUNCE_CRON, payload
+        )
+        self._announce_channel_id = channel_id
 
-    async def reset_spins_if_needed(self, user_id: int, now: datetime):
-        row = await self.fetch_user_row(user_id)
-        if row is None:
-            await self.ensure_user_row(user_id)
+    async def store_announce_channel(self, channel):
+        """Persist the spin channel with the weekly job, only when it differs from the stored one."""
+        if self.bot.scheduler is None or channel.id == self._announce_channel_id:
             return
-        last = row["last_spin"] or datetime.utcnow() - timedelta(hours=RESET_HOURS + 1)
-        if (now - last) >= timedelta(hours=RESET_HOURS) and row["spins_used"] > 0:
-            async with self.bot.db_pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE spins SET spins_used = 0 WHERE user_id = $1", user_id
-                )
+        previous, self._announce_channel_id = self._announce_channel_id, channel.id
+        try:
+            await self.schedule_weekly_announce(channel.id)
+        except Exception as e:
+            self._announce_channel_id = previous
+            print(f"CandySpin: failed to store the announcement channel: {e}")
 
     @commands.Cog.listener()
     async def on_ready(self):
-        await self.ensure_table()
-        if not self.weekly_job_started:
-            self.weekly_announce.start()
-            self.weekly_job_started = True
+        await self.seed_leaderboards()
+        if not self.weekly_job_scheduled and self.bot.scheduler is not None:
+            stored = await self.bot.scheduler.payload("candyspin.weekly_announce") or {}
+            await self.schedule_weekly_announce(self._announce_channel_id or stored.get("channel_id"))
+            self.weekly_job_scheduled = True
         print("CandySpin Cog ready.")
 
     @commands.command(name="spin")
@@ -115,15 +116,14 @@ class CandySpin(commands.Cog):
         user_id = ctx.author.id
         now = datetime.utcnow()
 
-        await self.ensure_user_row(user_id)
-        await self.reset_spins_if_needed(user_id, now)
-
-        row = await self.fetch_user_row(user_id)
-        spins_used = row["spins_used"]
-        last_spin = row["last_spin"]
+        item, pts = random.choice(CANDY_ITEMS)
+        row = await self.bot.db_handler.spin(user_id, pts, now, SPINS_PER_CYCLE, RESET_HOURS)
+        if row is None:
+            await ctx.send("🍭 The candy machine is jammed, try again in a moment.")
+            return
 
-        if spins_used >= SPINS_PER_CYCLE:
-            elapsed = (now - last_spin).total_seconds()
+        if not row["spun"]:
+            elapsed = (now - row["last_spin"]).total_seconds()
             remaining_seconds = RESET_HOURS * 3600 - elapsed
             if remaining_seconds < 0:
                 remaining_seconds = 0
@@ -132,9 +132,6 @@ class CandySpin(commands.Cog):
             await ctx.send(f"🍭 You’ve used all your spins! Next reset in **{hours}h {minutes}m {seconds}s**.")
             return
 
-        item, pts = random.choice(CANDY_ITEMS)
-        await self.update_after_spin(user_id, pts, now)
-
         participation_name = ROLES.get("participation")
         if participation_name:
             role = discord.utils.get(ctx.guild.roles, name=participation_name)
@@ -145,9 +142,11 @@ class CandySpin(commands.Cog):
                     pass  
 
         self._last_spin_channel = ctx.channel
+        await self.store_announce_channel(ctx.channel)
+        self.total_board.update(user_id, row["total_points"])
+        self.weekly_board.update(user_id, row["weekly_points"])
 
-        row_after = await self.fetch_user_row(user_id)
-        used = row_after["spins_used"]
+        used = row["spins_used"]
         embed = discord.Embed(
             description=f"🎉 {ctx.author.mention} spun and got **{item}** worth **{pts} points!**\n({used}/{SPINS_PER_CYCLE} spins used)",
             color=0xFFB6C1
@@ -158,40 +157,40 @@ class CandySpin(commands.Cog):
     @commands.command(name="rank")
     async def rank(self, ctx):
         """Show top 10 candy collectors by total_points."""
-        async with self.bot.db_pool.acquire() as conn:
-            rows = await conn.fetch("SELECT user_id, total_points FROM spins ORDER BY total_points DESC LIMIT 10")
+        if not self.total_board.seeded:
+            await self.seed_leaderboards()
+        rows = self.total_board.top(RANK_SIZE)
         if not rows:
             await ctx.send("No candy points yet — go spin with spin🍭")
             return
 
-        msg = "**🍭 Candy Leaderboard — Top 10**\n"
-        for i, r in enumerate(rows, start=1):
-            uid = r["user_id"]
-            points = r["total_points"]
+        msg = f"**🍭 Candy Leaderboard — Top {RANK_SIZE}**\n"
+        for i, (uid, points) in enumerate(rows, start=1):
             member = ctx.guild.get_member(uid)
             name = member.display_name if member else f"<@{uid}>"
             msg += f"{i}. {name} — {points} pts\n"
         await ctx.send(msg)
 
-    @tasks.loop(seconds=WEEK_SECONDS)
-    async def weekly_announce(self):
-        """Announce weekly top 3 and reset weekly_points (runs every 7 days)."""
+    async def weekly_announce(self, payload: dict):
+        """Announce weekly top 3 and reset weekly_points (scheduled job, WEEKLY_ANNOUNCE_CRON)."""
+        await self.bot.wait_until_ready()
         channel = self._last_spin_channel
+        if channel is None and payload.get("channel_id"):
+            channel = self.bot.get_channel(payload["channel_id"])
         if channel is None:
             print("CandySpin: no recent spin channel stored; weekly announcement skipped.")
             return
 
-        async with self.bot.db_pool.acquire() as conn:
-            rows = await conn.fetch("SELECT user_id, weekly_points FROM spins ORDER BY weekly_points DESC LIMIT 3")
+        if not self.weekly_board.seeded:
+            await self.seed_leaderboards()
+        rows = self.weekly_board.top(WEEKLY_WINNERS)
         if not rows:
             await channel.send("No spins this week — no Candy winners! 🍭")
             return
 
         desc_lines = []
         winners = []
-        for i, r in enumerate(rows, start=1):
-            uid = r["user_id"]
-            pts = r["weekly_points"]
+        for i, (uid, pts) in enumerate(rows, start=1):
             member = channel.guild.get_member(uid) 
             mention = member.mention if member else f"<@{uid}>"
             desc_lines.append(f"{i}. {mention} — {pts} pts")
@@ -204,63 +203,90 @@ class CandySpin(commands.Cog):
         )
         announce_msg = await channel.send(embed=embed)
 
+        guild = channel.guild
+        assignments = []
         role_keys = ["top1_week", "top2_week", "top3_week"]
         for idx, (uid, member) in enumerate(winners):
-            role_name = ROLES.get(role_keys[idx])
-            if role_name and member:
-                guild = channel.guild
-                role = discord.utils.get(guild.roles, name=role_name)
-                if role is None:
-                    try:
-                        role = await guild.create_role(name=role_name, reason="Weekly candy winner role auto-created")
-                    except Exception as e:
-                        print(f"Failed to create role {role_name}: {e}")
-                        role = None
-                if role:
-                    try:
-                        await member.add_roles(role)
-                        asyncio.create_task(self._remove_role_after_delay(member, role, WEEKLY_ROLE_DURATION_DAYS * 24 * 3600))
-                    except Exception as e:
-                        print(f"Failed to add role {role_name} to {member}: {e}")
+            if member is None:
+                continue
+            role = await self._get_or_create_role(guild, ROLES.get(role_keys[idx]), "Weekly candy winner role auto-created")
+            if role:
+                assignments.append((role, [member]))
 
         wing_uids = {uid for uid, _ in winners}
-        async with self.bot.db_pool.acquire() as conn:
-            participants = await conn.fetch("SELECT user_id FROM spins WHERE weekly_points > 0")
-        losers_role_name = ROLES.get("losers_week")
-        losers_role = None
-        if losers_role_name:
-            losers_role = discord.utils.get(channel.guild.roles, name=losers_role_name)
-            if losers_role is None:
-                try:
-                    losers_role = await channel.guild.create_role(name=losers_role_name)
-                except Exception:
-                    losers_role = None
-        for row in participants:
-            uid = row["user_id"]
+        participants = await self.bot.db_handler.get_weekly_spin_participants()
+        losers = []
+        for uid in participants:
             if uid not in wing_uids:
-                member = channel.guild.get_member(uid)
-                if member and losers_role:
-                    try:
-                        await member.add_roles(losers_role)
-                        asyncio.create_task(self._remove_role_after_delay(member, losers_role, WEEKLY_ROLE_DURATION_DAYS * 24 * 3600))
-                    except Exception:
-                        pass
-
-        async with self.bot.db_pool.acquire() as conn:
-            await conn.execute("UPDATE spins SET weekly_points = 0")
-
-    async def _remove_role_after_delay(self, member: discord.Member, role: discord.Role, delay_seconds: int):
-        try:
-            await asyncio.sleep(delay_seconds)
-            guild = member.guild
-            m = guild.get_member(member.id)
-            if m and role in m.roles:
-                try:
-                    await m.remove_roles(role)
-                except Exception:
-                    pass
-        except Exception:
-            pass
+                member = guild.get_member(uid)
+                if member:
+                    losers.append(member)
+        losers_role = await self._get_or_create_role(guild, ROLES.get("losers_week"))
+        if losers_role and losers:
+            assignments.append((losers_role, losers))
+
+        status_msg = None
+        if len(losers) > self.role_assigner.progress_every:
+            status_msg = await channel.send(f"🍬 Handing out weekly roles to {len(losers) + len(winners)} members...")
+
+        for role, members in assignments:
+            async def report(done, total, role=role):
+                if status_msg is not None:
+                    await status_msg.edit(content=f"🍬 Handing out **{role.name}**: {done}/{total}")
+
+            result = await self.role_assigner.assign(members, role, reason="Weekly candy results", progress=report)
+            print(
+                f"CandySpin: {role.name} given to {len(result.changed)}, already had {len(result.skipped)}, "
+                f"failed {len(result.failed)} in {result.elapsed:.1f}s"
+            )
+            if result.changed:
+                # One persisted job per role instead of one sleeping task per member;
+                # members who already had the role keep it
+                await self.bot.scheduler.schedule_once(
+                    "candyspin.remove_role",
+                    datetime.utcnow() + timedelta(days=WEEKLY_ROLE_DURATION_DAYS),
+                    {"guild_id": guild.id, "role_id": role.id, "member_ids": [m.id for m in result.changed]},
+                )
+
+        await self.bot.db_handler.reset_weekly_spin_points()
+        self.weekly_board.clear()
+
+    @commands.command(name="rankcheck")
+    @commands.is_owner()
+    async def rank_check(self, ctx):
+        """Compare the in-memory leaderboards with the db and reseed on mismatch."""
+        handler = self.bot.db_handler
+        total_rows = await handler.get_spin_leaderboard(RANK_SIZE)
+        weekly_rows = await handler.get_weekly_spin_leaderboard(WEEKLY_WINNERS)
+        problems = self.total_board.diff((r["user_id"], r["total_points"]) for r in total_rows)
+        problems += self.weekly_board.diff((r["user_id"], r["weekly_points"]) for r in weekly_rows)
+        if not problems:
+            return await ctx.send("✅ Leaderboards match the database.")
+        await self.seed_leaderboards()
+        lines = "\n".join(problems[:10])
+        await ctx.send(f"⚠️ {len(problems)} leaderboard mismatch(es), reseeded:\n```{lines}```")
+
+    async def _get_or_create_role(self, guild: discord.Guild, role_name: str, reason: str = None):
+        if not role_name:
+            return None
+        role = discord.utils.get(guild.roles, name=role_name)
+        if role is None:
+            try:
+                role = await guild.create_role(name=role_name, reason=reason)
+            except Exception as e:
+                print(f"Failed to create role {role_name}: {e}")
+                role = None
+        return role
+
+    async def _remove_expired_role(self, payload: dict):
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(payload["guild_id"])
+        role = guild.get_role(payload["role_id"]) if guild else None
+        if role is None:
+            return
+        members = [m for m in (guild.get_member(uid) for uid in payload["member_ids"]) if m]
+        result = await self.role_assigner.remove(members, role, reason="Weekly candy role expired")
+        print(f"CandySpin: {role.name} removed from {len(result.changed)} members.")
 
     @commands.command(name="slap")
     async def slap(self, ctx, member: discord.Member = None):
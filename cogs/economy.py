@@ -55,7 +55,7 @@ class Economy(commands.Cog):
                 )
                 embed.set_footer(text=f"Your new balance is: {new_balance} points")
                 await ctx.send(embed=embed)
-            elif seconds_remaining:
+            elif seconds_remaining is not None:
                 minutes, seconds = divmod(seconds_remaining, 60)
                 hours, minutes = divmod(minutes, 60)
 
@@ -122,13 +122,17 @@ class Economy(commands.Cog):
     ):
         if member.bot:
             return await ctx.send("You can't give points to bots.")
-        if member is ctx.author:
+        if member == ctx.author:
             return await ctx.send("You can't give credits to yourself.")
+        if amount <= 0:
+            return await ctx.send("Amount must be a positive number.")
 
-        processed, new_balance = await self.handler(ctx.author.id, member.id, amount)
+        processed, new_balance = await self.handler.transfer_point(
+            ctx.author.id, member.id, amount
+        )
 
         if processed:
-            if new_balance > 0:
+            if new_balance is not None:
                 await ctx.send(
                     f"**{ctx.author.display_name}** gives **{member.display_name}** {amount} credits"
                 )
@@ -139,6 +143,35 @@ class Economy(commands.Cog):
         else:
             await ctx.send("There is an error while processing the command.")
 
+    @commands.command(name="rain")
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def rain_credits(
+        self, ctx: commands.Context, amount: int, members: commands.Greedy[discord.Member]
+    ):
+        """Give the same amount of credits to every mentioned member."""
+        if amount <= 0:
+            return await ctx.send("Amount must be a positive number.")
+        recipients = list({m.id: m for m in members if not m.bot and m != ctx.author}.values())
+        if not recipients:
+            return await ctx.send("Mention at least one other member to make it rain.")
+
+        processed, new_balance, paid = await self.handler.rain_points(
+            ctx.author.id, [m.id for m in recipients], amount
+        )
+
+        if not processed:
+            await ctx.send("There is an error while processing the command.")
+        elif new_balance is None:
+            await ctx.send(
+                f"**{ctx.author.display_name}**, you don't have enough points to give "
+                f"{amount} credits to {len(recipients)} members."
+            )
+        else:
+            await ctx.send(
+                f"🌧️ **{ctx.author.display_name}** made it rain {amount} credits on {paid} members! "
+                f"Remaining balance: {new_balance}"
+            )
+
     @commands.command(name="givecredits")
     @commands.is_owner()
     async def give_balance(self, ctx, member: discord.Member, amount: int):
@@ -149,7 +182,7 @@ class Economy(commands.Cog):
         target = member
         user_id = target.id
         try:
-            new_balance = await self.handler.add_points(user_id=user_id, amount=amount)
+            new_balance = await self.handler.add_points(user_id=user_id, amount=amount, reason="givecredits")
         except Exception as e:
             print(f"Error while giving user balance with id {user_id} : {e}")
             return await ctx.reply("There was a problem")
@@ -2,6 +2,10 @@ import discord
 from discord.ext import commands
 import random
 from discord import app_commands
+from typing import List, Optional
+from core.history_crawler import CrawlProgress
+from core.term_matcher import TermMatcher
+from core.word_index import tokenize
 
 
 MESSAGES_LIMIT = 1000 #human messages
@@ -9,6 +13,7 @@ MESSAGES_LIMIT = 1000 #human messages
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resumed_crawls = False
         print("Fun Cog ready!")
 
     @commands.command(name="hello")
@@ -21,29 +26,88 @@ class Fun(commands.Cog):
             "https://tenor.com/view/bobitos-mimis-michis-gif-943529865427663588"
         )
 
-    @commands.command(name='zamn', aliases=["countzamn", "zamnscan"])
-    async def zamn(self, ctx):
-        await ctx.send(
-            "Starting message scan in this channel for [zamn]... This may take a moment."
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if self.bot.word_index is not None:
+            self.bot.word_index.record(message)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        if self.bot.word_index is None or before.content == after.content:
+            return
+        await self.bot.word_index.replace(before, after)
+
+    @commands.Cog.listener()
+    async def on_message_delete(self, message: discord.Message):
+        if self.bot.word_index is not None:
+            await self.bot.word_index.forget(message)
+
+    @commands.Cog.listener()
+    async def on_bulk_message_delete(self, messages: List[discord.Message]):
+        if self.bot.word_index is not None:
+            for message in messages:
+                await self.bot.word_index.forget(message)
+
+    async def count_terms(self, ctx, matcher: TermMatcher, status: Optional[discord.Message] = None):
+        """
+        Count messages in this channel containing each of the matcher's terms.
+        Plain words are answered from the word index over the whole channel
+        history; anything else (or no index) scans recent history live.
+        Crawl progress is streamed into ``status``.
+        Returns ``([(authors, count) per term], total_messages)``.
+        """
+        index = self.bot.word_index
+        indexable = (
+            index is not None
+            and matcher.whole_word
+            and not matcher.case_sensitive
+            and all(tokenize(term) == {term.casefold()} for term in matcher.terms)
         )
-        zamn_authors = {}
-        zamn_count = 0
-        total_messages = 0
+        if not indexable:
+            return await self.scan_history(ctx, matcher)
+
+        progress = None
+        if not index.is_synced(ctx.channel.id):
+            progress = CrawlProgress(status, "Indexing this channel's history first...")
+        state = await index.sync_channel(ctx.channel, progress=progress)
+
+        results = []
+        for term in matcher.terms:
+            count, top = await index.top_authors(ctx.channel.id, term.casefold(), limit=5)
+            authors = {}
+            for author_id, author_count in top:
+                member = ctx.guild.get_member(author_id)
+                authors[member.display_name if member else str(author_id)] = author_count
+            results.append((authors, count))
+        return results, state.message_count
 
+    async def scan_history(self, ctx, matcher: TermMatcher):
         prefix = self.bot.command_prefix
+        results = [({}, 0) for _ in matcher.terms]
+        total_messages = 0
         async for message in ctx.channel.history(limit=None):
             if message.author.bot:
                 continue
             if message.content.startswith(prefix):
                 continue
-            if "zamn" in message.content.lower():
+            for i in matcher.match(message.content):
+                authors, count = results[i]
                 author_name = message.author.display_name
-                zamn_authors[author_name] = zamn_authors.get(author_name, 0) + 1
-                zamn_count += 1
+                authors[author_name] = authors.get(author_name, 0) + 1
+                results[i] = (authors, count + 1)
 
             total_messages += 1
             if total_messages >= MESSAGES_LIMIT:
                 break
+        return results, total_messages
+
+    @commands.command(name='zamn', aliases=["countzamn", "zamnscan"])
+    async def zamn(self, ctx):
+        status = await ctx.send(
+            "Starting message scan in this channel for [zamn]... This may take a moment."
+        )
+        results, total_messages = await self.count_terms(ctx, TermMatcher(["zamn"]), status)
+        zamn_authors, zamn_count = results[0]
 
         if not zamn_authors:
             report = (
@@ -69,30 +133,39 @@ class Fun(commands.Cog):
         await ctx.send(report)
 
     @commands.command(name="scan")
-    async def scan_for_word(self, ctx, word: str):
-        await ctx.send(
-            f"Starting message scan in this channel for [**{word}**]... This may take a moment."
+    async def scan_for_word(self, ctx, *args: str):
+        """
+        Count messages containing any of the given terms, as whole words.
+        Use `*` as a wildcard (`zam*`), `--substring` to match inside words
+        and `--case` for case-sensitive matching.
+        """
+        options = {a for a in args if a.startswith("--")}
+        terms = [a for a in args if not a.startswith("--")]
+        unknown = options - {"--substring", "--case"}
+        if unknown:
+            return await ctx.send(f"Unknown option: {', '.join(sorted(unknown))}")
+        try:
+            matcher = TermMatcher(
+                terms, whole_word="--substring" not in options, case_sensitive="--case" in options
+            )
+        except ValueError as e:
+            prefix = self.bot.command_prefix
+            return await ctx.send(f"{e}. Usage: {prefix}scan [--substring] [--case] <word> [word...]")
+
+        label = ", ".join(f"**{t}**" for t in matcher.terms)
+        status = await ctx.send(
+            f"Starting message scan in this channel for [{label}]... This may take a moment."
         )
 
-        prefix = self.bot.command_prefix
-        authors = {}
-        count = 0
-        total_messages = 0
-        async for message in ctx.channel.history(limit=None):
-            if message.author.bot:
-                continue
-            if message.content.startswith(prefix):
-                continue
-            if word.lower() in message.content.lower():
-                print(f"found in message ID {message.id} from {message.author}")
-                author_name = message.author.display_name
-                authors[author_name] = authors.get(author_name, 0) + 1
-                count += 1
+        results, total_messages = await self.count_terms(ctx, matcher, status)
 
-            total_messages += 1
-            if total_messages >= MESSAGES_LIMIT:
-                break
+        if len(matcher.terms) > 1:
+            for report in self.multi_term_reports(matcher.terms, results, total_messages):
+                await ctx.send(report)
+            return
 
+        word = matcher.terms[0]
+        authors, count = results[0]
         if not authors:
             report = (
                 f">>> **[**{word}**] Count Complete**\n"
@@ -114,11 +187,74 @@ class Fun(commands.Cog):
             )
         await ctx.send(report)
 
-    @scan_for_word.error
-    async def scan_for_word_error(self, ctx, error):
-        prefix = self.bot.command_prefix
-        if isinstance(error, commands.MissingRequiredArgument):
-            await ctx.send(f"Usage: {prefix}scan <word>")
+    @staticmethod
+    def multi_term_reports(terms, results, total_messages) -> List[str]:
+        """One line per term with its top 3 authors, split to fit Discord's message limit."""
+        lines = [f"**Scan Complete** — processed **{total_messages}** messages."]
+        ranked = sorted(zip(terms, results), key=lambda item: item[1][1], reverse=True)
+        for term, (authors, count) in ranked:
+            top = sorted(authors.items(), key=lambda item: item[1], reverse=True)[:3]
+            top_text = ", ".join(f"`{name}` {n}" for name, n in top)
+            lines.append(f"[**{term}**]: **{count}**" + (f" — {top_text}" if top_text else ""))
+
+        reports, current = [], ">>> "
+        for line in lines:
+            if len(current) + len(line) + 1 > 1900:
+                reports.append(current)
+                current = ">>> "
+            current += line + "\n"
+        reports.append(current)
+        return reports
+
+    @commands.command(name="indexall")
+    @commands.is_owner()
+    async def index_all(self, ctx):
+        """Crawl the history of every readable text channel of this guild."""
+        index = self.bot.word_index
+        if index is None:
+            return await ctx.send("Word index is not enabled.")
+        channels = [
+            c for c in ctx.guild.text_channels
+            if c.permissions_for(ctx.guild.me).read_message_history
+        ]
+        status = await ctx.send(f"Indexing {len(channels)} channels...")
+        progress = CrawlProgress(status, "Indexing guild history")
+        results = await index.crawler.crawl_many(
+            channels, lambda c: index.sync_channel(c, progress=progress)
+        )
+        failed = []
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception):
+                print(f"Indexing #{channel} failed: {result}")
+                failed.append(channel.name)
+        if failed:
+            await ctx.send(f"Indexing failed for: {', '.join(failed)}")
+        else:
+            await ctx.send(f"Indexed {len(channels)} channels.")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Resume crawls that were interrupted by a restart
+        index = self.bot.word_index
+        if index is None or self.resumed_crawls:
+            return
+        self.resumed_crawls = True
+        # Fill the gap left while offline in every indexed channel, since their
+        # live counts are held back until then, and finish interrupted backfills
+        pending = set(await index.pending_channels())
+        channels = []
+        for channel_id in dict.fromkeys(await index.stale_channels() + list(pending)):
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                channels.append(channel)
+        if channels:
+            print(f"Resuming history crawl of {len(channels)} channels.")
+            results = await index.crawler.crawl_many(
+                channels, lambda c: index.sync_channel(c, backfill=c.id in pending)
+            )
+            for channel, result in zip(channels, results):
+                if isinstance(result, Exception):
+                    print(f"Resuming crawl of #{channel} failed: {result}")
 
 
 async def setup(bot):
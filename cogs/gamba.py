@@ -2,25 +2,45 @@ import os
 from discord.ext import commands
 import random
 import asyncpg as acpg
+from core.databasehandler import DatabaseHandler
+from core.gamba_engine import (
+    GambaEngine, roulette_death, roulette_game, roulette_winnings, slots_game, slots_payout, spin_reels
+)
 
 SLOTS_SYMBOLS = ["🍒", "🍇", "🍊", "🍋", "💰", "💎"]
 WIN_MULTIPLIER = 5
+CHAMBER = 6
+# Share of the stake a wagered roulette returns on average
+ROULETTE_RETURN = 0.95
+# Wagered roulette: more pulls would make the payout overflow
+MAX_WAGER_TRIALS = 20
+# Spins settled together by one wagered slots command
+MAX_BET_SPINS = 50
+# Seconds a simulation may run in the worker process
+SIMULATION_BUDGET = 5.0
 
 
 class Gamba(commands.Cog):
     def __init__(self, bot: commands.Bot):
         super().__init__()
         self.bot = bot
+        self.handler: DatabaseHandler = self.bot.db_handler
+        self.engine = GambaEngine(budget=SIMULATION_BUDGET)
+
+    async def cog_unload(self):
+        await self.engine.close()
 
     @commands.hybrid_command(
         name="slots", aliases=["sl"], description="Play slots machine"
     )
-    async def slots(self, ctx):
-        results = [random.choice(SLOTS_SYMBOLS) for _ in range(3)]
+    async def slots(self, ctx: commands.Context, wager: int = 0, spins: int = 1):
+        if wager > 0:
+            return await self.wagered_slots(ctx, wager, spins)
+        results = spin_reels(SLOTS_SYMBOLS)
         display_results = f"|{'|'.join(results)}|"
 
-        if results[0] == results[1] == results[2]:
-            winnings = 100 * WIN_MULTIPLIER
+        winnings = slots_payout(results, 100, WIN_MULTIPLIER)
+        if winnings:
             message = (
                 f"**🎰 SLOT MACHINE SPIN 🎰**\n\n"
                 f"**{display_results}**\n\n"
@@ -35,22 +55,90 @@ class Gamba(commands.Cog):
 
         await ctx.send(message)
 
+    async def wagered_slots(self, ctx: commands.Context, wager: int, spins: int):
+        if not 1 <= spins <= MAX_BET_SPINS:
+            return await ctx.send(f"You can bet on 1 to {MAX_BET_SPINS} spins at once.")
+        # Outcomes are drawn first; debit, payouts and the bets rows then settle in one statement
+        plays = []
+        lines = []
+        for _ in range(spins):
+            results = spin_reels(SLOTS_SYMBOLS)
+            payout = slots_payout(results, wager, WIN_MULTIPLIER)
+            plays.append((payout, "|".join(results)))
+            lines.append(f"|{'|'.join(results)}|" + (f" 🎉 +{payout}" if payout else ""))
+
+        try:
+            balance = await self.handler.settle_bets(ctx.author.id, "slots", wager, plays)
+        except Exception as e:
+            print(f"slots bet error for {ctx.author.id}: {e}")
+            return await ctx.send("An error occurred while settling your bet.")
+        if balance is None:
+            return await ctx.send(f"You need **{wager * spins} points** to bet {wager} on {spins} spin(s).")
+
+        won = sum(payout for payout, _ in plays)
+        if spins > 10:
+            jackpots = sum(1 for payout, _ in plays if payout)
+            lines = lines[:10] + [f"... {spins - 10} more spins, {jackpots} jackpot(s) in total"]
+        await ctx.send(
+            f"**🎰 SLOT MACHINE x{spins} 🎰**\n\n"
+            + "\n".join(lines)
+            + f"\n\nStaked {wager * spins}, won {won} ({won - wager * spins:+}). Balance: **{balance}** points"
+        )
+
     @commands.hybrid_command(name="roulette", description="Play a roulette game")
-    async def roulette(self, ctx: commands.Context, trials: int = 1):
-        CHAMBER = 6
+    async def roulette(self, ctx: commands.Context, trials: int = 1, wager: int = 0):
+        if wager > 0:
+            return await self.wagered_roulette(ctx, trials, wager)
         await ctx.send(f"Pulling the trigger for {trials} times...")
-        marked_chamber = random.randint(1, CHAMBER)
-        for trial in range(trials):
-            pull_result = random.randint(1, CHAMBER)
-
-            if marked_chamber == pull_result:
-                await ctx.send(
-                    f"**{ctx.author.display_name}**, You are dead after {trial+1} times"
-                )
-                return
+        # Sampled in one step, however many trials were asked for
+        death = roulette_death(trials, CHAMBER)
+        if death is not None:
+            await ctx.send(
+                f"**{ctx.author.display_name}**, You are dead after {death} times"
+            )
+            return
 
         await ctx.send(f"**{ctx.author.display_name}**, You are still alive!")
 
+    async def wagered_roulette(self, ctx: commands.Context, trials: int, wager: int):
+        if not 1 <= trials <= MAX_WAGER_TRIALS:
+            return await ctx.send(f"Wagered roulette takes 1 to {MAX_WAGER_TRIALS} trials.")
+        death = roulette_death(trials, CHAMBER)
+        payout = roulette_winnings(death, wager, trials, CHAMBER, ROULETTE_RETURN)
+        outcome = f"dead@{death}" if death is not None else "alive"
+        try:
+            balance = await self.handler.settle_bets(ctx.author.id, "roulette", wager, [(payout, outcome)])
+        except Exception as e:
+            print(f"roulette bet error for {ctx.author.id}: {e}")
+            return await ctx.send("An error occurred while settling your bet.")
+        if balance is None:
+            return await ctx.send(f"You need **{wager} points** to bet that much.")
+
+        if death is not None:
+            await ctx.send(
+                f"**{ctx.author.display_name}**, You are dead after {death} times and lost {wager} points. "
+                f"Balance: **{balance}**"
+            )
+        else:
+            await ctx.send(
+                f"**{ctx.author.display_name}**, You survived {trials} pulls and won {payout} points! "
+                f"Balance: **{balance}**"
+            )
+
+    @commands.command(name="gambasim")
+    @commands.is_owner()
+    async def simulate(self, ctx: commands.Context, game: str = "slots", plays: int = 1_000_000, setting: int = 0):
+        """Monte Carlo EV and variance of 100-point plays; `setting` is the slots multiplier or the roulette trials."""
+        if game == "slots":
+            spec = slots_game(SLOTS_SYMBOLS, setting or WIN_MULTIPLIER)
+        elif game == "roulette":
+            spec = roulette_game(setting or 1, CHAMBER, return_rate=ROULETTE_RETURN)
+        else:
+            return await ctx.send("Usage: gambasim <slots|roulette> [plays] [multiplier|trials]")
+        async with ctx.typing():
+            result = await self.engine.simulate(spec, max(plays, 1))
+        await ctx.send(f"```\n{result.summary()}\n```")
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Gamba(bot=bot))
@@ -3,8 +3,8 @@ from discord.ext import commands
 import asyncpg as acpg
 from dotenv import load_dotenv
 from core.databasehandler import DatabaseHandler
+from core.memetics_pages import MemeticsPages
 from core.paginator import PaginatorView
-from typing import List
 import traceback
 import sys
 
@@ -14,33 +14,21 @@ class Memetics(commands.Cog):
         self.bot = bot
         self.pool: acpg.Pool = self.bot.db_pool
         self.handler: DatabaseHandler = self.bot.db_handler
+        # Pages are rendered on demand and cached until the table changes
+        self.pages = MemeticsPages(self.pool, per_page=10)
+
+    async def cog_unload(self):
+        await self.pages.close()
 
     @commands.hybrid_command(name="memetics", description="Shows a paginated list of all memetic records.")
     async def show_memetics(self, ctx: commands.Context):
         try:
-            embeds: List[discord.Embed] = []
-            records = await self.handler.get_memetics()
+            view = PaginatorView(source=self.pages)
+            # Sends page 1 and keeps the message to disable the controls later
+            message = await view.start(ctx)
 
-            if not records:
+            if message is None:
                 return await ctx.send ("No memetics were found.")
-            
-            page_number = 1
-            for chunk_records in discord.utils.as_chunks(records,10):
-                embed = discord.Embed(title=f"Memetics - {page_number}", color=discord.Color.blue())
-                for r in chunk_records:
-                    embed.add_field(
-                        name=f"{r["name"]} {r["icon"]}", value=r["description"], inline=False
-                    )
-                embeds.append(embed)
-                page_number += 1
-
-            total_pages = len(embeds)
-            for i, embed in enumerate(embeds):
-                embed.set_footer(text=f"Page {i + 1}/{total_pages}")
-
-            view = PaginatorView(embeds=embeds)
-            message = await ctx.send(embed=embeds[0], view=view)
-            view.message = message #set the current embed to disable later
 
         except Exception:
             traceback.print_exc(file=sys.stderr)
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, List, Optional, Sequence, Tuple
+
+import asyncpg as acpg
+
+from core.pool_manager import BOT_APPLICATION_NAME
+
+FORMATS = ("csv", "binary")
+MODES = ("replace", "add")
+CHUNK_SIZE = 1 << 16
+# Copies and merges of whole tables outlast the pool's command timeout
+COPY_TIMEOUT = 600.0
+
+# Connections a running bot has open to this database
+BOT_SESSIONS = """
+SELECT count(*) FROM pg_stat_activity
+WHERE datname = current_database() AND application_name = $1 AND pid <> pg_backend_pid();
+"""
+
+
+@dataclass(frozen=True)
+class BulkTable:
+    name: str
+    columns: Tuple[str, ...]
+    # Columns that the ``add`` mode adds to instead of replacing
+    additive: Tuple[str, ...] = ()
+    # Balance changes are appended to the ledger
+    ledger: bool = False
+
+
+TABLES = {
+    "users": BulkTable("users", ("user_id", "points", "last_daily", "daily_count"), ("points",), ledger=True),
+    "spins": BulkTable(
+        "spins",
+        ("user_id", "total_points", "spins_used", "last_spin", "weekly_points"),
+        ("total_points", "weekly_points"),
+    ),
+}
+
+
+@dataclass
+class ImportResult:
+    table: str
+    mode: str
+    rows: int
+    created: int
+    updated: int
+    elapsed: float
+
+    def summary(self) -> str:
+        unchanged = self.rows - self.created - self.updated
+        return (
+            f"Imported {self.rows:,} {self.table} rows ({self.mode}): {self.created:,} created, "
+            f"{self.updated:,} updated, {unchanged:,} unchanged in {self.elapsed:.2f}s"
+        )
+
+
+def get_table(name: str) -> BulkTable:
+    try:
+        return TABLES[name]
+    except KeyError:
+        raise ValueError(f"unknown table {name!r}, expected one of {', '.join(TABLES)}") from None
+
+
+def _copied(status: str) -> int:
+    # "COPY 123"
+    return int(status.split()[-1])
+
+
+def _check_columns(table: BulkTable, columns: Sequence[str]) -> List[str]:
+    unknown = [c for c in columns if c not in table.columns]
+    if unknown:
+        raise ValueError(f"unknown {table.name} columns: {', '.join(unknown)}")
+    if len(set(columns)) != len(columns):
+        raise ValueError("duplicate columns")
+    if "user_id" not in columns:
+        raise ValueError("user_id column is required")
+    return list(columns)
+
+
+async def export_table(conn: acpg.Connection, name: str, output, fmt: str = "csv", timeout: float = COPY_TIMEOUT) -> int:
+    """
+    Stream a table to ``output`` (a path, binary file or coroutine taking
+    bytes) with ``COPY ... TO STDOUT``, ordered by user. Rows are passed
+    on as the server sends them, so memory stays flat. Returns the rows.
+    """
+    table = get_table(name)
+    status = await conn.copy_from_query(
+        f"SELECT {', '.join(table.columns)} FROM {table.name} ORDER BY user_id",
+        output=output,
+        format=fmt,
+        header=True if fmt == "csv" else None,
+        timeout=timeout,
+    )
+    return _copied(status)
+
+
+async def _split_header(chunks: AsyncIterable[bytes]) -> Tuple[List[str], AsyncIterator[bytes]]:
+    """Column names from the first CSV line, and the data after it."""
+    iterator = chunks.__aiter__()
+    buffered = b""
+    while b"\n" not in buffered:
+        if len(buffered) > CHUNK_SIZE:
+            raise ValueError("no header line")
+        try:
+            buffered += await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+    line, _, rest = buffered.partition(b"\n")
+    columns = [c.strip().strip('"') for c in line.decode("utf-8-sig").split(",")]
+
+    async def remainder() -> AsyncIterator[bytes]:
+        if rest:
+            yield rest
+        async for chunk in iterator:
+            yield chunk
+
+    return columns, remainder()
+
+
+def _merge_sql(table: BulkTable, columns: List[str], mode: str, staging: str) -> str:
+    targets = [c for c in columns if c != "user_id"]
+    values = [
+        f"{table.name}.{c} + EXCLUDED.{c}" if mode == "add" and c in table.additive else f"EXCLUDED.{c}"
+        for c in targets
+    ]
+    conflict = "DO NOTHING"
+    if targets:
+        # Rows that would not change are left alone instead of rewritten
+        current = ", ".join(f"{table.name}.{c}" for c in targets)
+        conflict = (
+            f"DO UPDATE SET {', '.join(f'{c} = {v}' for c, v in zip(targets, values))} "
+            f"WHERE ROW({current}) IS DISTINCT FROM ROW({', '.join(values)})"
+        )
+    names = ", ".join(columns)
+    merge = f"""
+        INSERT INTO {table.name} ({names})
+        SELECT {names} FROM {staging}
+        ON CONFLICT (user_id) {conflict}
+        RETURNING user_id, (xmax = 0) AS created{", points" if table.ledger else ""}
+    """
+    if not (table.ledger and "points" in columns):
+        return f"WITH merged AS ({merge}) SELECT count(*) FILTER (WHERE created) AS created, count(*) AS merged FROM merged;"
+    # Both CTEs read the snapshot from before the merge, so previous holds the old balances
+    return f"""
+        WITH previous AS (
+            SELECT user_id, points FROM {table.name} WHERE user_id IN (SELECT user_id FROM {staging})
+        ), merged AS ({merge}), logged AS (
+            INSERT INTO ledger (user_id, delta, reason)
+            SELECT m.user_id, m.points - coalesce(p.points, 0), 'import'
+            FROM merged m LEFT JOIN previous p USING (user_id)
+            WHERE m.points IS DISTINCT FROM coalesce(p.points, 0)
+        )
+        SELECT count(*) FILTER (WHERE created) AS created, count(*) AS merged FROM merged;
+    """
+
+
+async def import_table(
+    conn: acpg.Connection,
+    name: str,
+    source: AsyncIterable[bytes],
+    fmt: str = "csv",
+    mode: str = "replace",
+    columns: Optional[Sequence[str]] = None,
+    timeout: float = COPY_TIMEOUT,
+) -> ImportResult:
+    """
+    Load rows from ``source`` into a table in one transaction.
+
+    The data is streamed with ``COPY`` into a temporary staging table and
+    merged by one set-based upsert: ``replace`` overwrites the columns in
+    the file, ``add`` adds the point columns to the current values. CSV
+    needs a header line naming the columns; binary data has none, so its
+    ``columns`` default to all of them. Points changed in ``users`` are
+    appended to the ledger. The table is only locked for the merge, after
+    the file is staged and checked.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+    table = get_table(name)
+    if columns is None:
+        if fmt == "csv":
+            columns, source = await _split_header(source)
+        else:
+            columns = table.columns
+    columns = _check_columns(table, columns)
+    staging = f"bulk_{table.name}"
+
+    started = time.perf_counter()
+    async with conn.transaction():
+        await conn.execute(f"CREATE TEMP TABLE {staging} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        status = await conn.copy_to_table(staging, source=source, columns=columns, format=fmt, timeout=timeout)
+        rows = _copied(status)
+        duplicate = await conn.fetchval(
+            f"SELECT user_id FROM {staging} GROUP BY user_id HAVING count(*) > 1 LIMIT 1", timeout=timeout
+        )
+        if duplicate is not None:
+            raise ValueError(f"user {duplicate} appears more than once")
+        await conn.execute(f"ANALYZE {staging}")
+        if table.ledger:
+            # Ledger deltas are taken against balances that must hold still until commit
+            await conn.execute(f"LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE")
+        record = await conn.fetchrow(_merge_sql(table, columns, mode, staging), timeout=timeout)
+    created = record["created"]
+    return ImportResult(table.name, mode, rows, created, record["merged"] - created, time.perf_counter() - started)
+
+
+async def read_file(path: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Chunks of a file, or of stdin for ``-``."""
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+async def read_url(session, url: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Chunks of a download (e.g. a Discord attachment) as they arrive."""
+    async with session.get(url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(chunk_size):
+            yield chunk
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Stream users and spins out of or into the database with COPY. "
+        "Imports refuse to run while the bot is connected: its cached balances would be written over them."
+    )
+    parser.add_argument("--dsn", default=None, help="defaults to DATABASE_URL")
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    export = actions.add_parser("export", help="write a table to a file")
+    export.add_argument("table", choices=list(TABLES))
+    export.add_argument("-o", "--output", default="-", help="file to write, - for stdout")
+    export.add_argument("--format", choices=FORMATS, default="csv")
+
+    load = actions.add_parser("import", help="merge a file into a table")
+    load.add_argument("table", choices=list(TABLES))
+    load.add_argument("input", help="file to read, - for stdin")
+    load.add_argument("--format", choices=FORMATS, default="csv")
+    load.add_argument("--mode", choices=MODES, default="replace")
+    load.add_argument("--columns", default=None, help="comma separated, instead of the CSV header / all columns")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    async def run() -> None:
+        conn = await acpg.connect(args.dsn or os.getenv("DATABASE_URL"))
+        try:
+            if args.action == "export":
+                output = sys.stdout.buffer if args.output == "-" else args.output
+                rows = await export_table(conn, args.table, output, args.format)
+                print(f"Exported {rows:,} {args.table} rows.", file=sys.stderr)
+            else:
+                running = await conn.fetchval(BOT_SESSIONS, BOT_APPLICATION_NAME)
+                if running:
+                    raise SystemExit(
+                        f"The bot has {running} connections to this database. Stop it first, "
+                        "or import with the owner command, which holds its cached balances meanwhile."
+                    )
+                columns = args.columns.split(",") if args.columns else None
+                result = await import_table(
+                    conn, args.table, read_file(args.input), args.format, args.mode, columns
+                )
+                print(result.summary(), file=sys.stderr)
+        finally:
+            await conn.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
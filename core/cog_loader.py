@@ -1,17 +1,82 @@
 # core/cog_loader.py
+import asyncio
+import hashlib
+import json
 import os
+import time
 from discord.ext import commands
 
+
 async def load_all_cogs(bot):
-    """Automatically load all .py files inside /cogs folder."""
+    """
+    Automatically load all .py files inside /cogs folder.
+    Imports run one after another, but every cog's async setup (cog_load,
+    database reads, ...) overlaps with the others. Logs per-cog timings.
+    """
     cogs_dir = os.path.join(os.path.dirname(__file__), "..", "cogs")
     cogs_dir = os.path.abspath(cogs_dir)
+    extensions = [
+        f"cogs.{filename[:-3]}"
+        for filename in sorted(os.listdir(cogs_dir))
+        if filename.endswith(".py") and not filename.startswith("_")
+    ]
+
+    # Time of the first add_cog per module: import (and cog __init__) is done by then
+    added_at = {}
+    add_cog = bot.add_cog
+
+    async def timed_add_cog(cog, **kwargs):
+        added_at.setdefault(type(cog).__module__, time.perf_counter())
+        return await add_cog(cog, **kwargs)
+
+    async def load(extension):
+        started = time.perf_counter()
+        try:
+            await bot.load_extension(extension)
+        except Exception as e:
+            print(f"  ❌ Failed to load {extension}: {e}")
+            return
+        finished = time.perf_counter()
+        imported = added_at.get(extension, finished)
+        print(
+            f"  ✅ Loaded cog: {extension} "
+            f"(import {(imported - started) * 1000:.1f} ms, setup {(finished - imported) * 1000:.1f} ms)"
+        )
+
+    started = time.perf_counter()
+    bot.add_cog = timed_add_cog
+    try:
+        await asyncio.gather(*(load(extension) for extension in extensions))
+    finally:
+        del bot.add_cog
+    print(f"  ⏱️ {len(extensions)} cogs in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def command_tree_hash(bot: commands.Bot) -> str:
+    """Hash of the application command payload ``tree.sync()`` would upload."""
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+    data = json.dumps({"application_id": bot.application_id, "commands": payload}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def sync_command_tree(bot: commands.Bot, hash_path: str) -> bool:
+    """
+    Sync the global command tree only when it changed since the last sync,
+    as recorded in ``hash_path``. Delete the file to force a sync.
+    Returns whether a sync ran.
+    """
+    current = command_tree_hash(bot)
+    try:
+        with open(hash_path) as f:
+            if f.read().strip() == current:
+                print("  ⏭️ Command tree unchanged, sync skipped.")
+                return False
+    except FileNotFoundError:
+        pass
 
-    for filename in os.listdir(cogs_dir):
-        if filename.endswith(".py") and not filename.startswith("_"):
-            extension = f"cogs.{filename[:-3]}"
-            try:
-                await bot.load_extension(extension)
-                print(f"  ✅ Loaded cog: {extension}")
-            except Exception as e:
-                print(f"  ❌ Failed to load {extension}: {e}")
\ No newline at end of file
+    synced = await bot.tree.sync()
+    with open(hash_path, "w") as f:
+        f.write(current)
+    print(f"  🔄 Synced {len(synced)} application commands.")
+    return True
@@ -0,0 +1,165 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from discord.ext import commands
+
+from core.metrics import REGISTRY, MetricsRegistry
+
+LATENCY_SAMPLES = 1024
+
+
+@dataclass
+class InvocationTiming:
+    started: float = field(default_factory=time.perf_counter)
+    db: float = 0.0
+    http: float = 0.0
+    recorded: bool = False
+
+
+# Timing of the command running in the current task; shared by the tasks it spawns
+current_timing: contextvars.ContextVar[Optional[InvocationTiming]] = contextvars.ContextVar(
+    "current_timing", default=None
+)
+
+
+@dataclass
+class CommandStats:
+    calls: int = 0
+    errors: int = 0
+    total: float = 0.0
+    db: float = 0.0
+    http: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def other(self) -> float:
+        return max(self.total - self.db - self.http, 0.0)
+
+
+class CommandMetrics:
+    """
+    Per-command call counts, errors and latency, with each invocation's
+    time split into database, Discord HTTP and everything else.
+
+    ``install`` adds global before/after-invoke hooks, so prefix, hybrid
+    and slash invocations of every cog are covered. Database time comes
+    from asyncpg's query logger on every pool connection
+    (``instrument_connection``), HTTP time from wrapping the bot's REST
+    client; time spent in both at once counts twice, and interaction
+    responses do not go through the REST client.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.started = time.monotonic()
+        self.stats: Dict[str, CommandStats] = {}
+        self._latency = registry.histogram(
+            "command_latency_seconds", "Command invocation latency", ["command"]
+        )
+        self._calls = registry.counter("command_invocations_total", "Command invocations, failed ones included", ["command"])
+        self._errors = registry.counter("command_errors_total", "Failed command invocations", ["command", "error"])
+        self._split = registry.counter(
+            "command_time_seconds_total", "Command time by where it was spent", ["command", "part"]
+        )
+
+    def install(self, bot: commands.Bot) -> None:
+        bot.before_invoke(self.before_invoke)
+        bot.after_invoke(self.after_invoke)
+        bot.add_listener(self.on_command_error, "on_command_error")
+
+        request = bot.http.request
+
+        async def timed_request(*args, **kwargs):
+            timing = current_timing.get()
+            if timing is None:
+                return await request(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await request(*args, **kwargs)
+            finally:
+                timing.http += time.perf_counter() - started
+
+        bot.http.request = timed_request
+
+    async def instrument_connection(self, conn) -> None:
+        """Pool ``init`` hook: count the connection's query time towards the running command."""
+        conn.add_query_logger(self._log_query)
+
+    @staticmethod
+    def _log_query(record) -> None:
+        # Runs via call_soon in a copy of the querying task's context
+        timing = current_timing.get()
+        if timing is not None:
+            timing.db += record.elapsed
+
+    async def before_invoke(self, ctx: commands.Context) -> None:
+        timing = InvocationTiming()
+        ctx.invocation_timing = timing
+        current_timing.set(timing)
+
+    async def after_invoke(self, ctx: commands.Context) -> None:
+        if not ctx.command_failed:
+            # Let query logger callbacks scheduled by the last query run first
+            await asyncio.sleep(0)
+            self._record(ctx, None)
+
+    async def on_command_error(self, ctx: commands.Context, error: commands.CommandError) -> None:
+        if isinstance(error, commands.CommandNotFound):
+            return
+        original = getattr(error, "original", error)
+        if isinstance(error, (commands.CommandInvokeError, commands.HybridCommandError)):
+            print(f"Command {ctx.command} failed: {original!r}")
+        self._record(ctx, type(original).__name__)
+
+    def _record(self, ctx: commands.Context, error: Optional[str]) -> None:
+        name = ctx.command.qualified_name if ctx.command else "unknown"
+        stats = self.stats.setdefault(name, CommandStats())
+        timing: Optional[InvocationTiming] = getattr(ctx, "invocation_timing", None)
+        if timing is not None:
+            if timing.recorded:
+                return
+            timing.recorded = True
+            elapsed = time.perf_counter() - timing.started
+            stats.latencies.append(elapsed)
+            stats.total += elapsed
+            stats.db += timing.db
+            stats.http += timing.http
+            self._latency.observe(elapsed, command=name)
+            self._split.inc(timing.db, command=name, part="db")
+            self._split.inc(timing.http, command=name, part="http")
+            self._split.inc(max(elapsed - timing.db - timing.http, 0.0), command=name, part="other")
+            if current_timing.get() is timing:
+                current_timing.set(None)
+        stats.calls += 1
+        self._calls.inc(command=name)
+        if error is not None:
+            stats.errors += 1
+            self._errors.inc(command=name, error=error)
+
+    def report(self, limit: int = 15) -> List[str]:
+        """Table of the slowest commands by p99, with throughput since startup."""
+        minutes = max((time.monotonic() - self.started) / 60, 1 / 60)
+        lines = [
+            f"{'command':<14} {'calls':>6} {'/min':>6} {'err':>4} "
+            f"{'p50ms':>7} {'p99ms':>7} {'db':>4} {'http':>4} {'other':>5}"
+        ]
+        rows = sorted(self.stats.items(), key=lambda item: item[1].percentile(0.99), reverse=True)
+        for name, s in rows[:limit]:
+            def share(part: float) -> str:
+                return f"{part / s.total * 100:.0f}%" if s.total else "-"
+
+            lines.append(
+                f"{name[:14]:<14} {s.calls:>6} {s.calls / minutes:>6.1f} {s.errors:>4} "
+                f"{s.percentile(0.5) * 1000:>7.1f} {s.percentile(0.99) * 1000:>7.1f} "
+                f"{share(s.db):>4} {share(s.http):>4} {share(s.other):>5}"
+            )
+        return lines
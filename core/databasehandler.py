@@ -1,12 +1,251 @@
-from typing import Optional, List, Any
+from typing import AsyncIterator, Optional, List, Any, Dict, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import asyncpg as acpg
+import asyncio
 import datetime
-import math
+
+from core import queries
+
+
+class BalanceCache:
+    """
+    In-process write-behind cache of user balances.
+
+    Reads are served from an LRU of account snapshots. Point deltas are
+    gathered in memory and written back in one batched statement every
+    ``flush_interval_ms`` or once ``max_pending`` users have unflushed deltas.
+    """
+
+    def __init__(self, pool: acpg.Pool, max_size: int = 10000, flush_interval_ms: int = 1000, max_pending: int = 500):
+        self.pool = pool
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+
+        # user_id -> {"points", "daily_count"}, already including pending deltas
+        self._entries: "OrderedDict[int, Dict[str, int]]" = OrderedDict()
+        # user_id -> delta not yet written to the database
+        self._pending: Dict[int, int] = {}
+        # deltas of the flush currently running
+        self._inflight: Dict[int, int] = {}
+        self._flush_generation = 0
+        # user_id -> loads in flight, and invalidations seen while they ran
+        self._loading: Dict[int, int] = {}
+        self._invalidations: Dict[int, int] = {}
+        self._flush_done = asyncio.Event()
+        self._flush_done.set()
+        # Cleared while balances are rewritten in bulk; adds wait for it
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._pauses = 0
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Stop the flush loop and write every pending delta (hard flush)."""
+        if self._task is not None:
+            # wait_for can swallow a cancel that lands as the wake event fires, so the loop checks the flag too
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    def unflushed(self, user_id: int) -> int:
+        """Delta for ``user_id`` that the database does not contain yet."""
+        return self._pending.get(user_id, 0) + self._inflight.get(user_id, 0)
+
+    def invalidate(self, *user_ids: int) -> None:
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+            if user_id in self._loading:
+                self._invalidations[user_id] = self._invalidations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        """Drop every cached account; loads still running are read again. Pending deltas stay."""
+        self._entries.clear()
+        for user_id in self._loading:
+            self._invalidations[user_id] = self._invalidations.get(user_id, 0) + 1
+
+    @asynccontextmanager
+    async def writes_paused(self) -> AsyncIterator[None]:
+        """
+        Hold back ``add`` and write every pending delta, for rewriting
+        balances in bulk: no delta can land on top of the new balances.
+        The cached accounts are dropped when the rewrite is done.
+        """
+        self._pauses += 1
+        self._writable.clear()
+        try:
+            await self.flush()
+            yield
+        finally:
+            self._pauses -= 1
+            self.clear()
+            if not self._pauses:
+                self._writable.set()
+
+    async def get(self, user_id: int, loader) -> Dict[str, int]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return entry
+
+        self.misses += 1
+        # A flush that overlaps the read makes it unclear whether the record
+        # already contains the in-flight deltas, and a direct write invalidated
+        # during the read may have committed after it, so read again then.
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            while True:
+                while not self._flush_done.is_set():
+                    await self._flush_done.wait()
+                generation = self._flush_generation
+                invalidations = self._invalidations.get(user_id, 0)
+                record = await loader(user_id)
+                if (
+                    generation == self._flush_generation
+                    and self._flush_done.is_set()
+                    and invalidations == self._invalidations.get(user_id, 0)
+                ):
+                    break
+        finally:
+            self._loading[user_id] -= 1
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                self._invalidations.pop(user_id, None)
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = {
+                "points": record["points"] + self._pending.get(user_id, 0),
+                "daily_count": record["daily_count"],
+            }
+            self._put(user_id, entry)
+        return entry
+
+    async def add(self, user_id: int, amount: int, loader) -> int:
+        while True:
+            await self._writable.wait()
+            entry = await self.get(user_id, loader)
+            # A pause that began during the read wants the entry read again afterwards
+            if self._writable.is_set():
+                break
+        entry["points"] += amount
+        self._pending[user_id] = self._pending.get(user_id, 0) + amount
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+        return entry["points"]
+
+    def _put(self, user_id: int, entry: Dict[str, int]) -> None:
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            # Evicting is safe: unflushed deltas live in _pending, not in the entry
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def flush(self) -> int:
+        """Write all pending deltas in one statement. Returns the number of rows."""
+        while not self._flush_done.is_set():
+            await self._flush_done.wait()
+        if not self._pending:
+            return 0
+
+        self._inflight, self._pending = self._pending, {}
+        self._flush_generation += 1
+        self._flush_done.clear()
+        try:
+            # Rows are locked in user_id order, like transfers and rain do, so they can't deadlock
+            user_ids = sorted(self._inflight)
+            deltas = [self._inflight[user_id] for user_id in user_ids]
+            await self.pool.execute(queries.FLUSH_BALANCE_DELTAS, user_ids, deltas)
+            self.flushes += 1
+            self.flushed_rows += len(user_ids)
+            return len(user_ids)
+        except Exception:
+            # Put the deltas back so the next flush retries them
+            self.flush_errors += 1
+            for user_id, delta in self._inflight.items():
+                self._pending[user_id] = self._pending.get(user_id, 0) + delta
+            raise
+        finally:
+            self._inflight = {}
+            self._flush_done.set()
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # Shielded so stopping the loop never abandons a half-done flush
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"Balance cache flush error: {e}")
 
 
 class DatabaseHandler:
-    def __init__(self, pool: acpg.Pool):
+    def __init__(self, pool: acpg.Pool, cache: Optional[BalanceCache] = None, pool_manager=None, ledger=None):
         self.pool = pool
+        self.cache = cache
+        self.pool_manager = pool_manager
+        self.ledger = ledger
+
+    async def start(self) -> None:
+        if self.cache is not None:
+            self.cache.start()
+        if self.ledger is not None:
+            self.ledger.start()
+
+    async def close(self) -> None:
+        if self.cache is not None:
+            await self.cache.close()
+        if self.ledger is not None:
+            await self.ledger.close()
+
+    async def _log(self, user_id: int, delta: int, reason: str, ref: Optional[int] = None) -> None:
+        # Balance changes are appended to the ledger once they took effect
+        if self.ledger is not None:
+            await self.ledger.record(user_id, delta, reason, ref)
 
     async def execute(self, query: str, *args):
         return await self.pool.execute(query, *args)
@@ -25,124 +264,217 @@ class DatabaseHandler:
         )
 
     # Get user balance
-    async def get_user_balance(self, user_id) -> List[acpg.Record]:
-        await self.create_user_if_not_exist(user_id)
-        async with self.pool.acquire() as conn:
-            conn: acpg.Connection
-            record = await conn.fetchrow(
-                "SELECT points, daily_count FROM users WHERE user_id = $1", user_id
-            )
-            return record
+    async def get_user_balance(self, user_id) -> acpg.Record:
+        if self.cache is not None:
+            return dict(await self.cache.get(user_id, self._fetch_user_balance))
+        return await self._fetch_user_balance(user_id)
 
-    async def get_user_streak_count(self, user_id) -> int:
-        await self.create_user_if_not_exist(user_id)
+    async def _fetch_user_balance(self, user_id) -> acpg.Record:
+        record = await self.pool.fetchrow(queries.GET_OR_CREATE_USER, user_id)
+        if record is None:
+            # Lost an insert race with a concurrent first command; the row is
+            # committed now, so a second read sees it
+            record = await self.pool.fetchrow(queries.GET_OR_CREATE_USER, user_id)
+        return record
 
-        query = "SELECT daily_count FROM users WHERE user_id = $1"
-        return await self.pool.fetchval(query, user_id)
+    async def get_user_streak_count(self, user_id) -> int:
+        if self.cache is not None:
+            return (await self.cache.get(user_id, self._fetch_user_balance))["daily_count"]
+        record = await self._fetch_user_balance(user_id)
+        return record["daily_count"]
 
     # Add Points
-    async def add_points(self, user_id: int, amount: int) -> int:
-        await self.create_user_if_not_exist(user_id)
-
-        new_balance = await self.pool.fetchval(
-            "UPDATE users SET points = points + $2 WHERE user_id = $1 RETURNING points",
-            user_id,
-            amount,
-        )
-        return new_balance
+    async def add_points(self, user_id: int, amount: int, reason: str = "add") -> int:
+        if self.cache is not None:
+            balance = await self.cache.add(user_id, amount, self._fetch_user_balance)
+        else:
+            balance = await self.pool.fetchval(queries.ADD_POINTS, user_id, amount)
+        await self._log(user_id, amount, reason)
+        return balance
 
     # Reduce Points
-    async def reduce_points(self, user_id: int, amount: int) -> int:
-        await self.create_user_if_not_exist(user_id)
-        # check for avaiable points
-        new_balance = await self.pool.fetchval(
-            "UPDATE users SET points = points - $2 WHERE user_id = $1 RETURNING points",
-            user_id,
-            amount,
-        )
-        return new_balance
+    async def reduce_points(self, user_id: int, amount: int, reason: str = "reduce") -> int:
+        return await self.add_points(user_id, -amount, reason)
 
     # Process Claim
     async def process_daily_claim(
         self, user_id, daily_amount: int, interest_rate: float, cooldown: int
-    ) -> tuple[bool, int, int, int, int]:
+    ) -> tuple[bool, int, int, int, Optional[float]]:
         """
         Returns
         -------
-        tuple[bool, int, int, int, int]
+        tuple[bool, int, int, int, Optional[float]]
             A 5-element tuple containing:
             1. bool: True if the bonus was successfully claimed, False otherwise.
             2. int: Today claim points.
             3. int: The user's new (or current) total points.
             4. int: The user's claim streak
-            5. Optional[timedelta]: If the claim was unsuccessful (False), this is the
-               time remaining until the user can claim again. If successful (True), this is None.
+            5. Optional[float]: If the claim was unsuccessful (False), this is the
+               seconds remaining until the user can claim again. If successful (True)
+               or the query failed, this is None.
         """
         current_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
         try:
-            async with self.pool.acquire() as conn:
-                conn: acpg.Connection
-                await self.create_user_if_not_exist(user_id)
-
-                claim_record = await conn.fetchrow(
-                    "SELECT daily_count, last_daily FROM users WHERE user_id = $1",
-                    user_id,
-                )
-                time_since_last_claim = current_time - claim_record["last_daily"]
-                seconds_remaining = cooldown - time_since_last_claim.total_seconds()
-                if seconds_remaining > 0:
-                    return False, 0, 0, 0, seconds_remaining
-
-                daily_bonus = round(
-                    daily_amount
-                    * math.pow((1 + interest_rate), claim_record["daily_count"])
-                )
-
-                new_balance = await conn.fetchval(
-                    "UPDATE users SET points = points + $2, last_daily = $3, daily_count = daily_count + 1 WHERE user_id = $1 RETURNING points",
-                    user_id,
-                    daily_bonus,
-                    current_time,
-                )
-
-                return True, daily_bonus, new_balance, claim_record["daily_count"], None
+            # Cooldown check, compound bonus and update run as one statement,
+            # so concurrent claims cannot both pass the check
+            args = (user_id, daily_amount, interest_rate, current_time, float(cooldown))
+            record = await self.pool.fetchrow(queries.PROCESS_DAILY_CLAIM, *args)
+            if record is None:
+                # Lost the insert race for a brand new account; it is visible now
+                record = await self.pool.fetchrow(queries.PROCESS_DAILY_CLAIM, *args)
+            if record is None:
+                return False, 0, 0, 0, None
+            if not record["claimed"]:
+                return False, 0, 0, 0, record["seconds_remaining"]
+
+            new_balance = self._settled(record["points"], user_id)
+            await self._log(user_id, record["bonus"], "daily")
+            return True, record["bonus"], new_balance, record["streak"], None
         except Exception as e:
+            print(f"daily claim error for {user_id}: {e}")
             return False, 0, 0, 0, None
 
     # Transer Points From User To User
     async def transfer_point(
         self, src_user_id: int, end_user_id: int, amount: int
-    ) -> tuple[bool, int]:
+    ) -> tuple[bool, Optional[int]]:
+        """
+        Move ``amount`` points from one user to another in a single statement.
+
+        Returns
+        -------
+        tuple[bool, Optional[int]]
+            1. bool: False if the query failed.
+            2. Optional[int]: The sender's new balance, or None if the sender
+               does not have enough points.
+        """
         try:
-            async with self.pool.acquire() as conn:
-                conn: acpg.Connection
-
-                current_src_user_points = await conn.fetchval(
-                    "SELECT points FROM users WHERE user_id = $1", src_user_id
-                )
-                if current_src_user_points < amount:
-                    return True, 0
-                async with conn.transaction():
-                    await self.create_user_if_not_exist(end_user_id)
-                    await self.pool.execute(
-                        "UPDATE users SET points = points - $2 WHERE user_id = $1",
-                        src_user_id,
-                        amount,
-                    )
-                    new_balance = await self.pool.execute(
-                        "UPDATE users SET points = points + $2 WHERE user_id = $1 RETURNING points",
-                        end_user_id,
-                        amount,
-                    )
-                return True, new_balance
+            await self._flush_unwritten(src_user_id)
+            record = await self._pay(queries.TRANSFER_POINTS, src_user_id, end_user_id, amount, [end_user_id])
+            src_balance = self._settled(record["points"], src_user_id, end_user_id)
+            if src_balance is not None:
+                await self._log(src_user_id, -amount, "transfer", end_user_id)
+                await self._log(end_user_id, amount, "transfer", src_user_id)
+            return True, src_balance
         except Exception as e:
             print(f"transfer points error for {src_user_id}: {e}")
-            return False, 0
+            return False, None
+
+    # Pay The Same Amount From One User To Many
+    async def rain_points(
+        self, src_user_id: int, recipient_ids: List[int], amount: int
+    ) -> tuple[bool, Optional[int], int]:
+        """
+        Pay ``amount`` points to every recipient out of the sender's balance
+        in a single statement. Duplicate recipients and the sender are dropped.
+
+        Returns
+        -------
+        tuple[bool, Optional[int], int]
+            1. bool: False if the query failed.
+            2. Optional[int]: The sender's new balance, or None if the sender
+               cannot cover ``amount`` for every recipient.
+            3. int: Number of recipients paid.
+        """
+        # Ascending, like every multi-row write, so rows are locked in one order
+        recipients = sorted(uid for uid in set(recipient_ids) if uid != src_user_id)
+        if not recipients:
+            return True, None, 0
+        try:
+            await self._flush_unwritten(src_user_id)
+            record = await self._pay(queries.RAIN_POINTS, src_user_id, recipients, amount, recipients)
+            if record["points"] is None:
+                return True, None, 0
+            src_balance = self._settled(record["points"], src_user_id, *recipients)
+            await self._log(src_user_id, -amount * record["paid"], "rain")
+            for recipient in recipients:
+                await self._log(recipient, amount, "rain", src_user_id)
+            return True, src_balance, record["paid"]
+        except Exception as e:
+            print(f"rain points error for {src_user_id}: {e}")
+            return False, None, 0
+
+    async def _pay(self, query: str, src_user_id: int, recipients, amount: int, ensure: List[int]) -> acpg.Record:
+        # Recipients without a row are created on their own first, then the payment runs again
+        while True:
+            record = await self.pool.fetchrow(query, src_user_id, recipients, amount)
+            if not record["missing"]:
+                return record
+            await self.pool.execute(queries.ENSURE_USERS, ensure)
+
+    async def _flush_unwritten(self, user_id: int) -> None:
+        # Balance checks run in SQL, so cached deltas must reach the table first
+        if self.cache is not None and self.cache.unflushed(user_id):
+            await self.cache.flush()
+
+    def _settled(self, balance: Optional[int], user_id: int, *touched: int) -> Optional[int]:
+        # Drop cache entries a direct write made stale
+        if self.cache is None:
+            return balance
+        self.cache.invalidate(user_id, *touched)
+        if balance is None:
+            return None
+        return balance + self.cache.unflushed(user_id)
+
+    # Wagered Gamba
+    async def settle_bets(
+        self, user_id: int, game: str, wager: int, plays: List[Tuple[int, str]]
+    ) -> Optional[int]:
+        """
+        Debit ``wager`` for every play, credit the ``(payout, outcome)`` plays
+        and record each in ``bets``, all in one statement.
+
+        Returns the new balance, or None if the balance does not cover
+        ``wager`` for every play (nothing is written then).
+        """
+        await self._flush_unwritten(user_id)
+        balance = await self.pool.fetchval(
+            queries.SETTLE_BETS,
+            user_id,
+            wager,
+            [payout for payout, _ in plays],
+            [outcome for _, outcome in plays],
+            game,
+        )
+        balance = self._settled(balance, user_id)
+        if balance is not None:
+            await self._log(user_id, sum(payout for payout, _ in plays) - wager * len(plays), f"bet:{game}")
+        return balance
+
+    # Candy Spin
+    async def spin(
+        self, user_id: int, points: int, now: datetime.datetime, spins_per_cycle: int, reset_hours: int
+    ) -> Optional[acpg.Record]:
+        """
+        Reset the spin cycle if it expired, check the quota, and record a spin
+        worth ``points`` in one statement.
+
+        Returns the user's spins row with an extra ``spun`` column that is
+        False when the quota was already used up.
+        """
+        args = (user_id, points, now, spins_per_cycle, reset_hours)
+        record = await self.pool.fetchrow(queries.SPIN, *args)
+        if record is None:
+            # Lost the insert race for a brand new row; it is visible now
+            record = await self.pool.fetchrow(queries.SPIN, *args)
+        return record
+
+    # Candy Leaderboards
+    async def get_spin_leaderboard(self, limit: int) -> List[acpg.Record]:
+        return await self.pool.fetch(queries.TOP_SPINS_TOTAL, limit)
+
+    async def get_weekly_spin_leaderboard(self, limit: int) -> List[acpg.Record]:
+        return await self.pool.fetch(queries.TOP_SPINS_WEEKLY, limit)
+
+    async def get_weekly_spin_participants(self) -> List[int]:
+        records = await self.pool.fetch(queries.WEEKLY_SPIN_PARTICIPANTS)
+        return [r["user_id"] for r in records]
 
-    # Get All Memetics
-    async def get_memetics(self) -> List[acpg.Record]:
-        records = await self.pool.fetch("SELECT name, icon, description FROM memetics")
-        return records
+    async def reset_weekly_spin_points(self) -> None:
+        await self.pool.execute(queries.RESET_WEEKLY_SPIN_POINTS)
 
     async def reconnect(self) -> bool:
-        pass
+        """Swap in a fresh pool; statements already running finish on the old one."""
+        if self.pool_manager is None:
+            return False
+        return await self.pool_manager.reconnect()
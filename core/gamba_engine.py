@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Plays run between checks of the time budget
+CHUNK_PLAYS = 1 << 14
+
+
+@dataclass(frozen=True)
+class Outcome:
+    name: str
+    probability: float
+    payout: int
+
+
+@dataclass(frozen=True)
+class Game:
+    """
+    A game as its winning outcomes; whatever probability is left pays nothing.
+
+    Expected value and variance follow from the table directly. ``play``
+    is one play through the code the commands run. ``draws`` lists every
+    result the command's randomness can produce with its probability and
+    what the command's payout code pays for it, so a simulation samples
+    results in bulk and still checks that code against the table.
+    """
+
+    name: str
+    outcomes: Tuple[Outcome, ...]
+    play: Callable[[random.Random], int] = field(compare=False)
+    draws: Tuple[Outcome, ...] = field(compare=False)
+
+    @property
+    def win_probability(self) -> float:
+        return sum(o.probability for o in self.outcomes)
+
+    def expected_value(self) -> float:
+        return sum(o.probability * o.payout for o in self.outcomes)
+
+    def variance(self) -> float:
+        return sum(o.probability * o.payout ** 2 for o in self.outcomes) - self.expected_value() ** 2
+
+
+def slots_game(symbols: Sequence[str], multiplier: int, reels: int = 3, base: int = 100) -> Game:
+    """Uniform reels; only all-same lines win, paying ``base * multiplier``."""
+    line = 1 / len(symbols) ** reels
+    return Game(
+        "slots",
+        tuple(Outcome(f"{s}x{reels}", line, slots_payout([s] * reels, base, multiplier)) for s in symbols),
+        partial(play_slots, tuple(symbols), multiplier, reels, base),
+        tuple(
+            Outcome("".join(results), line, slots_payout(results, base, multiplier))
+            for results in itertools.product(symbols, repeat=reels)
+        ),
+    )
+
+
+def roulette_game(trials: int, chamber: int = 6, wager: int = 100, return_rate: float = 0.95) -> Game:
+    """Surviving ``trials`` pulls of a ``chamber``-round revolver with one marked chamber, for ``wager``."""
+    payout = roulette_payout(wager, trials, chamber, return_rate)
+    alive = (1 - 1 / chamber) ** trials
+    return Game(
+        "roulette",
+        (Outcome("alive", alive, payout),),
+        partial(play_roulette, trials, chamber, wager, return_rate),
+        tuple(
+            Outcome(f"dead@{death}" if death else "alive", p, roulette_winnings(death, wager, trials, chamber, return_rate))
+            for death, p in [(None, alive)] + [(k, (1 - 1 / chamber) ** (k - 1) / chamber) for k in range(1, trials + 1)]
+        ),
+    )
+
+
+def roulette_multiplier(trials: int, chamber: int = 6, return_rate: float = 0.95) -> float:
+    """Payout per point wagered for surviving ``trials`` pulls, returning ``return_rate`` on average."""
+    return return_rate / (1 - 1 / chamber) ** trials
+
+
+def spin_reels(symbols: Sequence[str], reels: int = 3, rng: random.Random = random) -> List[str]:
+    return [rng.choice(symbols) for _ in range(reels)]
+
+
+def slots_payout(results: Sequence[str], wager: int, multiplier: int) -> int:
+    """``wager * multiplier`` when every reel shows the same symbol, else nothing."""
+    return wager * multiplier if len(set(results)) == 1 else 0
+
+
+def roulette_payout(wager: int, trials: int, chamber: int = 6, return_rate: float = 0.95) -> int:
+    """Points paid for surviving ``trials`` pulls, rounded down; below ``return_rate`` for small wagers."""
+    return int(wager * roulette_multiplier(trials, chamber, return_rate))
+
+
+def play_slots(symbols: Sequence[str], multiplier: int, reels: int, wager: int, rng: random.Random = random) -> int:
+    return slots_payout(spin_reels(symbols, reels, rng), wager, multiplier)
+
+
+def roulette_winnings(death: Optional[int], wager: int, trials: int, chamber: int = 6, return_rate: float = 0.95) -> int:
+    """What a wagered roulette pays for the pull ``death`` it died on (None: survived)."""
+    return 0 if death is not None else roulette_payout(wager, trials, chamber, return_rate)
+
+
+def play_roulette(trials: int, chamber: int, wager: int, return_rate: float, rng: random.Random = random) -> int:
+    return roulette_winnings(roulette_death(trials, chamber, rng), wager, trials, chamber, return_rate)
+
+
+def first_success(p: float, rng: random.Random = random) -> Optional[int]:
+    """
+    1-based index of the first success of a run of Bernoulli(``p``) trials,
+    sampled by inverting the geometric CDF: O(1) however long the run.
+    """
+    if p <= 0:
+        return None
+    if p >= 1:
+        return 1
+    return int(math.log(1.0 - rng.random()) / math.log1p(-p)) + 1
+
+
+def roulette_death(trials: int, chamber: int = 6, rng: random.Random = random) -> Optional[int]:
+    """Pull on which the marked chamber comes up within ``trials`` pulls, or None when alive."""
+    pull = first_success(1 / chamber, rng)
+    return pull if pull is not None and pull <= trials else None
+
+
+def count_successes(p: float, n: int, rng: random.Random = random) -> int:
+    """
+    Binomial(``n``, ``p``) sample by jumping from one success to the next:
+    O(n * p) work instead of one draw per trial.
+    """
+    if p > 0.5:
+        # Cheaper to place the failures
+        return n - count_successes(1 - p, n, rng)
+    count = 0
+    position = 0
+    while True:
+        gap = first_success(p, rng)
+        if gap is None:
+            return count
+        position += gap
+        if position > n:
+            return count
+        count += 1
+
+
+@dataclass
+class SimulationResult:
+    game: Game
+    requested: int
+    plays: int
+    total: int
+    total_squares: int
+    elapsed: float
+
+    @property
+    def truncated(self) -> bool:
+        return self.plays < self.requested
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.plays if self.plays else 0.0
+
+    @property
+    def variance(self) -> float:
+        if self.plays < 2:
+            return 0.0
+        return max(self.total_squares - self.plays * self.mean ** 2, 0.0) / (self.plays - 1)
+
+    @property
+    def stderr(self) -> float:
+        return math.sqrt(self.variance / self.plays) if self.plays else 0.0
+
+    def summary(self) -> str:
+        game = self.game
+        lines = [
+            f"{game.name}: {self.plays:,} plays in {self.elapsed:.2f}s"
+            + (f" (time budget hit, {self.requested:,} requested)" if self.truncated else ""),
+            f"  EV       {self.mean:12.4f} ± {1.96 * self.stderr:.4f}   exact {game.expected_value():12.4f}",
+            f"  variance {self.variance:12.2f}            exact {game.variance():12.2f}",
+            f"  win rate {game.win_probability:.6f}",
+        ]
+        return "\n".join(lines)
+
+
+def simulate(game: Game, plays: int, budget: float = 2.0, seed: Optional[int] = None) -> SimulationResult:
+    """
+    Monte Carlo run of ``plays`` plays over ``game.draws``, in chunks until
+    ``budget`` seconds are used up. The paying plays of a chunk are
+    counted by ``count_successes`` and then given a result by weight, so
+    the cost grows with the wins, not the plays.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    deadline = started + budget
+    # Which results pay is up to the command's payout code, not the outcome table
+    paying = [d for d in game.draws if d.payout]
+    p_win = sum(d.probability for d in paying)
+    weights = [d.probability for d in paying]
+    payouts = [d.payout for d in paying]
+    done = 0
+    total = 0
+    squares = 0
+    while done < plays and time.perf_counter() < deadline:
+        chunk = min(CHUNK_PLAYS, plays - done)
+        wins = count_successes(p_win, chunk, rng)
+        if wins:
+            for payout in rng.choices(payouts, weights, k=wins):
+                total += payout
+                squares += payout * payout
+        done += chunk
+    return SimulationResult(game, plays, done, total, squares, time.perf_counter() - started)
+
+
+class GambaEngine:
+    """
+    Runs simulations off the event loop.
+
+    Work goes to a single worker process by default, so a long simulation
+    cannot starve the bot of the GIL; the worker stops by itself at the
+    time budget and the wait for it is cut off shortly after.
+    """
+
+    def __init__(self, budget: float = 2.0, executor: Optional[Executor] = None):
+        self.budget = budget
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1)
+        return self._executor
+
+    async def simulate(self, game: Game, plays: int, budget: Optional[float] = None) -> SimulationResult:
+        budget = self.budget if budget is None else budget
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, simulate, game, plays, budget)
+        # Room for process start-up on the first call
+        return await asyncio.wait_for(future, timeout=budget + 5.0)
+
+    async def close(self) -> None:
+        if self._owns_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            # Waits out a running simulation (bounded by its budget) without blocking the loop
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Monte Carlo expected value and variance of the gamba games")
+    parser.add_argument("game", choices=["slots", "roulette"])
+    parser.add_argument("--plays", type=int, default=10_000_000)
+    parser.add_argument("--multiplier", type=int, nargs="+", default=[5], help="slots WIN_MULTIPLIER values to compare")
+    parser.add_argument("--trials", type=int, default=1, help="roulette pulls per game")
+    parser.add_argument("--wager", type=int, default=100, help="roulette points wagered per game")
+    parser.add_argument("--budget", type=float, default=60.0, help="seconds per simulation")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    from cogs.gamba import CHAMBER, ROULETTE_RETURN, SLOTS_SYMBOLS
+
+    if args.game == "slots":
+        games = [slots_game(SLOTS_SYMBOLS, m) for m in args.multiplier]
+    else:
+        games = [roulette_game(args.trials, CHAMBER, args.wager, ROULETTE_RETURN)]
+    for game in games:
+        if args.game == "slots":
+            print(f"WIN_MULTIPLIER = {game.outcomes[0].payout // 100}")
+        print(simulate(game, args.plays, args.budget, args.seed).summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+ChunkHandler = Callable[[List[discord.Message]], Awaitable[None]]
+
+HISTORY_CHUNK_SIZE = 100  # Discord's page size for message history
+
+
+class CrawlProgress:
+    """Streams crawl progress into a single status message, edited at most every ``interval`` seconds."""
+
+    def __init__(self, message: Optional[discord.Message], title: str, interval: float = 3.0):
+        self.message = message
+        self.title = title
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.finished: Dict[str, bool] = {}
+        self._last_edit = 0.0
+
+    def render(self) -> str:
+        total = sum(self.counts.values())
+        lines = [f"{self.title} — **{total}** messages"]
+        for name, count in self.counts.items():
+            mark = "✅" if self.finished.get(name) else "⏳"
+            lines.append(f"{mark} #{name}: {count}")
+        return "\n".join(lines[:25])
+
+    async def update(self, channel, added: int, done: bool = False) -> None:
+        name = getattr(channel, "name", str(channel.id))
+        self.counts[name] = self.counts.get(name, 0) + added
+        if done:
+            self.finished[name] = True
+        now = time.monotonic()
+        if done or now - self._last_edit >= self.interval:
+            await self._edit()
+
+    async def _edit(self) -> None:
+        self._last_edit = time.monotonic()
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(content=self.render())
+        except discord.HTTPException as e:
+            print(f"Crawl progress edit failed: {e}")
+
+
+class HistoryCrawler:
+    """
+    Walks channel history in pages of ``HISTORY_CHUNK_SIZE`` messages.
+
+    Every page is handed to a chunk handler, which is expected to persist
+    the page together with its checkpoint, so an interrupted crawl resumes
+    from the last saved page. A global semaphore caps how many channels
+    are crawled at once across all callers; discord.py's HTTP client takes
+    care of per-route rate limit buckets, and ``chunk_delay`` adds a pause
+    between pages on top of that.
+    """
+
+    def __init__(self, max_concurrency: int = 3, chunk_delay: float = 0.0):
+        self.chunk_delay = chunk_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def crawl(
+        self,
+        channel: discord.abc.Messageable,
+        handler: ChunkHandler,
+        *,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        progress: Optional[CrawlProgress] = None,
+    ) -> int:
+        """
+        Crawl messages older than ``before`` (newest first) or, when ``after``
+        is given, newer than ``after`` and older than ``before`` (oldest first).
+        Returns the number of messages handed to ``handler``.
+        """
+        total = 0
+        async with self._semaphore:
+            while True:
+                page = [
+                    message
+                    async for message in channel.history(
+                        limit=HISTORY_CHUNK_SIZE,
+                        before=discord.Object(id=before) if before else None,
+                        after=discord.Object(id=after) if after else None,
+                        oldest_first=after is not None,
+                    )
+                ]
+                if not page:
+                    break
+                await handler(page)
+                total += len(page)
+                if progress is not None:
+                    await progress.update(channel, len(page))
+
+                if after is not None:
+                    after = max(m.id for m in page)
+                else:
+                    before = min(m.id for m in page)
+                if len(page) < HISTORY_CHUNK_SIZE:
+                    break
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+
+        if progress is not None:
+            await progress.update(channel, 0, done=True)
+        return total
+
+    async def crawl_many(self, channels, crawl_one: Callable[[discord.abc.Messageable], Awaitable[object]]) -> list:
+        """Run ``crawl_one`` for every channel; the semaphore bounds parallelism."""
+        return await asyncio.gather(*(crawl_one(c) for c in channels), return_exceptions=True)
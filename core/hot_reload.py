@@ -0,0 +1,266 @@
+import ast
+import asyncio
+import hashlib
+import importlib
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from discord.ext import commands
+
+ReportCallback = Callable[[str], Awaitable[None]]
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WATCHED_PACKAGES = ("cogs", "core")
+
+
+@dataclass
+class ReloadReport:
+    core_reloaded: List[str] = field(default_factory=list)
+    loaded: List[str] = field(default_factory=list)
+    reloaded: List[str] = field(default_factory=list)
+    unloaded: List[str] = field(default_factory=list)
+    # module -> error; failed extensions keep running their previous version
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        lines = [f"♻️ Hot reload in {self.elapsed * 1000:.0f} ms"]
+        for label, names in (
+            ("core", self.core_reloaded),
+            ("reloaded", self.reloaded),
+            ("loaded", self.loaded),
+            ("unloaded", self.unloaded),
+        ):
+            if names:
+                lines.append(f"  {label}: {', '.join(names)}")
+        for name, error in self.failed.items():
+            lines.append(f"  ❌ {name} rolled back: {error}")
+        return "\n".join(lines)
+
+
+def _module_name(path: str) -> str:
+    return os.path.relpath(path, ROOT)[:-3].replace(os.sep, ".")
+
+
+def _core_imports(path: str) -> Set[str]:
+    """``core.*`` modules imported by the file at ``path``."""
+    with open(path, encoding="utf-8-sig") as f:
+        tree = ast.parse(f.read(), filename=path)
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(a.name for a in node.names if a.name.startswith("core."))
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == "core":
+                found.update(f"core.{a.name}" for a in node.names)
+            elif node.module.startswith("core."):
+                found.add(node.module)
+    return found
+
+
+class HotReloader:
+    """
+    Watches ``cogs/`` and ``core/`` and reloads what changed in place.
+
+    Files are polled by mtime and confirmed by a hash of their source, so
+    touching a file without editing it does nothing. Edits are batched
+    until the tree has been quiet for ``debounce`` seconds. A batch reloads
+    the changed ``core`` modules (dependencies first) and then every
+    extension whose own file or imported ``core`` modules changed. A
+    failing extension keeps its previous version, which discord.py's
+    ``reload_extension`` restores; a failing ``core`` module gets its old
+    namespace back. Objects created at startup (the pool, the handler, ...)
+    keep their original code until a restart.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        poll_interval: float = 1.0,
+        debounce: float = 0.5,
+        report: Optional[ReportCallback] = None,
+        after_reload: Optional[Callable[[], Awaitable[object]]] = None,
+    ):
+        self.bot = bot
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.report = report
+        self.after_reload = after_reload
+        self._mtimes: Dict[str, float] = {}
+        self._hashes: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._scan()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _files(self) -> List[str]:
+        files = []
+        for package in WATCHED_PACKAGES:
+            directory = os.path.join(ROOT, package)
+            for filename in os.listdir(directory):
+                if filename.endswith(".py") and not filename.startswith("_"):
+                    files.append(os.path.join(directory, filename))
+        return files
+
+    def _scan(self) -> Set[str]:
+        """Paths whose content changed, appeared or disappeared since the last scan."""
+        changed = set()
+        seen = set()
+        for path in self._files():
+            seen.add(path)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if self._mtimes.get(path) == mtime:
+                continue
+            self._mtimes[path] = mtime
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            if self._hashes.get(path) != digest:
+                if path in self._hashes:
+                    changed.add(path)
+                elif os.path.basename(os.path.dirname(path)) == "cogs":
+                    # New cog file
+                    changed.add(path)
+                self._hashes[path] = digest
+        for path in set(self._hashes) - seen:
+            del self._hashes[path]
+            self._mtimes.pop(path, None)
+            changed.add(path)
+        return changed
+
+    async def _watch_loop(self) -> None:
+        pending: Set[str] = set()
+        quiet_since = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.poll_interval, self.debounce) if pending else self.poll_interval)
+            try:
+                changed = self._scan()
+                now = time.monotonic()
+                if changed:
+                    pending |= changed
+                    quiet_since = now
+                    continue
+                if pending and now - quiet_since >= self.debounce:
+                    batch, pending = pending, set()
+                    await self.reload_paths(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Hot reload error: {e}")
+
+    def _core_dependencies(self, module: str, graph: Dict[str, Set[str]]) -> Set[str]:
+        """Every ``core`` module ``module`` imports, directly or indirectly."""
+        seen: Set[str] = set()
+        stack = list(graph.get(module, ()))
+        while stack:
+            name = stack.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            stack.extend(graph.get(name, ()))
+        return seen
+
+    def _import_graph(self) -> Dict[str, Set[str]]:
+        graph = {}
+        for path in self._hashes:
+            try:
+                graph[_module_name(path)] = _core_imports(path)
+            except SyntaxError:
+                graph[_module_name(path)] = set()
+        return graph
+
+    async def reload_now(self) -> ReloadReport:
+        """Reload whatever changed since the last scan, without waiting."""
+        return await self.reload_paths(self._scan())
+
+    async def reload_paths(self, paths: Set[str]) -> ReloadReport:
+        """Reload everything affected by changes to ``paths``."""
+        async with self._lock:
+            started = time.perf_counter()
+            report = ReloadReport()
+            changed = {_module_name(p) for p in paths}
+            graph = self._import_graph()
+
+            changed_core = {m for m in changed if m.startswith("core.") and m in sys.modules}
+            # Dependencies first, so a reloaded module sees its reloaded imports
+            ordered_core = sorted(changed_core, key=lambda m: len(self._core_dependencies(m, graph) & changed_core))
+            for name in ordered_core:
+                error = self._reload_core(name)
+                if error is None:
+                    report.core_reloaded.append(name)
+                else:
+                    report.failed[name] = error
+
+            reloaded_core = set(report.core_reloaded)
+            for path in sorted(paths):
+                name = _module_name(path)
+                if not name.startswith("cogs.") or name in self.bot.extensions:
+                    continue
+                if os.path.exists(path):
+                    await self._apply(report, name, self.bot.load_extension, report.loaded)
+            for name in sorted(self.bot.extensions):
+                if name in report.loaded:
+                    continue
+                path = os.path.join(ROOT, *name.split(".")) + ".py"
+                if not os.path.exists(path):
+                    await self._apply(report, name, self.bot.unload_extension, report.unloaded)
+                elif name in changed or self._core_dependencies(name, graph) & reloaded_core:
+                    await self._apply(report, name, self.bot.reload_extension, report.reloaded)
+
+            report.elapsed = time.perf_counter() - started
+            print(report.summary())
+            if self.after_reload is not None and (report.loaded or report.reloaded or report.unloaded):
+                try:
+                    await self.after_reload()
+                except Exception as e:
+                    print(f"Hot reload: post-reload hook failed: {e}")
+            if self.report is not None:
+                try:
+                    await self.report(report.summary())
+                except Exception as e:
+                    print(f"Hot reload: report failed: {e}")
+            return report
+
+    @staticmethod
+    async def _apply(report: ReloadReport, name: str, action, done: List[str]) -> None:
+        try:
+            await action(name)
+            done.append(name)
+        except commands.ExtensionFailed as e:
+            report.failed[name] = str(e.original)
+        except Exception as e:
+            report.failed[name] = str(e)
+
+    @staticmethod
+    def _reload_core(name: str) -> Optional[str]:
+        module = sys.modules[name]
+        previous = dict(module.__dict__)
+        try:
+            importlib.reload(module)
+        except Exception as e:
+            # reload re-executes in place: put the old namespace back
+            module.__dict__.clear()
+            module.__dict__.update(previous)
+            return f"{type(e).__name__}: {e}"
+        return None
@@ -1,18 +1,117 @@
-from flask import Flask
-from threading import Thread
+import asyncio
+import json
+import time
+from typing import Optional
 
-app = Flask("")
+from aiohttp import web
 
+from core.metrics import REGISTRY, MetricsRegistry
 
-@app.route("/")
-def home():
-    return "Bot is running."
+DB_PING_TIMEOUT = 2.0
 
 
-def run():
-    app.run(host="0.0.0.0", port=8080)
+class HealthServer:
+    """
+    Keep-alive, health and metrics endpoints served by aiohttp on the
+    bot's own event loop.
 
+    ``/`` answers keep-alive pings, ``/healthz`` checks the gateway and the
+    database, ``/readyz`` whether startup finished and the bot is ready,
+    and ``/metrics`` exposes ``REGISTRY`` in the Prometheus text format.
+    """
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+    def __init__(self, bot, host: str = "0.0.0.0", port: int = 8080, registry: MetricsRegistry = REGISTRY):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.started_at = time.monotonic()
+        self._runner: Optional[web.AppRunner] = None
+
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", self.metrics)
+        self.app = app
+
+        self._gauges = {
+            "ready": registry.gauge("bot_ready", "1 once the bot is connected and ready"),
+            "uptime": registry.gauge("bot_uptime_seconds", "Seconds since the process started serving"),
+            "latency": registry.gauge("discord_gateway_latency_seconds", "Gateway heartbeat latency"),
+            "guilds": registry.gauge("discord_guilds", "Guilds the bot is in"),
+        }
+        self._cache_events = registry.counter(
+            "balance_cache_events_total", "Balance cache events (hits, misses, evictions, flushes, ...)", ["event"]
+        )
+        self._cache_gauges = {
+            "hit_rate": registry.gauge("balance_cache_hit_ratio", "Share of balance reads served from the cache"),
+            "size": registry.gauge("balance_cache_entries", "Balances held in the cache"),
+            "pending": registry.gauge("balance_cache_pending_deltas", "Balance changes waiting to be flushed"),
+        }
+        registry.add_collector(self.collect)
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"🩺 Health server listening on {self.host}:{self.port}")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def collect(self) -> None:
+        bot = self.bot
+        gauges = self._gauges
+        gauges["ready"].set(1 if bot.is_ready() else 0)
+        gauges["uptime"].set(round(time.monotonic() - self.started_at, 3))
+        if bot.is_ready():
+            gauges["latency"].set(round(bot.latency, 4))
+        gauges["guilds"].set(len(bot.guilds))
+
+        cache = bot.db_handler.cache if bot.db_handler is not None else None
+        if cache is not None:
+            for key, value in cache.stats().items():
+                gauge = self._cache_gauges.get(key)
+                if gauge is not None:
+                    gauge.set(value)
+                else:
+                    self._cache_events.set(value, event=key)
+
+    def gateway_ok(self) -> bool:
+        return not self.bot.is_closed() and self.bot.is_ready() and self.bot.latency != float("inf")
+
+    async def database_ok(self) -> bool:
+        pool = self.bot.db_pool
+        if pool is None:
+            return False
+        try:
+            await asyncio.wait_for(pool.fetchval("SELECT 1"), timeout=DB_PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _json(checks: dict) -> web.Response:
+        status = 200 if all(checks.values()) else 503
+        return web.Response(status=status, text=json.dumps(checks), content_type="application/json")
+
+    async def home(self, request: web.Request) -> web.Response:
+        return web.Response(text="Bot is running.")
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return self._json({"gateway": self.gateway_ok(), "database": await self.database_ok()})
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        return self._json({
+            "ready": self.bot.is_ready(),
+            "database": self.bot.pool_manager is not None and self.bot.pool_manager.available,
+            "cogs": bool(self.bot.cogs),
+        })
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
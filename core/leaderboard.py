@@ -0,0 +1,77 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class TopK:
+    """
+    Bounded, sorted leaderboard of the ``capacity`` highest scores.
+
+    Scores only ever move up between resets (spins add points, the weekly
+    reset goes through ``clear``), so a user outside the board can only
+    enter it through their own update and the board stays exact once it is
+    seeded from the database. Ties are ordered by user id, the same as the
+    seeding queries.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seeded = False
+        self._scores: Dict[int, int] = {}
+        # (-score, user_id), ascending == best first
+        self._order: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def seed(self, rows: Iterable[Tuple[int, int]]) -> None:
+        """Replace the board with ``(user_id, score)`` rows from the database."""
+        self._order = sorted((-score, user_id) for user_id, score in rows if score > 0)
+        del self._order[self.capacity:]
+        self._scores = {user_id: -neg for neg, user_id in self._order}
+        self.seeded = True
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after all scores were reset to zero."""
+        self._scores = {}
+        self._order = []
+
+    def update(self, user_id: int, score: int) -> bool:
+        """
+        Offer a user's new absolute score. Lower scores than the one already
+        on the board are ignored, since they can only come from an older,
+        out-of-order update. Returns True if the board changed.
+        """
+        if score <= 0:
+            return False
+
+        current = self._scores.get(user_id)
+        if current is not None:
+            if score <= current:
+                return False
+            del self._order[bisect_left(self._order, (-current, user_id))]
+        elif len(self._order) >= self.capacity:
+            if (-score, user_id) >= self._order[-1]:
+                return False
+            _, evicted = self._order.pop()
+            del self._scores[evicted]
+
+        self._scores[user_id] = score
+        insort(self._order, (-score, user_id))
+        return True
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Best ``n`` entries as ``(user_id, score)``."""
+        entries = self._order if n is None else self._order[:n]
+        return [(user_id, -neg) for neg, user_id in entries]
+
+    def diff(self, rows: Iterable[Tuple[int, int]]) -> List[str]:
+        """Compare against fresh database rows; returns a line per mismatch."""
+        expected = [tuple(row) for row in rows if row[1] > 0][: self.capacity]
+        actual = self.top()
+        problems = []
+        for rank in range(max(len(expected), len(actual))):
+            want = expected[rank] if rank < len(expected) else None
+            got = actual[rank] if rank < len(actual) else None
+            if want != got:
+                problems.append(f"#{rank + 1}: db {want} != cache {got}")
+        return problems
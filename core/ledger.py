@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import datetime
+import os
+from typing import List, Optional, Tuple
+
+import asyncpg as acpg
+
+from core.metrics import REGISTRY, MetricsRegistry
+
+LEDGER_COLUMNS = ("user_id", "delta", "reason", "ref", "created_at")
+
+# Users whose balance differs from the sum of their ledger entries
+FIND_DRIFT = """
+WITH totals AS (
+    SELECT user_id, sum(delta)::bigint AS total FROM ledger GROUP BY user_id
+)
+SELECT coalesce(u.user_id, t.user_id) AS user_id,
+       coalesce(u.points, 0) AS points,
+       coalesce(t.total, 0) AS ledger_points,
+       count(*) OVER () AS drifted
+FROM users u
+FULL JOIN totals t ON t.user_id = u.user_id
+WHERE coalesce(u.points, 0) <> coalesce(t.total, 0)
+ORDER BY 1
+LIMIT $1;
+"""
+
+# Set every balance to its ledger total, creating accounts that only exist in the ledger
+REBUILD_BALANCES = """
+WITH totals AS (
+    SELECT user_id, sum(delta)::bigint AS total FROM ledger GROUP BY user_id
+), fixed AS (
+    UPDATE users u SET points = r.total
+    FROM (
+        SELECT users.user_id, coalesce(totals.total, 0) AS total
+        FROM users LEFT JOIN totals USING (user_id)
+    ) r
+    WHERE u.user_id = r.user_id AND u.points IS DISTINCT FROM r.total
+    RETURNING u.user_id
+), created AS (
+    INSERT INTO users (user_id, points)
+    SELECT user_id, total FROM totals
+    WHERE total <> 0 AND NOT EXISTS (SELECT 1 FROM users WHERE users.user_id = totals.user_id)
+    RETURNING user_id
+)
+SELECT (SELECT count(*) FROM fixed) AS fixed, (SELECT count(*) FROM created) AS created;
+"""
+
+LedgerEntry = Tuple[int, int, str, Optional[int], datetime.datetime]
+
+
+class LedgerDriftError(RuntimeError):
+    """Balances differ from the ledger and a rebuild was not forced."""
+
+    def __init__(self, drifted: int, records: List[acpg.Record]):
+        super().__init__(f"{drifted} balances differ from the ledger")
+        self.drifted = drifted
+        self.records = records
+
+
+class LedgerBuffer:
+    """
+    In-process buffer of balance changes, written to ``ledger`` with
+    ``COPY`` in batches of ``batch_size``.
+
+    Changes are recorded after the statement that made them committed, so
+    a crash can lose the entries still buffered; ``verify`` finds such
+    gaps. Once ``max_size`` entries are waiting, ``record`` blocks until a
+    flush makes room (backpressure on the commands producing them). It
+    never drops an entry: while the writer is stuck it warns every
+    ``warn_after`` seconds and keeps waiting.
+    """
+
+    def __init__(
+        self,
+        pool: acpg.Pool,
+        max_size: int = 50000,
+        batch_size: int = 5000,
+        flush_interval_ms: int = 1000,
+        warn_after: float = 30.0,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.pool = pool
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.warn_after = warn_after
+
+        self._entries: List[LedgerEntry] = []
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.flush_errors = 0
+        self.waits = 0
+
+        self._buffered = registry.gauge("ledger_buffered_entries", "Ledger entries waiting to be written")
+        self._flushed = registry.counter("ledger_flushed_entries_total", "Ledger entries written")
+        self._waits = registry.counter("ledger_backpressure_waits_total", "Records that waited for buffer space")
+        registry.add_collector(lambda: self._buffered.set(len(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # wait_for can swallow a cancel that lands as the wake event fires, so the loop checks the flag too
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    async def record(self, user_id: int, delta: int, reason: str, ref: Optional[int] = None) -> None:
+        """Buffer one balance change, waiting for room if the buffer is full."""
+        if not delta:
+            return
+        if len(self._entries) >= self.max_size:
+            self.waits += 1
+            self._waits.inc()
+            waited = 0.0
+            while len(self._entries) >= self.max_size:
+                self._not_full.clear()
+                self._wake.set()
+                try:
+                    await asyncio.wait_for(self._not_full.wait(), timeout=self.warn_after)
+                except asyncio.TimeoutError:
+                    waited += self.warn_after
+                    print(f"Ledger buffer full for {waited:.0f}s: {reason} {delta:+} for {user_id} still waiting")
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        self._entries.append((user_id, delta, reason, ref, now))
+        if len(self._entries) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Write everything buffered, ``batch_size`` rows per ``COPY``. Returns the rows written."""
+        written = 0
+        async with self._flush_lock:
+            while self._entries:
+                batch = self._entries[: self.batch_size]
+                del self._entries[: self.batch_size]
+                try:
+                    async with self.pool.acquire() as conn:
+                        await conn.copy_records_to_table("ledger", records=batch, columns=LEDGER_COLUMNS)
+                except Exception:
+                    # Keep them for the next flush
+                    self._entries[:0] = batch
+                    self.flush_errors += 1
+                    raise
+                finally:
+                    if len(self._entries) < self.max_size:
+                        self._not_full.set()
+                written += len(batch)
+                self.flushed += len(batch)
+                self._flushed.inc(len(batch))
+        return written
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"Ledger flush error: {e}")
+
+
+async def verify(pool: acpg.Pool, limit: int = 20) -> Tuple[int, List[acpg.Record]]:
+    """Number of users whose balance disagrees with the ledger, and the first ``limit`` of them."""
+    records = await pool.fetch(FIND_DRIFT, limit)
+    return (records[0]["drifted"] if records else 0), records
+
+
+async def rebuild(conn: acpg.Connection, force: bool = False, limit: int = 20) -> Tuple[int, int]:
+    """
+    Recompute ``users.points`` from the ledger in one transaction.
+
+    Meant to run with the bot stopped: buffered ledger entries and cached
+    balance deltas of a running bot are not in the tables yet. Entries lost
+    in a crash make the ledger short, and a rebuild would then take points
+    away that were really paid, so drift is only written over with
+    ``force``; otherwise ``LedgerDriftError`` carries the first ``limit``
+    drifted users. Returns the (updated, created) account counts; the
+    transaction is rolled back if a verification afterwards still finds
+    drift.
+    """
+    async with conn.transaction():
+        # Keep concurrent writers out while balances are replaced
+        await conn.execute("LOCK TABLE users, ledger IN SHARE ROW EXCLUSIVE MODE")
+        drifted, records = await verify(conn, limit)
+        if drifted and not force:
+            raise LedgerDriftError(drifted, records)
+        record = await conn.fetchrow(REBUILD_BALANCES)
+        drifted, _ = await verify(conn, 1)
+        if drifted:
+            raise RuntimeError(f"{drifted} balances still differ from the ledger after the rebuild")
+    return record["fixed"], record["created"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check users.points against the ledger, or rebuild it from there")
+    parser.add_argument("action", choices=["verify", "rebuild"])
+    parser.add_argument("--dsn", default=None, help="defaults to DATABASE_URL")
+    parser.add_argument("--limit", type=int, default=20, help="drifted users to list")
+    parser.add_argument("--force", action="store_true", help="rebuild even though balances drifted from the ledger")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    def show(drifted: int, records: List[acpg.Record]) -> None:
+        print(f"{drifted} users differ from the ledger.")
+        for r in records:
+            print(f"  {r['user_id']}: points {r['points']}, ledger {r['ledger_points']}")
+
+    async def run() -> None:
+        conn = await acpg.connect(args.dsn or os.getenv("DATABASE_URL"))
+        try:
+            if args.action == "rebuild":
+                try:
+                    fixed, created = await rebuild(conn, args.force, args.limit)
+                except LedgerDriftError as e:
+                    show(e.drifted, e.records)
+                    raise SystemExit("Not rebuilt: check the drift above, then pass --force to set these balances to their ledger totals.")
+                print(f"Rebuilt balances: {fixed} updated, {created} created.")
+            show(*await verify(conn, args.limit))
+        finally:
+            await conn.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import asyncpg as acpg
+import discord
+
+from core import queries
+from core.paginator import PageSource
+
+MEMETICS_CHANNEL = "memetics_changed"
+
+
+class MemeticsPages(PageSource):
+    """
+    Memetics as lazily rendered, cached embed pages.
+
+    Pages are fetched by keyset on ``id``: the last id of every page seen
+    so far is remembered, so the next page is ``WHERE id > last`` and the
+    first one a single small query whatever the table size. A page further
+    ahead skips from the nearest known boundary. Rendered pages are kept in
+    an LRU of ``max_pages``.
+
+    A trigger on ``memetics`` sends a ``NOTIFY`` on every change; one pool
+    connection listens for it and drops everything cached. Pages are only
+    cached while that connection is up, since changes could be missed
+    otherwise.
+    """
+
+    def __init__(self, pool: acpg.Pool, per_page: int = 10, max_pages: int = 64):
+        self.pool = pool
+        self.per_page = per_page
+        self.max_pages = max_pages
+
+        self._pages: "OrderedDict[int, discord.Embed]" = OrderedDict()
+        # page index -> id of its last row
+        self._bounds: Dict[int, int] = {}
+        self._last_page: Optional[int] = None
+        self._count: Optional[int] = None
+        self._generation = 0
+
+        self._listen_lock = asyncio.Lock()
+        self._listen_acquire = None
+        self._listen_conn = None
+        self._listen_pool = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self) -> None:
+        self._pages.clear()
+        self._bounds.clear()
+        self._last_page = None
+        self._count = None
+        self._generation += 1
+        self.invalidations += 1
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.invalidate()
+
+    @property
+    def listening(self) -> bool:
+        return (
+            self._listen_conn is not None
+            and not self._listen_conn.is_closed()
+            # A reconnect swapped pools: follow it so the old one can drain
+            and self._listen_pool is getattr(self.pool, "raw", self.pool)
+        )
+
+    async def _listen(self) -> bool:
+        if self.listening:
+            return True
+        async with self._listen_lock:
+            if self.listening:
+                return True
+            await self._unlisten()
+            # Changes may have gone unnoticed while nobody was listening
+            self.invalidate()
+            acquire = self.pool.acquire()
+            try:
+                conn = await acquire.__aenter__()
+            except Exception as e:
+                print(f"Memetics pages: cannot listen for changes, not caching: {e}")
+                return False
+            try:
+                await conn.add_listener(MEMETICS_CHANNEL, self._on_notify)
+            except Exception as e:
+                await acquire.__aexit__(None, None, None)
+                print(f"Memetics pages: cannot listen for changes, not caching: {e}")
+                return False
+            self._listen_acquire, self._listen_conn = acquire, conn
+            self._listen_pool = getattr(self.pool, "raw", self.pool)
+            return True
+
+    async def _unlisten(self) -> None:
+        acquire, conn = self._listen_acquire, self._listen_conn
+        self._listen_acquire = self._listen_conn = self._listen_pool = None
+        if conn is None:
+            return
+        try:
+            if not conn.is_closed():
+                await conn.remove_listener(MEMETICS_CHANNEL, self._on_notify)
+            await acquire.__aexit__(None, None, None)
+        except Exception as e:
+            print(f"Memetics pages: failed to release listener: {e}")
+
+    async def close(self) -> None:
+        async with self._listen_lock:
+            await self._unlisten()
+
+    def _total_pages(self) -> Optional[int]:
+        if self._last_page is not None:
+            return self._last_page + 1
+        if self._count is not None:
+            return max(1, -(-self._count // self.per_page))
+        return None
+
+    def known_page_count(self) -> Optional[int]:
+        return self._total_pages()
+
+    async def page_count(self) -> int:
+        """Number of pages; counts the table once per invalidation unless the end was already seen."""
+        total = self._total_pages()
+        if total is not None:
+            return total
+        generation = self._generation
+        count = await self.pool.fetchval(queries.COUNT_MEMETICS)
+        if generation == self._generation and await self._listen():
+            self._count = count
+        return max(1, -(-count // self.per_page))
+
+    def _render(self, index: int, records: List[acpg.Record]) -> discord.Embed:
+        embed = discord.Embed(title=f"Memetics - {index + 1}", color=discord.Color.blue())
+        for r in records:
+            embed.add_field(name=f"{r['name']} {r['icon']}", value=r["description"], inline=False)
+        return embed
+
+    def _with_footer(self, index: int, embed: discord.Embed) -> discord.Embed:
+        total = self._total_pages()
+        embed.set_footer(text=f"Page {index + 1}/{total}" if total else f"Page {index + 1}")
+        return embed
+
+    async def get_page(self, index: int) -> Optional[discord.Embed]:
+        """Embed of page ``index`` (0-based), or None past the last page."""
+        caching = await self._listen()
+        cached = self._pages.get(index)
+        if cached is not None:
+            self._pages.move_to_end(index)
+            self.hits += 1
+            return self._with_footer(index, cached)
+        self.misses += 1
+
+        known = [page for page in self._bounds if page < index]
+        start = max(known, default=-1)
+        after = self._bounds[start] if start >= 0 else 0
+        skip = (index - start - 1) * self.per_page
+        generation = self._generation
+        # One extra row tells whether this is the last page
+        records = await self.pool.fetch(queries.MEMETICS_PAGE, after, skip, self.per_page + 1)
+        rows = records[: self.per_page]
+        fresh = caching and generation == self._generation
+
+        if not rows:
+            if fresh and index == 0:
+                self._last_page = 0
+            return None
+        embed = self._render(index, rows)
+        if fresh:
+            self._bounds[index] = rows[-1]["id"]
+            if len(records) <= self.per_page:
+                self._last_page = index
+            self._pages[index] = embed
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return self._with_footer(index, embed)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pages": len(self._pages),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "listening": int(self.listening),
+        }
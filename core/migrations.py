@@ -0,0 +1,245 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import asyncpg as acpg
+
+# Serializes migration runs of every bot process sharing the database
+MIGRATION_LOCK_ID = 7_431_902_118
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+"""
+
+FETCH_APPLIED_MIGRATIONS = "SELECT version, checksum FROM schema_migrations ORDER BY version;"
+
+RECORD_MIGRATION = "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3);"
+
+
+class MigrationError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+    # False for statements Postgres refuses inside a transaction block, like
+    # CREATE INDEX CONCURRENTLY: they run one by one, each committing on its own,
+    # so the ``;``-separated statements must be plain and safe to run again
+    transaction: bool = True
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.strip().encode()).hexdigest()
+
+    @property
+    def statements(self) -> List[str]:
+        return [s.strip() for s in self.sql.split(";") if s.strip()]
+
+
+# Append only: an applied migration must never change, its checksum is verified.
+# The first migrations use IF NOT EXISTS so databases created by the old
+# startup DDL are adopted as they are.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "users", """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            points INTEGER DEFAULT 0,
+            last_daily TIMESTAMP WITHOUT TIME ZONE DEFAULT '2000-01-01 00:00:00'
+        );
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_count INTEGER NOT NULL DEFAULT 0;
+    """),
+    Migration(2, "spins", """
+        CREATE TABLE IF NOT EXISTS spins (
+            user_id BIGINT PRIMARY KEY,
+            total_points INTEGER DEFAULT 0,
+            spins_used INTEGER DEFAULT 0,
+            last_spin TIMESTAMP WITHOUT TIME ZONE DEFAULT '2000-01-01 00:00:00',
+            weekly_points INTEGER DEFAULT 0
+        );
+    """),
+    Migration(3, "memetics", """
+        CREATE TABLE IF NOT EXISTS memetics (
+            name TEXT NOT NULL,
+            icon TEXT,
+            description TEXT
+        );
+    """),
+    Migration(4, "scheduled_jobs", """
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            job_key TEXT UNIQUE,
+            handler TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            run_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            cron TEXT
+        );
+        CREATE INDEX IF NOT EXISTS scheduled_jobs_run_at_idx ON scheduled_jobs (run_at);
+    """),
+    Migration(5, "word_index", """
+        CREATE TABLE IF NOT EXISTS word_counts (
+            channel_id BIGINT NOT NULL,
+            token TEXT NOT NULL,
+            author_id BIGINT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel_id, token, author_id)
+        );
+        CREATE TABLE IF NOT EXISTS word_index_channels (
+            channel_id BIGINT PRIMARY KEY,
+            message_count BIGINT NOT NULL DEFAULT 0,
+            oldest_id BIGINT,
+            synced_id BIGINT,
+            backfill_done BOOLEAN NOT NULL DEFAULT FALSE
+        );
+    """),
+    # Leaderboards: top-N reads walk these instead of sorting the table. Built
+    # concurrently so spins and balances stay writable on big tables; an
+    # interrupted build leaves an invalid index behind, so each is dropped first
+    Migration(6, "leaderboard_indexes", """
+        DROP INDEX CONCURRENTLY IF EXISTS spins_total_points_idx;
+        CREATE INDEX CONCURRENTLY spins_total_points_idx ON spins (total_points DESC, user_id);
+        DROP INDEX CONCURRENTLY IF EXISTS spins_weekly_points_idx;
+        CREATE INDEX CONCURRENTLY spins_weekly_points_idx ON spins (weekly_points DESC, user_id)
+            WHERE weekly_points > 0;
+        DROP INDEX CONCURRENTLY IF EXISTS users_points_idx;
+        CREATE INDEX CONCURRENTLY users_points_idx ON users (points DESC, user_id);
+    """, transaction=False),
+    # Stable key for keyset pagination (existing rows are numbered in table order)
+    # and a notification whenever the table changes, for cached pages. A unique
+    # index rather than a primary key, which a hand-made table may already have
+    Migration(7, "memetics_keyset", """
+        ALTER TABLE memetics ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+        CREATE UNIQUE INDEX IF NOT EXISTS memetics_id_idx ON memetics (id);
+        CREATE OR REPLACE FUNCTION notify_memetics_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('memetics_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS memetics_changed ON memetics;
+        CREATE TRIGGER memetics_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON memetics
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_memetics_changed();
+    """),
+    # One row per wagered play, written in the statement that settles it; never changed afterwards
+    Migration(8, "bets", """
+        CREATE TABLE IF NOT EXISTS bets (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            game TEXT NOT NULL,
+            wager INTEGER NOT NULL,
+            payout INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            placed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        );
+        CREATE INDEX IF NOT EXISTS bets_user_idx ON bets (user_id, id);
+        CREATE OR REPLACE FUNCTION reject_bets_change() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'bets is append-only';
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS bets_append_only ON bets;
+        CREATE TRIGGER bets_append_only BEFORE UPDATE OR DELETE OR TRUNCATE ON bets
+            FOR EACH STATEMENT EXECUTE FUNCTION reject_bets_change();
+    """),
+    # Every balance change from here on; existing balances become opening entries
+    Migration(9, "ledger", """
+        CREATE TABLE IF NOT EXISTS ledger (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            delta BIGINT NOT NULL,
+            reason TEXT NOT NULL,
+            ref BIGINT,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        );
+        CREATE INDEX IF NOT EXISTS ledger_user_idx ON ledger (user_id);
+        INSERT INTO ledger (user_id, delta, reason)
+        SELECT user_id, points, 'opening' FROM users WHERE points <> 0;
+        CREATE OR REPLACE FUNCTION reject_ledger_change() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'ledger is append-only';
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS ledger_append_only ON ledger;
+        CREATE TRIGGER ledger_append_only BEFORE UPDATE OR DELETE OR TRUNCATE ON ledger
+            FOR EACH STATEMENT EXECUTE FUNCTION reject_ledger_change();
+    """),
+    # Counts of channels without a covered range came from live messages that a
+    # later crawl counts again, so they start over; crawled channels are marked
+    Migration(10, "word_index_coverage", """
+        DELETE FROM word_counts
+        WHERE channel_id IN (SELECT channel_id FROM word_index_channels WHERE synced_id IS NULL);
+        DELETE FROM word_index_channels WHERE synced_id IS NULL;
+        ALTER TABLE word_index_channels ADD COLUMN IF NOT EXISTS crawl_started BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE word_index_channels SET crawl_started = TRUE;
+    """),
+]
+
+
+class MigrationRunner:
+    """
+    Applies ``MIGRATIONS`` in version order, each once and in its own
+    transaction (or statement by statement when it can't have one),
+    recording them in ``schema_migrations``.
+
+    A current schema costs a single read. Otherwise the run takes a
+    Postgres advisory lock, so concurrent starts apply nothing twice, and
+    refuses to continue if an applied migration was edited afterwards.
+    """
+
+    def __init__(self, pool: acpg.Pool, migrations: Sequence[Migration] = MIGRATIONS):
+        versions = [m.version for m in migrations]
+        if versions != sorted(set(versions)):
+            raise MigrationError("migration versions must be unique and ascending")
+        self.pool = pool
+        self.migrations = list(migrations)
+
+    async def _applied(self, conn) -> Dict[int, str]:
+        try:
+            records = await conn.fetch(FETCH_APPLIED_MIGRATIONS)
+        except acpg.UndefinedTableError:
+            return {}
+        return {r["version"]: r["checksum"] for r in records}
+
+    def _pending(self, applied: Dict[int, str]) -> List[Migration]:
+        pending = []
+        for migration in self.migrations:
+            checksum = applied.get(migration.version)
+            if checksum is None:
+                pending.append(migration)
+            elif checksum != migration.checksum:
+                raise MigrationError(
+                    f"migration {migration.version} ({migration.name}) changed after it was applied"
+                )
+        return pending
+
+    async def run(self) -> List[Migration]:
+        """Bring the schema up to date; returns the migrations applied."""
+        async with self.pool.acquire() as conn:
+            if not self._pending(await self._applied(conn)):
+                return []
+
+            await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                await conn.execute(CREATE_MIGRATIONS_TABLE)
+                # Another process may have migrated while we waited for the lock
+                pending = self._pending(await self._applied(conn))
+                for migration in pending:
+                    if migration.transaction:
+                        async with conn.transaction():
+                            await conn.execute(migration.sql)
+                            await conn.execute(RECORD_MIGRATION, migration.version, migration.name, migration.checksum)
+                    else:
+                        for statement in migration.statements:
+                            await conn.execute(statement)
+                        await conn.execute(RECORD_MIGRATION, migration.version, migration.name, migration.checksum)
+                    print(f"Applied migration {migration.version}: {migration.name}")
+                return pending
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
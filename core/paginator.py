@@ -1,36 +1,220 @@
+import abc
+import asyncio
 import discord
-from typing import List, Deque, Optional, Union
-from collections import deque
+from typing import Dict, List, Optional
 import sys, traceback
 
+
+class PageSource(abc.ABC):
+    """
+    Pages for ``PaginatorView``, loaded on demand.
+
+    Implementations render page ``index`` (0-based) when asked, so a view
+    over an arbitrarily large result set only ever holds a few pages.
+    """
+
+    @abc.abstractmethod
+    async def get_page(self, index: int) -> Optional[discord.Embed]:
+        """Embed of page ``index``, or None past the last page."""
+
+    @abc.abstractmethod
+    async def page_count(self) -> int:
+        """Number of pages."""
+
+    def known_page_count(self) -> Optional[int]:
+        """Page count if it is known without a query, else None."""
+        return None
+
+
+class ListPageSource(PageSource):
+    """Pages that were already built."""
+
+    def __init__(self, embeds: List[discord.Embed]):
+        self.embeds = embeds
+
+    async def get_page(self, index: int) -> Optional[discord.Embed]:
+        return self.embeds[index] if 0 <= index < len(self.embeds) else None
+
+    async def page_count(self) -> int:
+        return len(self.embeds)
+
+    def known_page_count(self) -> Optional[int]:
+        return len(self.embeds)
+
+
+class _JumpModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page", placeholder="Page number", max_length=7)
+
+    def __init__(self, paginator: "PaginatorView"):
+        super().__init__(timeout=paginator.timeout)
+        self.paginator = paginator
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            number = int(str(self.page.value).strip())
+        except ValueError:
+            return await interaction.response.send_message("That is not a page number.", ephemeral=True)
+        await self.paginator.show(interaction, number - 1)
+
+
 class PaginatorView(discord.ui.View):
-    embeds: List[discord.Embed]
-    queue: Deque[discord.Embed]
-    len: int
-    current_page: int
+    """
+    Prev/Next, First/Last and jump-to-page controls over a ``PageSource``.
+
+    Only the current page and its neighbours are kept: after each turn the
+    ``prefetch`` pages on either side are loaded in the background and
+    anything further than ``window`` pages from the current one is
+    dropped. Prev/Next wrap around. A plain list of embeds still works.
+    Page 1 goes out before the source is counted; until then the controls
+    show "1/?".
+    """
+
     message: Optional[discord.Message] = None
 
-    def __init__(self, embeds: List[discord.Embed], timeout = 30):
+    def __init__(
+        self,
+        embeds: Optional[List[discord.Embed]] = None,
+        timeout = 30,
+        source: Optional[PageSource] = None,
+        window: int = 2,
+        prefetch: int = 1,
+    ):
         super().__init__(timeout=timeout)
-        self.embeds = embeds
-        self.queue = deque(embeds)
-        self.len = len(embeds)
+        self.source = source if source is not None else ListPageSource(embeds or [])
+        self.window = max(window, prefetch)
+        self.prefetch = prefetch
         self.current_page = 1
+        self.total_pages: Optional[int] = None
+        # page index -> rendered embed, only around the current page
+        self._pages: Dict[int, discord.Embed] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._counting: Optional[asyncio.Task] = None
+
+    async def start(self, destination: discord.abc.Messageable) -> Optional[discord.Message]:
+        """Send the first page with the controls; None when there are no pages."""
+        embed = await self._load(0)
+        if embed is None:
+            return None
+        total = self.source.known_page_count()
+        self._refresh_controls(total)
+        self.message = await destination.send(embed=embed, view=self)
+        if total is None:
+            self._counting = asyncio.create_task(self._count_pages())
+        self._prefetch_around(0)
+        return self.message
+
+    async def _count_pages(self) -> None:
+        try:
+            total = await self.source.page_count()
+            # A turn in the meantime already counted
+            if self.total_pages is None and not self.is_finished():
+                self._refresh_controls(total)
+                await self.message.edit(view=self)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+    async def _fetch(self, index: int) -> Optional[discord.Embed]:
+        try:
+            return await self.source.get_page(index)
+        finally:
+            self._loading.pop(index, None)
+
+    async def _load(self, index: int) -> Optional[discord.Embed]:
+        embed = self._pages.get(index)
+        if embed is not None:
+            return embed
+        task = self._loading.get(index)
+        if task is None:
+            task = self._loading[index] = asyncio.create_task(self._fetch(index))
+        embed = await task
+        if embed is not None and self._distance(index) <= self.window:
+            self._pages[index] = embed
+        return embed
+
+    def _distance(self, index: int) -> int:
+        """Turns between ``index`` and the current page, counting the wrap around."""
+        distance = abs(index - (self.current_page - 1))
+        if self.total_pages:
+            distance = min(distance, self.total_pages - distance)
+        return distance
+
+    async def _prefetch(self, index: int) -> None:
+        try:
+            await self._load(index)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+    def _prefetch_around(self, index: int) -> None:
+        for page in list(self._pages):
+            if self._distance(page) > self.window:
+                del self._pages[page]
+        total = self.total_pages
+        for offset in range(1, self.prefetch + 1):
+            for page in (index - offset, index + offset):
+                if total:
+                    page %= total
+                if page >= 0 and page not in self._pages and page not in self._loading:
+                    asyncio.create_task(self._prefetch(page))
+
+    def _refresh_controls(self, total: Optional[int]):
+        # None while the pages are still being counted
+        self.total_pages = total
+        self.jump.label = f"{self.current_page}/{total or '?'}"
+        self.jump.disabled = self.previous.disabled = self.next.disabled = total is not None and total <= 1
+        self.first.disabled = self.current_page <= 1
+        self.last.disabled = total is not None and self.current_page >= total
+
+    async def show(self, interaction: discord.Interaction, index: int, wrap: bool = False):
+        """Turn to page ``index`` (0-based), clamped to the pages there are, or wrapped around."""
+        total = max(await self.source.page_count(), 1)
+        index = index % total if wrap else min(max(index, 0), total - 1)
+        self.current_page = index + 1
+        self._refresh_controls(total)
+
+        embed = self._pages.get(index)
+        if embed is not None:
+            await interaction.response.edit_message(embed=embed, view=self)
+        else:
+            # Loading may take a query; acknowledge the click first
+            await interaction.response.defer()
+            embed = await self._load(index)
+            if embed is None:
+                # The source shrank underneath us
+                index = 0
+                self.current_page = 1
+                self._refresh_controls(max(await self.source.page_count(), 1))
+                embed = await self._load(0)
+            await interaction.edit_original_response(embed=embed, view=self)
+        self._prefetch_around(index)
+
+    @discord.ui.button(label="First")
+    async def first(self, interaction: discord.Interaction, button: discord.Button):
+        await self.show(interaction, 0)
 
     @discord.ui.button(label="Prev")
     async def previous(self, interaction: discord.Interaction, button: discord.Button):
-        self.queue.rotate(1)
-        embed: discord.Embed = self.queue[0]
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show(interaction, self.current_page - 2, wrap=True)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.primary)
+    async def jump(self, interaction: discord.Interaction, button: discord.Button):
+        await interaction.response.send_modal(_JumpModal(self))
 
     @discord.ui.button(label="Next")
     async def next(self, interaction: discord.Interaction, button: discord.Button):
-        self.queue.rotate(-1)
-        embed: discord.Embed = self.queue[0]
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show(interaction, self.current_page, wrap=True)
+
+    @discord.ui.button(label="Last")
+    async def last(self, interaction: discord.Interaction, button: discord.Button):
+        total = await self.source.page_count()
+        await self.show(interaction, total - 1)
 
     async def on_timeout(self):
+        if self._counting is not None:
+            self._counting.cancel()
+        for task in self._loading.values():
+            task.cancel()
+        self._pages.clear()
         for item in self.children:
             item.disabled = True
         if self.message:
-            await self.message.edit(view=self)
\ No newline at end of file
+            await self.message.edit(view=self)
@@ -0,0 +1,332 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Set
+
+import asyncpg as acpg
+
+from core.metrics import REGISTRY, MetricsRegistry
+from core.query_tracer import QueryTracer, TracedPool
+
+# Errors that mean the server (or the network to it) is gone, not that a statement was wrong
+CONNECTION_ERRORS = (
+    OSError,
+    acpg.PostgresConnectionError,
+    acpg.ConnectionDoesNotExistError,
+    acpg.CannotConnectNowError,
+)
+
+# application_name of the bot's connections; offline tools look for it to see whether the bot runs
+BOT_APPLICATION_NAME = "discord-bot"
+
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of touching the database while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the database looks down.
+
+    ``failure_threshold`` connection errors in a row open the circuit:
+    every acquire raises ``DatabaseUnavailable`` right away instead of
+    waiting on connect timeouts. After ``reset_timeout`` seconds a single
+    acquire is let through as a probe; success closes the circuit, a
+    connection error opens it again.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        on_open: Optional[Callable[[], None]] = None,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.on_open = on_open
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def check(self) -> None:
+        """Raise ``DatabaseUnavailable`` unless this caller may use the database."""
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        retry_in = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+        raise DatabaseUnavailable(f"database unavailable, next attempt in {retry_in:.0f}s")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._state = self.CLOSED
+
+    def record_failure(self, error: BaseException) -> None:
+        probing, self._probing = self._probing, False
+        # Timeouts (an OSError too) mostly mean a saturated pool or a slow statement, not an outage
+        if not isinstance(error, CONNECTION_ERRORS) or isinstance(error, asyncio.TimeoutError):
+            return
+        self.failures += 1
+        if probing or self.failures >= self.failure_threshold:
+            self.open()
+
+    def open(self) -> None:
+        was_open = self._state != self.CLOSED
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        if not was_open:
+            self.opened += 1
+            print(f"⛔ Database circuit opened ({self.failures} connection failures in a row), failing fast.")
+        if self.on_open is not None:
+            self.on_open()
+
+
+@dataclass
+class PoolConfig:
+    dsn: Optional[str] = None
+    min_size: int = 2
+    max_size: int = 10
+    # Seconds; 0 or None disables the limit
+    command_timeout: Optional[float] = 60.0
+    acquire_timeout: Optional[float] = 10.0
+    connect_timeout: float = 10.0
+    max_inactive_lifetime: float = 300.0
+    application_name: str = BOT_APPLICATION_NAME
+
+    def __post_init__(self):
+        self.max_size = max(1, self.max_size)
+        self.min_size = min(max(0, self.min_size), self.max_size)
+
+
+class PoolManager:
+    """
+    Owns the bot's connection pool and replaces it when the database goes away.
+
+    ``pool`` is a single ``TracedPool`` handed to every user for the
+    lifetime of the bot; ``reconnect`` opens a fresh asyncpg pool and swaps
+    it in underneath. Connections already acquired keep running on the old
+    pool, which is closed once they are all released (or terminated after
+    ``drain_timeout``). When the circuit breaker opens, a background task
+    reconnects with exponential backoff and full jitter until it succeeds
+    or a probe finds the old pool working again. ``on_connect`` runs after
+    every successful (re)connect; if it fails with anything but a connection
+    error, the pool is taken out of service and the error raised, and no
+    background reconnect is tried until ``reconnect`` is called again.
+    """
+
+    def __init__(
+        self,
+        config: PoolConfig,
+        tracer: QueryTracer,
+        init: Optional[Callable[[acpg.Connection], Awaitable[None]]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        on_connect: Optional[Callable[[TracedPool], Awaitable[object]]] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        drain_timeout: float = 60.0,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.config = config
+        self.init = init
+        self.on_connect = on_connect
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.drain_timeout = drain_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.breaker.on_open = self._schedule_reconnect
+        self.pool = TracedPool(None, tracer, breaker=self.breaker, acquire_timeout=config.acquire_timeout or None)
+        self.last_error: Optional[str] = None
+        # Set when on_connect failed for a reason reconnecting won't fix
+        self.fatal_error: Optional[BaseException] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._retiring: Set[asyncio.Task] = set()
+        self._closing = False
+
+        self._gauges = {
+            "size": registry.gauge("db_pool_connections", "Open database connections"),
+            "idle": registry.gauge("db_pool_idle_connections", "Idle database connections"),
+            "in_use": registry.gauge("db_pool_in_use_connections", "Connections checked out of the pool"),
+            "max": registry.gauge("db_pool_max_connections", "Configured maximum pool size"),
+            "waiting": registry.gauge("db_pool_waiting_acquires", "Acquires waiting for a free connection"),
+            "saturation": registry.gauge("db_pool_saturation", "Share of the maximum pool size in use"),
+            "retiring": registry.gauge("db_pool_retiring", "Replaced pools still draining in-flight queries"),
+            "circuit": registry.gauge("db_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open"),
+            "rejected": registry.gauge("db_circuit_rejections", "Acquires refused while the circuit was open"),
+            "opened": registry.gauge("db_circuit_opened", "Times the circuit opened"),
+        }
+        self._reconnects = registry.counter("db_reconnects_total", "Pool reconnect attempts", ["result"])
+        registry.add_collector(self.collect)
+
+    @property
+    def available(self) -> bool:
+        return (
+            self.pool.raw is not None and self.fatal_error is None and self.breaker.state != CircuitBreaker.OPEN
+        )
+
+    async def _create(self) -> acpg.Pool:
+        config = self.config
+        pool = acpg.create_pool(
+            config.dsn,
+            min_size=config.min_size,
+            max_size=config.max_size,
+            command_timeout=config.command_timeout or None,
+            max_inactive_connection_lifetime=config.max_inactive_lifetime,
+            timeout=config.connect_timeout,
+            init=self.init,
+            server_settings={"application_name": config.application_name},
+        )
+        try:
+            return await pool
+        except BaseException:
+            # Drop whatever connections were opened before the failure
+            pool.terminate()
+            raise
+
+    async def connect(self) -> bool:
+        """First connect; on failure the circuit opens and reconnecting continues in the background."""
+        if await self.reconnect():
+            return True
+        self.breaker.open()
+        return False
+
+    async def reconnect(self) -> bool:
+        """
+        Open a fresh pool and swap it in; queries already running finish on
+        the old one. Raises what ``on_connect`` raised unless it was a
+        connection error, after taking the pool out of service.
+        """
+        self.fatal_error = None
+        async with self._lock:
+            try:
+                # Opens min_size connections, enough to know the server is there
+                fresh = await self._create()
+                if self.config.min_size == 0:
+                    await fresh.fetchval("SELECT 1")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._reconnects.inc(result="failed")
+                print(f"❌ Database connect failed: {self.last_error}")
+                return False
+            old = self.pool.swap(fresh)
+            self.breaker.record_success()
+            self.last_error = None
+            self._reconnects.inc(result="ok")
+            if old is not None:
+                self._retire(old)
+        if self.on_connect is not None:
+            try:
+                await self.on_connect(self.pool)
+            except Exception as e:
+                self.last_error = f"on-connect hook: {type(e).__name__}: {e}"
+                print(f"❌ Database on-connect hook failed: {e}")
+                async with self._lock:
+                    broken = self.pool.swap(None)
+                    if broken is not None:
+                        self._retire(broken)
+                if isinstance(e, CONNECTION_ERRORS):
+                    return False
+                self.fatal_error = e
+                raise
+        return True
+
+    def _retire(self, old: acpg.Pool) -> None:
+        task = asyncio.create_task(self._drain(old))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _drain(self, old: acpg.Pool) -> None:
+        try:
+            # Waits for every acquired connection to come back before closing
+            await asyncio.wait_for(old.close(), timeout=self.drain_timeout)
+        except Exception:
+            old.terminate()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential delay before reconnect ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _schedule_reconnect(self) -> None:
+        if self._closing or self.fatal_error is not None or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.backoff(attempt))
+            if self.pool.raw is not None and self.breaker.state == CircuitBreaker.CLOSED:
+                # A half-open probe found the current pool working again
+                return
+            try:
+                if await self.reconnect():
+                    print(f"✅ Database reconnected after {attempt + 1} attempt(s).")
+                    return
+            except Exception:
+                print("❌ Database left unavailable until an owner runs reconnect.")
+                return
+            attempt += 1
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        current = self.pool.swap(None)
+        if current is not None:
+            await current.close()
+        if self._retiring:
+            await asyncio.gather(*self._retiring, return_exceptions=True)
+
+    def collect(self) -> None:
+        gauges = self._gauges
+        raw = self.pool.raw
+        size = raw.get_size() if raw is not None else 0
+        idle = raw.get_idle_size() if raw is not None else 0
+        maximum = raw.get_max_size() if raw is not None else self.config.max_size
+        gauges["size"].set(size)
+        gauges["idle"].set(idle)
+        gauges["in_use"].set(size - idle)
+        gauges["max"].set(maximum)
+        gauges["waiting"].set(self.pool.waiting)
+        gauges["saturation"].set(round((size - idle) / maximum, 4) if maximum else 0)
+        gauges["retiring"].set(len(self._retiring))
+        gauges["circuit"].set(
+            {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}[self.breaker.state]
+        )
+        gauges["rejected"].set(self.breaker.rejected)
+        gauges["opened"].set(self.breaker.opened)
+
+    def status(self) -> str:
+        raw = self.pool.raw
+        if raw is None:
+            pool = "no pool"
+        else:
+            in_use = raw.get_size() - raw.get_idle_size()
+            pool = f"{in_use}/{raw.get_max_size()} in use, {self.pool.waiting} waiting"
+        line = f"circuit {self.breaker.state}, {pool}, {len(self._retiring)} draining"
+        if self.last_error:
+            line += f", last error: {self.last_error}"
+        return line
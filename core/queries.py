@@ -1,9 +1,195 @@
 # core/queries.py
 
-CREATE_USERS_TABLE = """
-CREATE TABLE IF NOT EXISTS users (
-    user_id BIGINT PRIMARY KEY,
-    points INTEGER DEFAULT 0,
-    last_daily TIMESTAMP WITHOUT TIME ZONE DEFAULT '2000-01-01 00:00:00'
-);
-"""
\ No newline at end of file
+# Apply a batch of point deltas ($1 user ids, $2 deltas) in one statement
+FLUSH_BALANCE_DELTAS = """
+INSERT INTO users (user_id, points)
+SELECT * FROM unnest($1::bigint[], $2::integer[])
+ON CONFLICT (user_id) DO UPDATE SET points = users.points + EXCLUDED.points;
+"""
+
+# Return the account row of $1, creating it first when missing.
+# The UNION branch sees the pre-statement snapshot, so exactly one row comes
+# back unless another session inserted the same user concurrently.
+GET_OR_CREATE_USER = """
+WITH created AS (
+    INSERT INTO users (user_id) VALUES ($1)
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING points, daily_count, last_daily
+)
+SELECT points, daily_count, last_daily FROM created
+UNION ALL
+SELECT points, daily_count, last_daily FROM users WHERE user_id = $1
+LIMIT 1;
+"""
+
+# Add $2 points to $1 (negative to reduce), creating the account when missing
+ADD_POINTS = """
+INSERT INTO users (user_id, points) VALUES ($1, $2)
+ON CONFLICT (user_id) DO UPDATE SET points = users.points + EXCLUDED.points
+RETURNING points;
+"""
+
+# Both transfer statements lock every touched account in user_id order
+# before debiting, so crossing transfers cannot deadlock, and the debit only
+# happens when the sender's latest balance covers it. Only existing rows can
+# be locked up front: when a recipient has no row yet nothing is written and
+# ``missing`` says so, the row is created by ENSURE_USERS and the statement
+# run again. Inserting it here, after higher rows were locked, would break
+# the order for writers that upsert in user_id order (cache flushes, rain).
+
+# Create the accounts in $1 (ascending) that do not exist yet.
+ENSURE_USERS = """
+INSERT INTO users (user_id)
+SELECT * FROM unnest($1::bigint[])
+ON CONFLICT (user_id) DO NOTHING;
+"""
+
+# Move $3 points from $1 to $2. Returns the sender's new balance, NULL if short.
+TRANSFER_POINTS = """
+WITH locked AS (
+    SELECT user_id FROM users WHERE user_id IN ($1, $2)
+    ORDER BY user_id FOR UPDATE
+), found AS (
+    SELECT count(*) FILTER (WHERE user_id = $2) AS recipient FROM locked
+), debit AS (
+    UPDATE users SET points = points - $3
+    WHERE user_id = $1 AND $1 <> $2 AND points >= $3 AND (SELECT recipient FROM found) = 1
+    RETURNING points
+), credit AS (
+    UPDATE users SET points = users.points + $3
+    FROM debit WHERE users.user_id = $2
+    RETURNING users.user_id
+)
+SELECT (SELECT points FROM debit) AS points, (SELECT count(*) FROM credit) AS paid,
+       (SELECT recipient FROM found) = 0 AS missing;
+"""
+
+# Pay $3 points from $1 to each distinct user in $2 (ascending).
+# Returns the sender's new balance (NULL if short) and the number paid.
+RAIN_POINTS = """
+WITH locked AS (
+    SELECT user_id FROM users WHERE user_id = $1 OR user_id = ANY($2::bigint[])
+    ORDER BY user_id FOR UPDATE
+), found AS (
+    SELECT count(*) FILTER (WHERE user_id <> $1) AS recipients FROM locked
+), debit AS (
+    UPDATE users SET points = points - $3 * cardinality($2::bigint[])
+    WHERE user_id = $1 AND points >= $3 * cardinality($2::bigint[])
+      AND (SELECT recipients FROM found) = cardinality($2::bigint[])
+    RETURNING points
+), credit AS (
+    UPDATE users SET points = users.points + $3
+    FROM debit WHERE users.user_id = ANY($2::bigint[])
+    RETURNING users.user_id
+)
+SELECT (SELECT points FROM debit) AS points, (SELECT count(*) FROM credit) AS paid,
+       (SELECT recipients FROM found) < cardinality($2::bigint[]) AS missing;
+"""
+
+# Claim the daily reward for $1: $2 base amount, $3 interest rate per streak
+# day, $4 current UTC time, $5 cooldown in seconds. Returns the new balance,
+# bonus and previous streak when claimed, otherwise the seconds remaining.
+PROCESS_DAILY_CLAIM = """
+WITH claim AS (
+    INSERT INTO users (user_id, points, last_daily, daily_count)
+    VALUES ($1, $2, $4, 1)
+    ON CONFLICT (user_id) DO UPDATE SET
+        points = users.points + round($2 * power(1 + $3::float8, users.daily_count))::integer,
+        last_daily = $4,
+        daily_count = users.daily_count + 1
+    WHERE users.last_daily <= $4 - make_interval(secs => $5)
+    RETURNING points, daily_count
+)
+SELECT true AS claimed,
+       points,
+       daily_count - 1 AS streak,
+       round($2 * power(1 + $3::float8, daily_count - 1))::integer AS bonus,
+       NULL::float8 AS seconds_remaining
+FROM claim
+UNION ALL
+SELECT false, points, daily_count, 0,
+       CASE
+           -- a concurrent claim committed after this statement's snapshot
+           WHEN last_daily <= $4 - make_interval(secs => $5) THEN $5
+           ELSE extract(epoch FROM last_daily + make_interval(secs => $5) - $4)::float8
+       END
+FROM users
+WHERE user_id = $1 AND NOT EXISTS (SELECT 1 FROM claim);
+"""
+
+# Spend one candy spin worth $2 points for $1 at $3 (UTC). The spin counter
+# resets once the last spin is $5 hours old and at most $4 spins fit in a
+# cycle. Returns the row with spun = false when the quota is used up.
+SPIN = """
+WITH spun AS (
+    INSERT INTO spins (user_id, total_points, spins_used, last_spin, weekly_points)
+    VALUES ($1, $2, 1, $3, $2)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_points = spins.total_points + $2,
+        weekly_points = spins.weekly_points + $2,
+        spins_used = CASE
+            WHEN spins.last_spin <= $3 - make_interval(hours => $5) THEN 1
+            ELSE spins.spins_used + 1
+        END,
+        last_spin = $3
+    WHERE spins.spins_used < $4 OR spins.last_spin <= $3 - make_interval(hours => $5)
+    RETURNING spins_used, last_spin, total_points, weekly_points
+)
+SELECT true AS spun, spins_used, last_spin, total_points, weekly_points FROM spun
+UNION ALL
+SELECT false, spins_used, last_spin, total_points, weekly_points
+FROM spins
+WHERE user_id = $1 AND NOT EXISTS (SELECT 1 FROM spun);
+"""
+
+# Settle wagered plays of $1 in one statement: debit $2 per play, credit the
+# payouts $3 and append a bets row per play ($4 outcomes, $5 game). The whole
+# stake must be covered up front; no row comes back when it is not.
+SETTLE_BETS = """
+WITH settled AS (
+    UPDATE users
+    SET points = points - $2::bigint * cardinality($3::integer[]) + (SELECT sum(p) FROM unnest($3::integer[]) AS p)
+    WHERE user_id = $1 AND points >= $2::bigint * cardinality($3::integer[])
+    RETURNING points
+), recorded AS (
+    INSERT INTO bets (user_id, game, wager, payout, outcome)
+    SELECT $1, $5, $2, t.payout, t.outcome
+    FROM settled, unnest($3::integer[], $4::text[]) AS t(payout, outcome)
+)
+SELECT points FROM settled;
+"""
+
+# Leaderboard seeds; served by spins_total_points_idx / spins_weekly_points_idx
+TOP_SPINS_TOTAL = """
+SELECT user_id, total_points FROM spins
+ORDER BY total_points DESC, user_id
+LIMIT $1;
+"""
+
+TOP_SPINS_WEEKLY = """
+SELECT user_id, weekly_points FROM spins
+WHERE weekly_points > 0
+ORDER BY weekly_points DESC, user_id
+LIMIT $1;
+"""
+
+WEEKLY_SPIN_PARTICIPANTS = """
+SELECT user_id FROM spins WHERE weekly_points > 0;
+"""
+
+RESET_WEEKLY_SPIN_POINTS = """
+UPDATE spins SET weekly_points = 0 WHERE weekly_points <> 0;
+"""
+
+# Page of memetics after id $1 (keyset), skipping $2 rows to reach a page
+# whose start is not known yet; $3 rows at most
+MEMETICS_PAGE = """
+SELECT id, name, icon, description FROM memetics
+WHERE id > $1
+ORDER BY id
+OFFSET $2 LIMIT $3;
+"""
+
+COUNT_MEMETICS = """
+SELECT count(*) FROM memetics;
+"""
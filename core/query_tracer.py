@@ -0,0 +1,389 @@
+import asyncio
+import datetime
+import json
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import asyncpg as acpg
+
+from core.metrics import REGISTRY, MetricsRegistry
+
+QUERY_SAMPLES = 512
+EXPLAIN_TIMEOUT_MS = 5000
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """The statement with literals replaced by ``?`` and whitespace collapsed."""
+    text = _STRING_LITERAL.sub("?", query)
+    text = _NUMBER_LITERAL.sub("?", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";")
+
+
+def _row_count(status: Any) -> int:
+    """Rows affected according to a command status like ``UPDATE 3``."""
+    if isinstance(status, str):
+        last = status.rsplit(" ", 1)[-1]
+        if last.isdigit():
+            return int(last)
+    return 0
+
+
+@dataclass
+class QueryStats:
+    calls: int = 0
+    errors: int = 0
+    total: float = 0.0
+    rows: int = 0
+    pool_wait: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=QUERY_SAMPLES))
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class QueryTracer:
+    """
+    Per-statement statistics and the slow-query log.
+
+    Statements are grouped by fingerprint. Any statement slower than
+    ``slow_ms`` is logged (to ``log_path`` as JSON lines, or stdout);
+    a ``explain_rate`` share of those also gets an
+    ``EXPLAIN (ANALYZE, BUFFERS)`` run in the background on its own
+    connection, inside a transaction that is rolled back.
+    """
+
+    def __init__(
+        self,
+        slow_ms: float = 200.0,
+        log_path: Optional[str] = None,
+        explain_rate: float = 0.0,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.explain_rate = explain_rate
+        self.stats: Dict[str, QueryStats] = {}
+        self.pool: Optional["TracedPool"] = None
+        self._fingerprints: Dict[str, str] = {}
+        self._explains: set = set()
+
+        self._calls = registry.counter("db_query_calls_total", "Statements run", ["fingerprint"])
+        self._seconds = registry.counter("db_query_seconds_total", "Time spent in statements", ["fingerprint"])
+        self._rows = registry.counter("db_query_rows_total", "Rows returned or affected", ["fingerprint"])
+        self._slow = registry.counter("db_slow_queries_total", "Statements over the slow-query threshold")
+        self._pool_wait = registry.histogram(
+            "db_pool_wait_seconds", "Time spent waiting for a pool connection",
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+        )
+
+    def fingerprint(self, query: str) -> str:
+        cached = self._fingerprints.get(query)
+        if cached is None:
+            cached = fingerprint(query)
+            if len(self._fingerprints) < 4096:
+                self._fingerprints[query] = cached
+        return cached
+
+    def observe_wait(self, seconds: float) -> None:
+        self._pool_wait.observe(seconds)
+
+    def record(
+        self, query: str, args: Optional[tuple], elapsed: float, rows: int, pool_wait: float, failed: bool = False
+    ) -> None:
+        """Account one statement; ``args`` is None when it cannot be re-run for EXPLAIN."""
+        key = self.fingerprint(query)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = QueryStats()
+        stats.calls += 1
+        stats.total += elapsed
+        stats.rows += rows
+        stats.pool_wait += pool_wait
+        stats.latencies.append(elapsed)
+        if failed:
+            stats.errors += 1
+        label = key[:120]
+        self._calls.inc(fingerprint=label)
+        self._seconds.inc(elapsed, fingerprint=label)
+        self._rows.inc(rows, fingerprint=label)
+
+        if elapsed * 1000 >= self.slow_ms:
+            self._slow.inc()
+            entry = {
+                "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "ms": round(elapsed * 1000, 2),
+                "rows": rows,
+                "pool_wait_ms": round(pool_wait * 1000, 2),
+                "query": key,
+            }
+            if (
+                self.pool is not None
+                and args is not None
+                and random.random() < self.explain_rate
+                and query.lstrip()[:6].lower().startswith(EXPLAINABLE)
+                and ";" not in query.strip().rstrip(";")
+            ):
+                task = asyncio.create_task(self._explain_and_log(entry, query, args))
+                self._explains.add(task)
+                task.add_done_callback(self._explains.discard)
+            else:
+                self._write(entry)
+
+    async def _explain_and_log(self, entry: Dict[str, Any], query: str, args: tuple) -> None:
+        try:
+            async with self.pool.raw.acquire() as conn:
+                transaction = conn.transaction()
+                await transaction.start()
+                try:
+                    await conn.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                    rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", *args)
+                    entry["plan"] = [r[0] for r in rows]
+                finally:
+                    await transaction.rollback()
+        except Exception as e:
+            entry["plan_error"] = str(e)
+        self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self.log_path is None:
+            plan = "\n    ".join(entry.get("plan", []))
+            print(f"🐢 Slow query {entry['ms']} ms ({entry['rows']} rows): {entry['query'][:300]}")
+            if plan:
+                print(f"    {plan}")
+            return
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Failed to write slow query log: {e}")
+
+    def report(self, limit: int = 10) -> List[str]:
+        """Statements with the most total time first."""
+        lines = []
+        rows = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+        for key, s in rows[:limit]:
+            lines.append(
+                f"{s.calls:>7} calls {s.total * 1000:>9.1f} ms total "
+                f"p99 {s.percentile(0.99) * 1000:>7.1f} ms "
+                f"rows {s.rows / s.calls:>6.1f}/call wait {s.pool_wait / s.calls * 1000:>5.2f} ms\n"
+                f"    {key[:160]}"
+            )
+        return lines
+
+
+class TracedConnection:
+    """An acquired connection whose statements are recorded by the tracer."""
+
+    def __init__(self, conn: acpg.Connection, tracer: QueryTracer, pool_wait: float = 0.0, breaker=None):
+        self._conn = conn
+        self._tracer = tracer
+        # Wait of the acquire this connection came from, charged to its first statement
+        self._pool_wait = pool_wait
+        self._breaker = breaker
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    async def _run(self, method, count_rows, query: str, args: tuple, explainable: bool = True, **kwargs):
+        pool_wait, self._pool_wait = self._pool_wait, 0.0
+        traced_args = args if explainable else None
+        started = time.perf_counter()
+        try:
+            result = await method(query, *args, **kwargs)
+        except Exception as e:
+            self._tracer.record(query, traced_args, time.perf_counter() - started, 0, pool_wait, failed=True)
+            if self._breaker is not None:
+                self._breaker.record_failure(e)
+            raise
+        self._tracer.record(query, traced_args, time.perf_counter() - started, count_rows(result), pool_wait)
+        return result
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._run(self._conn.execute, _row_count, query, args, **kwargs)
+
+    async def executemany(self, query: str, args, **kwargs):
+        rows = len(args) if hasattr(args, "__len__") else 0
+        return await self._run(self._conn.executemany, lambda _: rows, query, (args,), explainable=False, **kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._run(self._conn.fetch, len, query, args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._run(self._conn.fetchrow, lambda r: int(r is not None), query, args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._run(self._conn.fetchval, lambda v: int(v is not None), query, args, **kwargs)
+
+    async def _copy(self, method, statement: str, args: tuple, kwargs: dict):
+        # COPY is traced under a statement of its own; its data can't be re-run for EXPLAIN
+        async def copy(_, *args, **kwargs):
+            return await method(*args, **kwargs)
+        return await self._run(copy, _row_count, statement, args, explainable=False, **kwargs)
+
+    async def copy_records_to_table(self, table_name: str, **kwargs):
+        return await self._copy(self._conn.copy_records_to_table, f"COPY {table_name} FROM STDIN", (table_name,), kwargs)
+
+    async def copy_to_table(self, table_name: str, **kwargs):
+        return await self._copy(self._conn.copy_to_table, f"COPY {table_name} FROM STDIN", (table_name,), kwargs)
+
+    async def copy_from_table(self, table_name: str, **kwargs):
+        return await self._copy(self._conn.copy_from_table, f"COPY {table_name} TO STDOUT", (table_name,), kwargs)
+
+    async def copy_from_query(self, query: str, *args, **kwargs):
+        return await self._copy(self._conn.copy_from_query, f"COPY ({query}) TO STDOUT", (query, *args), kwargs)
+
+    def transaction(self, **kwargs) -> "_TracedTransaction":
+        return _TracedTransaction(self._conn.transaction(**kwargs), self)
+
+
+class _TracedTransaction:
+    """A transaction whose BEGIN, COMMIT and ROLLBACK are traced like statements."""
+
+    def __init__(self, transaction, conn: TracedConnection):
+        self._transaction = transaction
+        self._conn = conn
+
+    async def _step(self, statement: str, method) -> None:
+        await self._conn._run(lambda _: method(), lambda _: 0, statement, (), explainable=False)
+
+    async def start(self) -> None:
+        await self._step("BEGIN", self._transaction.start)
+
+    async def commit(self) -> None:
+        await self._step("COMMIT", self._transaction.commit)
+
+    async def rollback(self) -> None:
+        await self._step("ROLLBACK", self._transaction.rollback)
+
+    async def __aenter__(self) -> "_TracedTransaction":
+        await self.start()
+        return self
+
+    async def __aexit__(self, extype, ex, tb) -> None:
+        if extype is None:
+            await self.commit()
+        else:
+            await self.rollback()
+
+
+class _TracedAcquire:
+    def __init__(self, pool: "TracedPool", timeout: Optional[float]):
+        self._pool = pool
+        self._timeout = timeout
+        self._conn: Optional[acpg.Connection] = None
+        self._source: Optional[acpg.Pool] = None
+
+    async def __aenter__(self) -> TracedConnection:
+        pool = self._pool
+        breaker = pool.breaker
+        if breaker is not None:
+            breaker.check()
+        # Released to the pool it came from, even if a reconnect swapped pools meanwhile
+        self._source = pool.raw
+        started = time.perf_counter()
+        pool.waiting += 1
+        try:
+            if self._source is None:
+                raise ConnectionError("database pool is not connected")
+            self._conn = await self._source.acquire(timeout=self._timeout or pool.acquire_timeout)
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure(e)
+            raise
+        finally:
+            pool.waiting -= 1
+        if breaker is not None:
+            breaker.record_success()
+        wait = time.perf_counter() - started
+        pool.tracer.observe_wait(wait)
+        return TracedConnection(self._conn, pool.tracer, wait, breaker)
+
+    async def __aexit__(self, *exc) -> None:
+        conn, self._conn = self._conn, None
+        await self._source.release(conn)
+
+
+class TracedPool:
+    """
+    Drop-in wrapper of an asyncpg pool that routes every statement through
+    ``QueryTracer``, including the time spent waiting for a connection.
+    Everything else (sizes, close, ...) is passed through.
+
+    The underlying pool can be replaced with ``swap`` while statements are
+    running; an optional circuit breaker is consulted before every acquire
+    and told about connection failures.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[acpg.Pool],
+        tracer: QueryTracer,
+        breaker=None,
+        acquire_timeout: Optional[float] = None,
+    ):
+        self.raw = pool
+        self.tracer = tracer
+        self.breaker = breaker
+        self.acquire_timeout = acquire_timeout
+        # Acquires currently waiting for a connection
+        self.waiting = 0
+        tracer.pool = self
+
+    def __getattr__(self, name: str):
+        return getattr(self.raw, name)
+
+    def swap(self, pool: Optional[acpg.Pool]) -> Optional[acpg.Pool]:
+        """Route new acquires to ``pool``; returns the previous pool, still open."""
+        old, self.raw = self.raw, pool
+        return old
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TracedAcquire:
+        return _TracedAcquire(self, timeout)
+
+    async def execute(self, query: str, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, **kwargs)
+
+    async def executemany(self, query: str, args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.executemany(query, args, **kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, **kwargs)
+
+    async def copy_records_to_table(self, table_name: str, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.copy_records_to_table(table_name, **kwargs)
+
+    async def copy_to_table(self, table_name: str, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.copy_to_table(table_name, **kwargs)
+
+    async def copy_from_table(self, table_name: str, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.copy_from_table(table_name, **kwargs)
+
+    async def copy_from_query(self, query: str, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.copy_from_query(query, *args, **kwargs)
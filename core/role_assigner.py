@@ -0,0 +1,147 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import discord
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+@dataclass
+class RoleAssignmentResult:
+    role: discord.Role
+    changed: List[discord.Member] = field(default_factory=list)
+    skipped: List[discord.Member] = field(default_factory=list)
+    failed: List[discord.Member] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.changed) + len(self.skipped) + len(self.failed)
+
+
+class RoleAssigner:
+    """
+    Add or remove one role on many members concurrently.
+
+    Every call goes through discord.py's HTTP client, which already queues
+    requests per rate-limit bucket (all member role changes of a guild share
+    one), so ``concurrency`` only needs to be large enough to keep that
+    bucket busy. Rate limits that still surface as 429s are retried after
+    the advertised delay.
+    """
+
+    def __init__(self, concurrency: int = 5, max_attempts: int = 3, progress_every: int = 50):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.progress_every = progress_every
+
+    async def assign(
+        self,
+        members: Iterable[discord.Member],
+        role: discord.Role,
+        *,
+        reason: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> RoleAssignmentResult:
+        """Give ``role`` to every member that does not have it yet."""
+        return await self._run(members, role, True, reason, progress)
+
+    async def remove(
+        self,
+        members: Iterable[discord.Member],
+        role: discord.Role,
+        *,
+        reason: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> RoleAssignmentResult:
+        """Take ``role`` from every member that still has it."""
+        return await self._run(members, role, False, reason, progress)
+
+    async def _run(self, members, role, add, reason, progress) -> RoleAssignmentResult:
+        result = RoleAssignmentResult(role=role)
+        started = time.perf_counter()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        seen = set()
+        for member in members:
+            if member.id in seen:
+                continue
+            seen.add(member.id)
+            # Skip members already in the wanted state without an API call
+            if (role in member.roles) == add:
+                result.skipped.append(member)
+            else:
+                queue.put_nowait(member)
+
+        total = len(seen)
+        done = len(result.skipped)
+        last_reported = 0
+
+        async def report(force: bool = False):
+            nonlocal last_reported
+            if progress is None:
+                return
+            if force or done - last_reported >= self.progress_every:
+                last_reported = done
+                try:
+                    await progress(done, total)
+                except Exception as e:
+                    print(f"Role assignment progress error: {e}")
+
+        async def worker():
+            nonlocal done
+            while True:
+                try:
+                    member = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if await self._apply(member, role, add, reason):
+                    result.changed.append(member)
+                else:
+                    result.failed.append(member)
+                done += 1
+                await report()
+
+        await report(force=True)
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, queue.qsize()))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        result.elapsed = time.perf_counter() - started
+        await report(force=True)
+        return result
+
+    async def _apply(self, member, role, add, reason) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if add:
+                    await member.add_roles(role, reason=reason, atomic=True)
+                else:
+                    await member.remove_roles(role, reason=reason, atomic=True)
+                return True
+            except discord.NotFound:
+                # Member left the guild or the role was deleted
+                return False
+            except discord.Forbidden as e:
+                print(f"Missing permissions to change {role} on {member}: {e}")
+                return False
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    print(f"Failed to change {role} on {member}: {e}")
+                    return False
+                retry_after = _retry_after(e) or min(2 ** attempt, 30)
+                await asyncio.sleep(retry_after)
+        return False
+
+
+def _retry_after(error: discord.HTTPException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
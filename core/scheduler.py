@@ -0,0 +1,306 @@
+import asyncio
+import datetime
+import heapq
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import asyncpg as acpg
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# $1 key (nullable), $2 handler, $3 payload, $4 run_at
+UPSERT_ONE_SHOT_JOB = """
+INSERT INTO scheduled_jobs (job_key, handler, payload, run_at)
+VALUES ($1, $2, $3, $4)
+ON CONFLICT (job_key) DO UPDATE SET
+    handler = EXCLUDED.handler, payload = EXCLUDED.payload, run_at = EXCLUDED.run_at, cron = NULL
+RETURNING id, run_at, cron, handler;
+"""
+
+# $1 key, $2 handler, $3 payload, $4 first run_at, $5 cron.
+# An unchanged cron keeps its stored run_at, so restarts do not shift it.
+UPSERT_CRON_JOB = """
+INSERT INTO scheduled_jobs (job_key, handler, payload, run_at, cron)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (job_key) DO UPDATE SET
+    handler = EXCLUDED.handler,
+    payload = EXCLUDED.payload,
+    cron = EXCLUDED.cron,
+    run_at = CASE
+        WHEN scheduled_jobs.cron IS DISTINCT FROM EXCLUDED.cron THEN EXCLUDED.run_at
+        ELSE scheduled_jobs.run_at
+    END
+RETURNING id, run_at, cron, handler;
+"""
+
+FETCH_DUE_JOBS = """
+SELECT id, run_at, cron, handler FROM scheduled_jobs
+WHERE run_at <= $1 AND handler = ANY($2::text[])
+ORDER BY run_at
+LIMIT $3;
+"""
+
+# Claiming is what makes a run happen once: only one caller gets the row back.
+# The claim moves run_at to the end of a lease ($3), so a run that never
+# finishes (crash, failed handler) is due again once the lease is over.
+# Rows of handlers not in $4 are left alone.
+CLAIM_JOB = """
+UPDATE scheduled_jobs SET run_at = $3
+WHERE id = $1 AND run_at = $2 AND handler = ANY($4::text[])
+RETURNING handler, payload, cron;
+"""
+
+# After a successful run; $2 is the lease, so a job rescheduled meanwhile stays
+FINISH_ONE_SHOT_JOB = """
+DELETE FROM scheduled_jobs WHERE id = $1 AND run_at = $2;
+"""
+
+FINISH_CRON_JOB = """
+UPDATE scheduled_jobs SET run_at = $3
+WHERE id = $1 AND run_at = $2
+RETURNING id, run_at, cron, handler;
+"""
+
+
+class CronSchedule:
+    """
+    Minimal five-field cron expression: ``minute hour day month weekday``.
+
+    Fields accept ``*``, numbers, ``a-b`` ranges, ``/step`` and comma lists.
+    Weekdays run 0-6 from Sunday (7 is Sunday too). As in cron, when both
+    day and weekday are restricted a time matches if either does.
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        parsed = [self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self._RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start, end = (int(v) for v in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime.datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime.datetime) -> datetime.datetime:
+        """First matching minute strictly after ``dt``."""
+        t = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = t + datetime.timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + datetime.timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + datetime.timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += datetime.timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class Scheduler:
+    """
+    Wall-clock job scheduler backed by the ``scheduled_jobs`` table.
+
+    Only jobs due within ``horizon`` seconds are held in an in-memory heap;
+    the rest stay in Postgres until a refill picks them up. Each run is
+    claimed with a single conditional statement first, so a job runs once
+    even with several bot processes. The claim holds the job for ``lease``
+    seconds; only a handler that returns deletes it (or moves a cron job to
+    its next time), otherwise it runs again when the lease is over. Jobs
+    missed while the bot was down run once at startup; cron jobs then
+    continue from the current time.
+    """
+
+    def __init__(self, pool: acpg.Pool, horizon: int = 300, batch_size: int = 500, lease: int = 600):
+        self.pool = pool
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.lease = lease
+        self.handlers: Dict[str, JobHandler] = {}
+
+        # (run_at, id, cron, handler) of jobs due within the horizon
+        self._heap: List[Tuple[datetime.datetime, int, Optional[str], str]] = []
+        # id -> run_at of the live heap entry; older entries are stale
+        self._queued: Dict[int, datetime.datetime] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, handler: JobHandler) -> None:
+        self.handlers[name] = handler
+        self._wake.set()
+
+    def unregister(self, name: str) -> None:
+        self.handlers.pop(name, None)
+
+    async def schedule_once(
+        self,
+        handler: str,
+        run_at: datetime.datetime,
+        payload: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None,
+    ) -> int:
+        """Run ``handler`` once at ``run_at`` (naive UTC). Reusing ``key`` replaces the job."""
+        record = await self.pool.fetchrow(
+            UPSERT_ONE_SHOT_JOB, key, handler, json.dumps(payload or {}), run_at
+        )
+        self._offer(record)
+        return record["id"]
+
+    async def schedule_cron(
+        self, key: str, handler: str, cron: str, payload: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Run ``handler`` on every match of ``cron`` (UTC); idempotent per ``key``."""
+        first_run = CronSchedule(cron).next_after(utcnow())
+        record = await self.pool.fetchrow(
+            UPSERT_CRON_JOB, key, handler, json.dumps(payload or {}), first_run, cron
+        )
+        self._offer(record)
+        return record["id"]
+
+    async def payload(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored payload of the job ``key``, None when there is no such job."""
+        raw = await self.pool.fetchval("SELECT payload FROM scheduled_jobs WHERE job_key = $1", key)
+        return None if raw is None else json.loads(raw)
+
+    async def cancel(self, key: str) -> bool:
+        result = await self.pool.execute("DELETE FROM scheduled_jobs WHERE job_key = $1", key)
+        return result != "DELETE 0"
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.wait(self._running, timeout=10)
+
+    def _offer(self, record) -> None:
+        if record["run_at"] <= utcnow() + datetime.timedelta(seconds=self.horizon):
+            self._push(record)
+            self._wake.set()
+
+    def _push(self, record) -> None:
+        if self._queued.get(record["id"]) == record["run_at"]:
+            return
+        self._queued[record["id"]] = record["run_at"]
+        heapq.heappush(self._heap, (record["run_at"], record["id"], record["cron"], record["handler"]))
+
+    async def _refill(self) -> None:
+        if not self.handlers:
+            return
+        until = utcnow() + datetime.timedelta(seconds=self.horizon)
+        records = await self.pool.fetch(
+            FETCH_DUE_JOBS, until, list(self.handlers.keys()), self.batch_size
+        )
+        for record in records:
+            self._push(record)
+
+    async def _run_loop(self) -> None:
+        next_refill = utcnow()
+        while True:
+            try:
+                now = utcnow()
+                if now >= next_refill:
+                    await self._refill()
+                    next_refill = now + datetime.timedelta(seconds=self.horizon / 2)
+
+                while self._heap and self._heap[0][0] <= utcnow():
+                    run_at, job_id, cron, handler = heapq.heappop(self._heap)
+                    if self._queued.get(job_id) != run_at:
+                        continue
+                    del self._queued[job_id]
+                    if handler in self.handlers:
+                        # Unregistered handlers keep their rows for a later refill
+                        await self._claim_and_run(job_id, run_at, cron)
+
+                wake_at = next_refill
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = max((wake_at - utcnow()).total_seconds(), 0)
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler error: {e}")
+                await asyncio.sleep(5)
+
+    async def _claim_and_run(self, job_id: int, run_at: datetime.datetime, cron: Optional[str]) -> None:
+        leased_until = utcnow() + datetime.timedelta(seconds=self.lease)
+        record = await self.pool.fetchrow(CLAIM_JOB, job_id, run_at, leased_until, list(self.handlers.keys()))
+        if record is None:
+            # Another process claimed it, it was cancelled or rescheduled, or its handler is gone
+            return
+
+        name = record["handler"]
+        claim = {"id": job_id, "run_at": leased_until, "cron": record["cron"], "handler": name}
+        task = asyncio.create_task(self._invoke(self.handlers[name], claim, run_at, json.loads(record["payload"])))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _invoke(self, handler: JobHandler, claim: Dict[str, Any], run_at: datetime.datetime, payload: Dict[str, Any]) -> None:
+        try:
+            await handler(payload)
+        except Exception as e:
+            print(f"Scheduled job {claim['handler']} failed, retrying at {claim['run_at']}: {e}")
+            self._offer(claim)
+            return
+        try:
+            if claim["cron"] is None:
+                await self.pool.execute(FINISH_ONE_SHOT_JOB, claim["id"], claim["run_at"])
+            else:
+                next_run = CronSchedule(claim["cron"]).next_after(max(run_at, utcnow()))
+                record = await self.pool.fetchrow(FINISH_CRON_JOB, claim["id"], claim["run_at"], next_run)
+                if record is not None:
+                    self._offer(record)
+        except Exception as e:
+            # The lease runs out and the job runs again
+            print(f"Scheduled job {claim['handler']} ran but could not be finished: {e}")
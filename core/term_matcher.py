@@ -0,0 +1,105 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class TermMatcher:
+    """
+    Matches many search terms against a message in one pass.
+
+    Terms are matched as whole words by default (``*`` matches any run of
+    word characters, spaces match any whitespace), or as plain substrings
+    with ``whole_word=False``. Plain words and literal substrings are
+    compiled into one regex shaped like a trie, so the regex engine walks
+    all of them at once, and each hit maps straight back to its terms.
+    Wildcards and phrases share a combined pre-check and are only tried one
+    by one on messages that pass it.
+    """
+
+    def __init__(self, terms: Iterable[str], whole_word: bool = True, case_sensitive: bool = False):
+        self.whole_word = whole_word
+        self.case_sensitive = case_sensitive
+        self.terms: List[str] = list(dict.fromkeys(t.strip() for t in terms if t.strip(" *")))
+        if not self.terms:
+            raise ValueError("no search terms given")
+
+        # matched text -> indices of the terms it satisfies
+        self._hits: Dict[str, List[int]] = {}
+        self._patterns: List[Tuple[int, re.Pattern]] = []
+        literals = []
+        for i, term in enumerate(self.terms):
+            key = self._normalize(term)
+            if "*" in key and not whole_word:
+                raise ValueError(f"wildcards only work on whole words: {term!r}")
+            if not whole_word or WORD_PATTERN.fullmatch(key):
+                self._hits.setdefault(key, []).append(i)
+                literals.append(key)
+            else:
+                self._patterns.append((i, self._compile(key)))
+
+        self._literal_re: Optional[re.Pattern] = None
+        self._literal_scan: Optional[re.Pattern] = None
+        if literals:
+            trie = _trie_pattern(literals)
+            # Plain scan for the first candidate: lets the regex engine skip ahead quickly
+            self._literal_scan = re.compile(trie)
+            if whole_word:
+                self._literal_re = re.compile(rf"\b(?:{trie})\b")
+            else:
+                # Overlapping search: the longest literal starting at each position
+                self._literal_re = re.compile(f"(?=({trie}))")
+                # Every literal that is a prefix of a hit matches at the same position
+                exact = dict(self._hits)
+                for text in exact:
+                    self._hits[text] = sorted(
+                        {i for other, ids in exact.items() if text.startswith(other) for i in ids}
+                    )
+
+        self._pattern_re: Optional[re.Pattern] = None
+        if self._patterns:
+            self._pattern_re = re.compile("|".join(f"(?:{p.pattern})" for _, p in self._patterns))
+
+    def _normalize(self, text: str) -> str:
+        return text if self.case_sensitive else text.casefold()
+
+    def _compile(self, term: str) -> re.Pattern:
+        parts = []
+        for word in term.split():
+            parts.append(r"\w*".join(re.escape(piece) for piece in word.split("*")))
+        body = r"\s+".join(parts)
+        return re.compile(rf"(?<!\w){body}(?!\w)")
+
+    def match(self, content: str) -> Set[int]:
+        """Indices of the terms found in ``content``."""
+        text = self._normalize(content)
+        found: Set[int] = set()
+        if self._literal_re is not None:
+            first = self._literal_scan.search(text)
+            if first is not None:
+                for hit in self._literal_re.finditer(text, first.start()):
+                    found.update(self._hits[hit.group(hit.lastindex or 0)])
+        if self._pattern_re is not None and self._pattern_re.search(text):
+            found.update(i for i, pattern in self._patterns if pattern.search(text))
+        return found
+
+
+def _trie_pattern(literals: Iterable[str]) -> str:
+    """Regex matching any of ``literals``, factored by common prefix; longest match wins."""
+    trie: dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if "" in node:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
@@ -0,0 +1,362 @@
+import asyncio
+import datetime
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import asyncpg as acpg
+import discord
+
+from core.history_crawler import CrawlProgress, HistoryCrawler
+
+FLUSH_WORD_COUNTS = """
+INSERT INTO word_counts (channel_id, token, author_id, count)
+SELECT * FROM unnest($1::bigint[], $2::text[], $3::bigint[], $4::integer[])
+ON CONFLICT (channel_id, token, author_id) DO UPDATE SET count = word_counts.count + EXCLUDED.count;
+"""
+
+# $3 session start and $4 newest live message per channel (both NULL without
+# live messages): live messages extend the covered range, or start it at the
+# session for a channel seen for the first time
+FLUSH_CHANNEL_COUNTS = """
+INSERT INTO word_index_channels (channel_id, message_count, oldest_id, synced_id)
+SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::bigint[])
+ON CONFLICT (channel_id) DO UPDATE SET
+    message_count = word_index_channels.message_count + EXCLUDED.message_count,
+    oldest_id = coalesce(word_index_channels.oldest_id, EXCLUDED.oldest_id),
+    synced_id = GREATEST(word_index_channels.synced_id, EXCLUDED.synced_id);
+"""
+
+# Channels whose covered range ends before $1, the session start
+STALE_CHANNELS = """
+SELECT channel_id FROM word_index_channels WHERE synced_id < $1;
+"""
+
+FETCH_CHANNEL_STATE = """
+SELECT message_count, oldest_id, synced_id, backfill_done, crawl_started
+FROM word_index_channels WHERE channel_id = $1;
+"""
+
+# $1 channel, $2 oldest_id, $3 synced_id, $4 backfill_done, $5 crawl_started
+SAVE_CHANNEL_STATE = """
+INSERT INTO word_index_channels (channel_id, oldest_id, synced_id, backfill_done, crawl_started)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (channel_id) DO UPDATE SET
+    oldest_id = EXCLUDED.oldest_id,
+    synced_id = GREATEST(word_index_channels.synced_id, EXCLUDED.synced_id),
+    backfill_done = EXCLUDED.backfill_done,
+    crawl_started = word_index_channels.crawl_started OR EXCLUDED.crawl_started;
+"""
+
+TOP_AUTHORS_FOR_TOKEN = """
+SELECT author_id, count, sum(count) OVER () AS total
+FROM word_counts
+WHERE channel_id = $1 AND token = $2 AND count > 0
+ORDER BY count DESC
+LIMIT $3;
+"""
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64
+
+
+def tokenize(content: str) -> Set[str]:
+    """Distinct case-folded words of a message."""
+    return {t for t in TOKEN_PATTERN.findall(content.casefold()) if len(t) <= MAX_TOKEN_LENGTH}
+
+
+class _Deltas:
+    """Buffered count changes and the newest live message, per channel."""
+
+    def __init__(self):
+        self.words: Dict[Tuple[int, str, int], int] = {}
+        self.messages: Dict[int, int] = {}
+        self.newest: Dict[int, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.words or self.messages or self.newest)
+
+    def add(self, message: discord.Message, sign: int, live: bool) -> None:
+        channel_id = message.channel.id
+        author_id = message.author.id
+        for token in tokenize(message.content):
+            key = (channel_id, token, author_id)
+            self.words[key] = self.words.get(key, 0) + sign
+        self.messages[channel_id] = self.messages.get(channel_id, 0) + sign
+        if live and sign > 0:
+            self.newest[channel_id] = max(self.newest.get(channel_id, 0), message.id)
+
+    def merge(self, other: "_Deltas") -> None:
+        for key, delta in other.words.items():
+            self.words[key] = self.words.get(key, 0) + delta
+        for channel_id, delta in other.messages.items():
+            self.messages[channel_id] = self.messages.get(channel_id, 0) + delta
+        for channel_id, newest in other.newest.items():
+            self.newest[channel_id] = max(self.newest.get(channel_id, 0), newest)
+
+
+class ChannelState:
+    def __init__(self, record: Optional[acpg.Record] = None):
+        self.message_count = record["message_count"] if record else 0
+        # Every message id in [oldest_id, synced_id] is indexed
+        self.oldest_id: Optional[int] = record["oldest_id"] if record else None
+        self.synced_id: Optional[int] = record["synced_id"] if record else None
+        self.backfill_done: bool = record["backfill_done"] if record else False
+        # The history crawl was asked for at least once
+        self.crawl_started: bool = record["crawl_started"] if record else False
+
+
+class WordIndex:
+    """
+    Per-channel, per-author count of messages containing each word.
+
+    Live messages, edits and deletes are buffered in memory and flushed in
+    batches. History from before this session is crawled once per channel
+    (``sync_channel``): downwards until the start of the channel, and for
+    the gap left while the bot was offline. Live messages of a channel with
+    such a gap are held back until the gap is crawled and are written with
+    its last checkpoint, so the covered range stays contiguous and a
+    restart never counts them twice. Edits and deletes of messages that are
+    no longer in discord.py's message cache are not seen.
+    """
+
+    def __init__(
+        self,
+        pool: acpg.Pool,
+        prefix: str,
+        crawler: Optional[HistoryCrawler] = None,
+        flush_interval: float = 5.0,
+        max_pending: int = 5000,
+    ):
+        self.pool = pool
+        self.prefix = prefix
+        self.crawler = crawler or HistoryCrawler()
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Everything newer than this is recorded live
+        self.session_start_id = discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+
+        self._deltas = _Deltas()
+        # Live counts of channels whose covered range does not reach this session yet
+        self._held: Dict[int, _Deltas] = {}
+        # Channels with such a gap, None until loaded; covered ones stopped holding
+        self._stale: Optional[Set[int]] = None
+        self._covered: Set[int] = set()
+        # Newest live message per channel this session
+        self._session_newest: Dict[int, int] = {}
+        self._synced_channels: Set[int] = set()
+        self._sync_locks: Dict[int, asyncio.Lock] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def is_indexable(self, message: discord.Message) -> bool:
+        if message.author.bot or message.guild is None:
+            return False
+        return not message.content.startswith(self.prefix)
+
+    def _holds(self, channel_id: int) -> bool:
+        if channel_id in self._covered:
+            return False
+        return self._stale is None or channel_id in self._stale
+
+    def record(self, message: discord.Message, sign: int = 1) -> None:
+        """Count (or with ``sign=-1`` uncount) one message."""
+        if not self.is_indexable(message):
+            return
+        channel_id = message.channel.id
+        live = message.id > self.session_start_id
+        if live and self._holds(channel_id):
+            self._held.setdefault(channel_id, _Deltas()).add(message, sign, live)
+        else:
+            self._deltas.add(message, sign, live)
+        if live and sign > 0:
+            self._session_newest[channel_id] = max(self._session_newest.get(channel_id, 0), message.id)
+        if len(self._deltas.words) >= self.max_pending:
+            self._wake.set()
+
+    async def forget(self, message: discord.Message) -> None:
+        """Uncount a deleted message if it was counted."""
+        if await self._is_indexed(message.channel.id, message.id):
+            self.record(message, sign=-1)
+
+    async def replace(self, before: discord.Message, after: discord.Message) -> None:
+        """Swap an edited message's counts; messages outside the covered range are left to the crawl."""
+        if await self._is_indexed(before.channel.id, before.id):
+            self.record(before, sign=-1)
+            self.record(after)
+
+    async def _load_stale(self) -> None:
+        self._stale = set(await self.stale_channels())
+        # Channels without a gap stop holding their live counts
+        for channel_id in [c for c in self._held if not self._holds(c)]:
+            self._deltas.merge(self._held.pop(channel_id))
+
+    async def _is_indexed(self, channel_id: int, message_id: int) -> bool:
+        if message_id > self.session_start_id:
+            return True
+        record = await self.pool.fetchrow(FETCH_CHANNEL_STATE, channel_id)
+        state = ChannelState(record)
+        if state.synced_id is None or message_id > state.synced_id:
+            return False
+        return state.backfill_done or (state.oldest_id is not None and message_id >= state.oldest_id)
+
+    async def flush(self, checkpoint: Optional[Tuple[int, "ChannelState"]] = None, release: bool = False) -> None:
+        """
+        Write buffered counts. A ``(channel_id, state)`` checkpoint is saved in
+        the same transaction, so a crawl never double-counts a page on resume.
+        With ``release`` the checkpoint closes the channel's gap, and the live
+        counts held back for it are written along with it.
+        """
+        async with self._flush_lock:
+            held = self._held.pop(checkpoint[0], None) if release else None
+            if not self._deltas and held is None and checkpoint is None:
+                return
+            deltas, self._deltas = self._deltas, _Deltas()
+            batch = _Deltas()
+            batch.merge(deltas)
+            if held is not None:
+                batch.merge(held)
+
+            words = [(k, d) for k, d in batch.words.items() if d]
+            channel_ids = list(set(batch.messages) | set(batch.newest))
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        if checkpoint is not None:
+                            channel_id, state = checkpoint
+                            await conn.execute(
+                                SAVE_CHANNEL_STATE,
+                                channel_id,
+                                state.oldest_id,
+                                state.synced_id,
+                                state.backfill_done,
+                                state.crawl_started,
+                            )
+                        if words:
+                            await conn.execute(
+                                FLUSH_WORD_COUNTS,
+                                [k[0] for k, _ in words],
+                                [k[1] for k, _ in words],
+                                [k[2] for k, _ in words],
+                                [d for _, d in words],
+                            )
+                        if channel_ids:
+                            await conn.execute(
+                                FLUSH_CHANNEL_COUNTS,
+                                channel_ids,
+                                [batch.messages.get(c, 0) for c in channel_ids],
+                                [self.session_start_id if c in batch.newest else None for c in channel_ids],
+                                [batch.newest.get(c) for c in channel_ids],
+                            )
+            except Exception:
+                # Merge back so the next flush retries
+                self._deltas.merge(deltas)
+                if held is not None:
+                    self._held.setdefault(checkpoint[0], _Deltas()).merge(held)
+                raise
+            if release:
+                channel_id = checkpoint[0]
+                self._covered.add(channel_id)
+                # Live messages that arrived while this flush ran
+                arrived = self._held.pop(channel_id, None)
+                if arrived is not None:
+                    self._deltas.merge(arrived)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            if self._stale is None:
+                try:
+                    await self._load_stale()
+                except Exception as e:
+                    print(f"Word index state load error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"Word index flush error: {e}")
+
+    def is_synced(self, channel_id: int) -> bool:
+        return channel_id in self._synced_channels
+
+    async def sync_channel(
+        self, channel: discord.abc.Messageable, progress: Optional[CrawlProgress] = None, backfill: bool = True
+    ) -> ChannelState:
+        """
+        Make the index cover the channel's whole history: fill the gap since
+        the last session and, with ``backfill``, crawl any history not indexed
+        yet. Both crawls checkpoint every page, so an interrupted sync picks
+        up where it stopped.
+        """
+        lock = self._sync_locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            state = ChannelState(await self.pool.fetchrow(FETCH_CHANNEL_STATE, channel.id))
+            state.crawl_started = state.crawl_started or backfill
+            if channel.id not in self._synced_channels:
+                if state.synced_id is None:
+                    # Never crawled: coverage starts at this session
+                    state.oldest_id = self.session_start_id
+                elif state.synced_id < self.session_start_id:
+                    async def on_gap_page(messages):
+                        for message in messages:
+                            self.record(message)
+                        state.synced_id = max(state.synced_id, max(m.id for m in messages))
+                        await self.flush(checkpoint=(channel.id, state))
+
+                    await self.crawler.crawl(
+                        channel, on_gap_page, after=state.synced_id, before=self.session_start_id, progress=progress
+                    )
+                # Everything since the session started was recorded live
+                state.synced_id = max(self.session_start_id, self._session_newest.get(channel.id, 0))
+                await self.flush(checkpoint=(channel.id, state), release=True)
+                self._synced_channels.add(channel.id)
+
+            if backfill and not state.backfill_done:
+                async def on_backfill_page(messages):
+                    for message in messages:
+                        self.record(message)
+                    state.oldest_id = min(state.oldest_id, min(m.id for m in messages))
+                    await self.flush(checkpoint=(channel.id, state))
+
+                await self.crawler.crawl(channel, on_backfill_page, before=state.oldest_id, progress=progress)
+                state.backfill_done = True
+                await self.flush(checkpoint=(channel.id, state))
+
+            await self.flush()
+            return ChannelState(await self.pool.fetchrow(FETCH_CHANNEL_STATE, channel.id))
+
+    async def stale_channels(self) -> List[int]:
+        """Channels with a gap since their last session; their live counts wait for it to be crawled."""
+        records = await self.pool.fetch(STALE_CHANNELS, self.session_start_id)
+        return [r["channel_id"] for r in records]
+
+    async def pending_channels(self) -> List[int]:
+        """Channels whose history crawl was interrupted before it finished."""
+        records = await self.pool.fetch(
+            "SELECT channel_id FROM word_index_channels WHERE crawl_started AND NOT backfill_done"
+        )
+        return [r["channel_id"] for r in records]
+
+    async def top_authors(self, channel_id: int, token: str, limit: int = 5) -> Tuple[int, List[Tuple[int, int]]]:
+        """Total messages containing ``token`` and the top ``limit`` authors."""
+        await self.flush()
+        records = await self.pool.fetch(TOP_AUTHORS_FOR_TOKEN, channel_id, token, limit)
+        total = records[0]["total"] if records else 0
+        return total, [(r["author_id"], r["count"]) for r in records]
@@ -1,15 +1,27 @@
 # main.py
 import os
+import time
+import datetime
+import contextlib
+import aiohttp
+import asyncpg as acpg
 import logging as log
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-import asyncpg as acpg
 
-from core.keep_alive import keep_alive
-from core.databasehandler import DatabaseHandler
-from core.cog_loader import load_all_cogs
-from core import queries
+from core.keep_alive import HealthServer
+from core.databasehandler import DatabaseHandler, BalanceCache
+from core.ledger import LedgerBuffer, verify as verify_ledger
+from core import bulk
+from core.cog_loader import load_all_cogs, sync_command_tree
+from core.hot_reload import HotReloader
+from core.command_metrics import CommandMetrics
+from core.query_tracer import QueryTracer, TracedPool
+from core.pool_manager import CircuitBreaker, PoolConfig, PoolManager
+from core.scheduler import Scheduler
+from core.word_index import WordIndex
+from core.migrations import MigrationRunner
 
 
 # ============================================================
@@ -21,6 +33,37 @@ TOKEN = os.getenv("DISCORD_TOKEN")
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "z!")
 IS_DEVELOPMENT = os.getenv("IS_DEVELOPMENT", "false").lower() == "true"
 DB_URL = os.getenv("DATABASE_URL")
+# Connection pool sizing and timeouts (seconds, 0 disables a timeout)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Circuit breaker: failures in a row before failing fast, seconds before a probe
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_RESET = float(os.getenv("DB_BREAKER_RESET", "10"))
+# Upper bound of the exponential reconnect backoff
+DB_RECONNECT_MAX_DELAY = float(os.getenv("DB_RECONNECT_MAX_DELAY", "60"))
+# Write-behind balance cache, 0 disables it
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "0"))
+BALANCE_FLUSH_INTERVAL_MS = int(os.getenv("BALANCE_FLUSH_INTERVAL_MS", "1000"))
+BALANCE_FLUSH_MAX_PENDING = int(os.getenv("BALANCE_FLUSH_MAX_PENDING", "500"))
+# Buffered entries before balance changes wait for the ledger writer, 0 disables the ledger
+LEDGER_BUFFER_SIZE = int(os.getenv("LEDGER_BUFFER_SIZE", "50000"))
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "5000"))
+LEDGER_FLUSH_INTERVAL_MS = int(os.getenv("LEDGER_FLUSH_INTERVAL_MS", "1000"))
+# Where the export command writes its files
+BULK_EXPORT_DIR = os.getenv("BULK_EXPORT_DIR", "exports")
+# Hash of the last synced slash command tree; tree.sync() only runs when it changes
+COMMAND_TREE_HASH_FILE = os.getenv("COMMAND_TREE_HASH_FILE", ".command_tree.hash")
+# Watch cogs/ and core/ and reload changed extensions in place
+HOT_RELOAD = os.getenv("HOT_RELOAD", "false").lower() == "true"
+# /healthz, /readyz and /metrics; 0 disables the server
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+# Slow-query log: threshold, JSON-lines file (stdout when unset), EXPLAIN sampling
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG") or None
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0"))
 
 # ============================================================
 # Discord Intents
@@ -38,35 +81,127 @@ if COMMAND_PREFIX is None:
 class BotRunner(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.db_pool: acpg.Pool | None = None
+        self.query_tracer = QueryTracer(
+            slow_ms=SLOW_QUERY_MS, log_path=SLOW_QUERY_LOG, explain_rate=SLOW_QUERY_EXPLAIN_RATE
+        )
+        self.pool_manager: PoolManager | None = None
+        self.db_pool: TracedPool | None = None
         self.db_handler: DatabaseHandler | None = None
+        self.scheduler: Scheduler | None = None
+        self.word_index: WordIndex | None = None
+        self.hot_reloader: HotReloader | None = None
+        self.health_server: HealthServer | None = None
+        # Per-command latency, errors and db/http split
+        self.command_metrics = CommandMetrics()
+        self.command_metrics.install(self)
 
     async def setup_hook(self):
         """Executed before bot connects to Discord."""
-        try:
-            print("🔌 Connecting to PostgreSQL database...")
-            self.db_pool = await acpg.create_pool(DB_URL)
+        if HEALTH_PORT:
+            self.health_server = HealthServer(self, port=HEALTH_PORT)
+            try:
+                await self.health_server.start()
+            except OSError as e:
+                print(f"❌ Failed to start health server: {e}")
 
-            # Run table creation query from queries.py
-            await self.db_pool.execute(queries.CREATE_USERS_TABLE)
+        # One traced pool for the bot's lifetime; reconnects swap the asyncpg pool beneath it
+        self.pool_manager = PoolManager(
+            PoolConfig(
+                DB_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                command_timeout=DB_COMMAND_TIMEOUT,
+                acquire_timeout=DB_ACQUIRE_TIMEOUT,
+                connect_timeout=DB_CONNECT_TIMEOUT,
+            ),
+            self.query_tracer,
+            init=self.command_metrics.instrument_connection,
+            breaker=CircuitBreaker(DB_BREAKER_THRESHOLD, DB_BREAKER_RESET),
+            on_connect=self.on_database_connect,
+            backoff_max=DB_RECONNECT_MAX_DELAY,
+        )
+        self.db_pool = self.pool_manager.pool
 
-            self.db_handler = DatabaseHandler(self.db_pool)
+        print("🔌 Connecting to PostgreSQL database...")
+        # A migration that fails raises here and aborts startup
+        if await self.pool_manager.connect():
             print("✅ Database ready.")
-        except Exception as e:
-            print(f"❌ Failed to connect database: {e}")
+        else:
+            print("❌ Database unavailable, retrying in the background.")
+
+        cache = None
+        if BALANCE_CACHE_SIZE > 0:
+            cache = BalanceCache(
+                self.db_pool,
+                max_size=BALANCE_CACHE_SIZE,
+                flush_interval_ms=BALANCE_FLUSH_INTERVAL_MS,
+                max_pending=BALANCE_FLUSH_MAX_PENDING,
+            )
+        ledger = None
+        if LEDGER_BUFFER_SIZE > 0:
+            ledger = LedgerBuffer(
+                self.db_pool,
+                max_size=LEDGER_BUFFER_SIZE,
+                batch_size=LEDGER_BATCH_SIZE,
+                flush_interval_ms=LEDGER_FLUSH_INTERVAL_MS,
+            )
+        self.db_handler = DatabaseHandler(self.db_pool, cache=cache, pool_manager=self.pool_manager, ledger=ledger)
+        await self.db_handler.start()
+
+        self.scheduler = Scheduler(self.db_pool)
+
+        self.word_index = WordIndex(self.db_pool, COMMAND_PREFIX)
+        self.word_index.start()
 
         # --- Load all cogs ---
         print("🧩 Loading cogs...")
         await load_all_cogs(self)
-        await self.tree.sync()
+        await sync_command_tree(self, COMMAND_TREE_HASH_FILE)
         print("✅ All cogs loaded successfully.")
 
+        self.hot_reloader = HotReloader(
+            self, after_reload=lambda: sync_command_tree(self, COMMAND_TREE_HASH_FILE)
+        )
+        if HOT_RELOAD:
+            self.hot_reloader.start()
+            print("♻️ Hot reload watching cogs/ and core/.")
+
+        # Start after the cogs registered their job handlers
+        if self.scheduler is not None:
+            self.scheduler.start()
+
+    async def on_database_connect(self, pool: TracedPool):
+        # Bring the schema up to date (a single read when it already is)
+        await MigrationRunner(pool).run()
+
     async def on_ready(self):
         print(f"Logged in as {self.user.name}")
-        await self.change_presence(activity=discord.Game(name=f"{command_prefix}help | 💣"))
+        await self.change_presence(activity=discord.Game(name=f"{COMMAND_PREFIX}help | 💣"))
 
+    async def close(self):
+        if self.hot_reloader is not None:
+            await self.hot_reloader.stop()
+        if self.scheduler is not None:
+            await self.scheduler.close()
+        if self.word_index is not None:
+            await self.word_index.close()
+        # Flush cached balances and ledger entries before the pool goes away
+        if self.db_handler is not None:
+            try:
+                await self.db_handler.close()
+            except Exception as e:
+                print(f"❌ Failed to flush database handler: {e}")
+        if self.pool_manager is not None:
+            await self.pool_manager.close()
+        if self.health_server is not None:
+            await self.health_server.close()
+        await super().close()
 
-bot = BotRunner(command_prefix, intents=intents)
+
+# ============================================================
+# Bot Initialization
+# ============================================================
+bot = BotRunner(command_prefix=COMMAND_PREFIX, intents=intents)
 
 @bot.command(name="reload", aliases=['r'])    
 @commands.is_owner()
@@ -89,23 +224,125 @@ async def reload_error(ctx, error):
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"Usage: {COMMAND_PREFIX}reload <module_name>")
 
+@bot.command(name="hotreload", aliases=['hr'])
+@commands.is_owner()
+async def hotreload(ctx, mode: str = "now"):
+    """`on`/`off` toggles watching cogs/ and core/, `now` reloads pending changes once."""
+    reloader = bot.hot_reloader
+    if reloader is None:
+        return await ctx.send("Hot reload is not available.")
+    mode = mode.lower()
+    if mode == "on":
+        async def report(summary: str):
+            await ctx.send(f"```\n{summary}\n```")
+        reloader.report = report
+        reloader.start()
+        await ctx.send("Watching `cogs/` and `core/` for changes.")
+    elif mode == "off":
+        await reloader.stop()
+        reloader.report = None
+        await ctx.send("Hot reload stopped.")
+    elif mode == "now":
+        report = await reloader.reload_now()
+        await ctx.send(f"```\n{report.summary()}\n```")
+    else:
+        await ctx.send(f"Usage: {COMMAND_PREFIX}hotreload [on|off|now]")
+
+@bot.command(name="perf")
+@commands.is_owner()
+async def perf(ctx, limit: int = 15):
+    """Per-command calls, errors, p50/p99 latency and where the time went."""
+    lines = bot.command_metrics.report(limit)
+    if len(lines) == 1:
+        return await ctx.send("No commands recorded yet.")
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="queries")
+@commands.is_owner()
+async def queries_report(ctx, limit: int = 8):
+    """Statements with the most total time, with p99, rows and pool wait."""
+    lines = bot.query_tracer.report(limit)
+    if not lines:
+        return await ctx.send("No queries recorded yet.")
+    report = "\n".join(lines)
+    await ctx.send(f"```\n{report[:1900]}\n```")
+
 @bot.command(name="reconnect")
 @commands.is_owner()
 async def reconnect(ctx: commands.Context):
-    return await ctx.send("Still develop")
-    
-    success = await bot.db_handler.reconnect()
+    """Open a fresh pool and swap it in; running queries finish on the old one."""
+    if bot.db_handler is None:
+        return await ctx.send("Database is not configured.")
+    started = time.perf_counter()
+    try:
+        success = await bot.db_handler.reconnect()
+    except Exception as e:
+        return await ctx.send(f"Connected, but the database is left unavailable: {e}\n`{bot.pool_manager.status()}`")
+    elapsed = (time.perf_counter() - started) * 1000
 
     if success:
-        await ctx.send("Connection re-established successfully!")
-        await bot.inital_table()
+        await ctx.send(f"Connection re-established successfully! ({elapsed:.0f} ms)\n`{bot.pool_manager.status()}`")
     else:
-        await ctx.send("Failed to re-establish database connection.") 
+        await ctx.send(f"Failed to re-establish database connection.\n`{bot.pool_manager.status()}`")
 
-# ============================================================
-# Bot Initialization
-# ============================================================
-bot = BotRunner(command_prefix=COMMAND_PREFIX, intents=intents)
+@bot.command(name="ledger")
+@commands.is_owner()
+async def ledger(ctx: commands.Context, limit: int = 10):
+    """Flush pending balances and ledger entries, then list users whose balance drifted from the ledger."""
+    handler = bot.db_handler
+    if handler is None or handler.ledger is None:
+        return await ctx.send("The ledger is disabled.")
+    if handler.cache is not None:
+        await handler.cache.flush()
+    await handler.ledger.flush()
+    drifted, records = await verify_ledger(bot.db_pool, limit)
+    if not drifted:
+        return await ctx.send("✅ Every balance matches the ledger.")
+    lines = [f"{r['user_id']}: points {r['points']}, ledger {r['ledger_points']}" for r in records]
+    await ctx.send(f"⚠️ {drifted} balances differ from the ledger:\n```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="export")
+@commands.is_owner()
+async def export(ctx: commands.Context, table: str, fmt: str = "csv"):
+    """Stream `users` or `spins` to a file with COPY and attach it when it fits."""
+    if table not in bulk.TABLES or fmt not in bulk.FORMATS:
+        return await ctx.send(f"Usage: {COMMAND_PREFIX}export <{'|'.join(bulk.TABLES)}> [{'|'.join(bulk.FORMATS)}]")
+    os.makedirs(BULK_EXPORT_DIR, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(BULK_EXPORT_DIR, f"{table}-{stamp}.{'csv' if fmt == 'csv' else 'bin'}")
+    async with bot.db_pool.acquire() as conn:
+        rows = await bulk.export_table(conn, table, path, fmt)
+    limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+    if os.path.getsize(path) <= limit:
+        await ctx.send(f"Exported {rows:,} {table} rows.", file=discord.File(path))
+    else:
+        await ctx.send(f"Exported {rows:,} {table} rows to `{path}` (too large to attach).")
+
+@bot.command(name="import")
+@commands.is_owner()
+async def import_rows(ctx: commands.Context, table: str, mode: str = "replace", fmt: str = "csv"):
+    """Merge an attached export into `users` or `spins`: `replace` overwrites, `add` adds to the points."""
+    if table not in bulk.TABLES or mode not in bulk.MODES or fmt not in bulk.FORMATS or not ctx.message.attachments:
+        return await ctx.send(
+            f"Usage: {COMMAND_PREFIX}import <{'|'.join(bulk.TABLES)}> [{'|'.join(bulk.MODES)}] "
+            f"[{'|'.join(bulk.FORMATS)}] with the file attached"
+        )
+    handler = bot.db_handler
+    cache = handler.cache if table == "users" and handler is not None else None
+    # Cached deltas land before balances are rewritten, and no new ones until it is done
+    async with cache.writes_paused() if cache is not None else contextlib.nullcontext():
+        if table == "users" and handler is not None and handler.ledger is not None:
+            await handler.ledger.flush()
+        try:
+            async with aiohttp.ClientSession() as session, bot.db_pool.acquire() as conn:
+                source = bulk.read_url(session, ctx.message.attachments[0].url)
+                result = await bulk.import_table(conn, table, source, fmt, mode)
+        except (ValueError, aiohttp.ClientError, acpg.PostgresError) as e:
+            return await ctx.send(f"Import failed, nothing was changed: {e}")
+    candy = bot.get_cog("CandySpin")
+    if table == "spins" and candy is not None:
+        await candy.seed_leaderboards()
+    await ctx.send(result.summary())
 
 # ============================================================
 # Bot Runner
@@ -115,6 +352,5 @@ if __name__ == "__main__":
         handler = log.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
         bot.run(token=TOKEN, log_handler=handler, log_level=log.DEBUG)
     else:
-        keep_alive()
         bot.run(token=TOKEN)
 
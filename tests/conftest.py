@@ -0,0 +1,26 @@
+import os
+from urllib.parse import urlsplit
+
+import pytest
+
+# Postgres tests run on a database created and dropped on this server; skipped without it
+TEST_DSN = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+async def postgres():
+    if not TEST_DSN:
+        pytest.skip("set TEST_DATABASE_URL to a Postgres server the tests may create databases on")
+    import asyncpg as acpg
+
+    from benchmarks.runner import drop_database, scratch_database
+    from core.migrations import MigrationRunner
+
+    name = await scratch_database(TEST_DSN)
+    pool = await acpg.create_pool(urlsplit(TEST_DSN)._replace(path=f"/{name}").geturl(), min_size=10, max_size=10)
+    try:
+        await MigrationRunner(pool).run()
+        yield pool
+    finally:
+        await pool.close()
+        await drop_database(TEST_DSN, name)
@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+from core import queries, word_index
+
+
+class FakePool:
+    """
+    Stands in for an asyncpg pool under ``DatabaseHandler``. The handler's
+    statements are applied to a dict of accounts and every call is recorded
+    in ``calls``. A statement takes effect between two suspensions, like a
+    round trip; ``reply_delay`` holds extra suspensions before the reply of
+    some statements, so a test can let other calls overtake them.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, Dict] = {}
+        self.spins: Dict[int, Dict] = {}
+        self.calls: List[Tuple[str, str]] = []
+        self.reply_delay: Dict[str, int] = {}
+        self._statements = {
+            queries.FLUSH_BALANCE_DELTAS: self._flush_deltas,
+            queries.GET_OR_CREATE_USER: self._get_or_create,
+            queries.ADD_POINTS: self._add_points,
+            queries.TRANSFER_POINTS: self._transfer,
+            queries.RAIN_POINTS: self._rain,
+            queries.ENSURE_USERS: self._ensure,
+            queries.PROCESS_DAILY_CLAIM: self._daily,
+            queries.SETTLE_BETS: self._settle_bets,
+            queries.SPIN: self._spin,
+        }
+
+    def statements(self) -> int:
+        """Calls recorded since the last ``reset``."""
+        return len(self.calls)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    def balance(self, user_id: int) -> Optional[int]:
+        user = self.users.get(user_id)
+        return None if user is None else user["points"]
+
+    async def _run(self, method: str, query: str, args) -> object:
+        self.calls.append((method, query))
+        await asyncio.sleep(0)
+        result = self._statements[query](*args)
+        for _ in range(self.reply_delay.get(query, 0) + 1):
+            await asyncio.sleep(0)
+        return result
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None) -> str:
+        return await self._run("execute", query, args)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run("fetch", query, args)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run("fetchrow", query, args)
+
+    async def fetchval(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run("fetchval", query, args)
+
+    def _user(self, user_id: int) -> Dict:
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = {
+                "points": 0,
+                "daily_count": 0,
+                "last_daily": datetime.datetime(2000, 1, 1),
+            }
+        return user
+
+    def _flush_deltas(self, user_ids: List[int], deltas: List[int]) -> str:
+        for user_id, delta in zip(user_ids, deltas):
+            self._user(user_id)["points"] += delta
+        return f"INSERT 0 {len(user_ids)}"
+
+    def _get_or_create(self, user_id: int) -> Dict:
+        return dict(self._user(user_id))
+
+    def _add_points(self, user_id: int, amount: int) -> int:
+        user = self._user(user_id)
+        user["points"] += amount
+        return user["points"]
+
+    def _ensure(self, user_ids: List[int]) -> str:
+        created = [u for u in user_ids if u not in self.users]
+        for user_id in created:
+            self._user(user_id)
+        return f"INSERT 0 {len(created)}"
+
+    def _transfer(self, src: int, dst: int, amount: int) -> Dict:
+        return self._rain(src, [dst], amount, src != dst)
+
+    def _rain(self, src: int, recipients: List[int], amount: int, allowed: bool = True) -> Dict:
+        if any(r not in self.users for r in recipients):
+            return {"points": None, "paid": 0, "missing": True}
+        user = self.users.get(src)
+        if not allowed or user is None or user["points"] < amount * len(recipients):
+            return {"points": None, "paid": 0, "missing": False}
+        user["points"] -= amount * len(recipients)
+        for recipient in recipients:
+            self.users[recipient]["points"] += amount
+        return {"points": user["points"], "paid": len(recipients), "missing": False}
+
+    def _daily(self, user_id: int, amount: int, rate: float, now: datetime.datetime, cooldown: float) -> Dict:
+        user = self._user(user_id)
+        remaining = (user["last_daily"] + datetime.timedelta(seconds=cooldown) - now).total_seconds()
+        if remaining > 0:
+            return {"claimed": False, "points": user["points"], "streak": user["daily_count"], "bonus": 0,
+                    "seconds_remaining": remaining}
+        bonus = round(amount * (1 + rate) ** user["daily_count"])
+        streak = user["daily_count"]
+        user["points"] += bonus
+        user["daily_count"] += 1
+        user["last_daily"] = now
+        return {"claimed": True, "points": user["points"], "streak": streak, "bonus": bonus,
+                "seconds_remaining": None}
+
+    def _settle_bets(self, user_id: int, wager: int, payouts: List[int], outcomes: List[str], game: str):
+        user = self.users.get(user_id)
+        if user is None or user["points"] < wager * len(payouts):
+            return None
+        user["points"] += sum(payouts) - wager * len(payouts)
+        return user["points"]
+
+    def _spin(self, user_id: int, points: int, now: datetime.datetime, per_cycle: int, reset_hours: int) -> Dict:
+        row = self.spins.get(user_id)
+        if row is None:
+            row = self.spins[user_id] = {"spins_used": 1, "last_spin": now, "total_points": points, "weekly_points": points}
+            return {"spun": True, **row}
+        expired = row["last_spin"] <= now - datetime.timedelta(hours=reset_hours)
+        if row["spins_used"] >= per_cycle and not expired:
+            return {"spun": False, **row}
+        row["spins_used"] = 1 if expired else row["spins_used"] + 1
+        row["last_spin"] = now
+        row["total_points"] += points
+        row["weekly_points"] += points
+        return {"spun": True, **row}
+
+
+class _Transaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Connection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def transaction(self) -> _Transaction:
+        return _Transaction()
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class _Acquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self) -> _Connection:
+        return _Connection(self.pool)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class WordIndexPool:
+    """
+    The ``word_counts`` and ``word_index_channels`` tables behind ``WordIndex``.
+    ``fail`` makes the next statements raise, like a lost connection.
+    """
+
+    def __init__(self):
+        self.counts: Dict[Tuple[int, str, int], int] = {}
+        self.channels: Dict[int, Dict] = {}
+        self.fail = False
+        self._statements = {
+            word_index.FLUSH_WORD_COUNTS: self._flush_words,
+            word_index.FLUSH_CHANNEL_COUNTS: self._flush_channels,
+            word_index.FETCH_CHANNEL_STATE: self._fetch_state,
+            word_index.SAVE_CHANNEL_STATE: self._save_state,
+            word_index.STALE_CHANNELS: self._stale,
+        }
+
+    def count(self, channel_id: int, token: str) -> int:
+        return sum(n for (c, t, _), n in self.counts.items() if c == channel_id and t == token)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _Acquire:
+        return _Acquire(self)
+
+    async def _run(self, query: str, args):
+        await asyncio.sleep(0)
+        if self.fail:
+            raise ConnectionError("connection lost")
+        return self._statements[query](*args)
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run(query, args)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run(query, args)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None):
+        return await self._run(query, args)
+
+    def _channel(self, channel_id: int) -> Dict:
+        return self.channels.setdefault(channel_id, {
+            "message_count": 0, "oldest_id": None, "synced_id": None, "backfill_done": False, "crawl_started": False,
+        })
+
+    def _flush_words(self, channel_ids, tokens, author_ids, deltas):
+        for key, delta in zip(zip(channel_ids, tokens, author_ids), deltas):
+            self.counts[key] = self.counts.get(key, 0) + delta
+
+    def _flush_channels(self, channel_ids, message_counts, oldest_ids, synced_ids):
+        for channel_id, count, oldest, synced in zip(channel_ids, message_counts, oldest_ids, synced_ids):
+            row = self._channel(channel_id)
+            row["message_count"] += count
+            if row["oldest_id"] is None:
+                row["oldest_id"] = oldest
+            if synced is not None:
+                row["synced_id"] = max(row["synced_id"] or 0, synced)
+
+    def _fetch_state(self, channel_id):
+        row = self.channels.get(channel_id)
+        return None if row is None else dict(row)
+
+    def _save_state(self, channel_id, oldest_id, synced_id, backfill_done, crawl_started):
+        row = self._channel(channel_id)
+        row["oldest_id"] = oldest_id
+        if synced_id is not None:
+            row["synced_id"] = max(row["synced_id"] or 0, synced_id)
+        row["backfill_done"] = backfill_done
+        row["crawl_started"] = row["crawl_started"] or crawl_started
+
+    def _stale(self, session_start):
+        return [
+            {"channel_id": c} for c, row in self.channels.items()
+            if row["synced_id"] is not None and row["synced_id"] < session_start
+        ]
@@ -0,0 +1,74 @@
+import asyncio
+
+from core import queries
+from core.databasehandler import BalanceCache, DatabaseHandler
+from tests.fakes import FakePool
+
+
+async def test_read_overtaken_by_direct_write_is_not_cached():
+    pool = FakePool()
+    pool.users[1] = {"points": 100, "daily_count": 0}
+    handler = DatabaseHandler(pool, cache=BalanceCache(pool, flush_interval_ms=60_000))
+    # The transfer commits and invalidates while the read's reply is still on its way
+    pool.reply_delay[queries.GET_OR_CREATE_USER] = 3
+
+    await asyncio.gather(handler.get_user_balance(1), handler.transfer_point(1, 2, 30))
+
+    assert pool.balance(1) == 70
+    assert (await handler.get_user_balance(1))["points"] == 70
+    await handler.close()
+
+
+async def test_flush_during_read_is_not_counted_twice():
+    pool = FakePool()
+    pool.users[1] = {"points": 100, "daily_count": 0}
+    cache = BalanceCache(pool, flush_interval_ms=60_000)
+    handler = DatabaseHandler(pool, cache=cache)
+    await handler.add_points(1, 5)
+    cache.invalidate(1)
+    pool.reply_delay[queries.GET_OR_CREATE_USER] = 3
+
+    await asyncio.gather(handler.get_user_balance(1), cache.flush())
+
+    assert pool.balance(1) == 105
+    assert (await handler.get_user_balance(1))["points"] == 105
+    await handler.close()
+
+
+async def test_adds_wait_for_a_bulk_rewrite_and_land_after_it():
+    pool = FakePool()
+    pool.users[1] = {"points": 100, "daily_count": 0}
+    cache = BalanceCache(pool, flush_interval_ms=60_000)
+    handler = DatabaseHandler(pool, cache=cache)
+    await handler.add_points(1, 5)
+
+    async with cache.writes_paused():
+        # Pending deltas were written before the rewrite
+        assert pool.balance(1) == 105
+        during = asyncio.create_task(handler.add_points(1, 7))
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert not during.done()
+        pool.users[1]["points"] = 1000
+
+    assert await during == 1007
+    await cache.flush()
+    assert pool.balance(1) == 1007
+    assert (await handler.get_user_balance(1))["points"] == 1007
+    await handler.close()
+
+
+async def test_flush_writes_rows_in_user_id_order():
+    pool = FakePool()
+    cache = BalanceCache(pool, flush_interval_ms=60_000)
+    handler = DatabaseHandler(pool, cache=cache)
+    for user_id in (3, 1, 2):
+        await handler.add_points(user_id, 5)
+    written = []
+    flush = pool._statements[queries.FLUSH_BALANCE_DELTAS]
+    pool._statements[queries.FLUSH_BALANCE_DELTAS] = lambda ids, deltas: written.append(ids) or flush(ids, deltas)
+
+    await cache.flush()
+
+    assert written == [[1, 2, 3]]
+    await handler.close()
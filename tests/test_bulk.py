@@ -0,0 +1,22 @@
+from core.bulk import import_table
+
+
+async def test_users_stay_writable_while_the_file_streams_in(postgres):
+    await postgres.execute("INSERT INTO users (user_id, points) VALUES (1, 10), (2, 20)")
+    writes = []
+
+    async def source():
+        yield b"user_id,points\n1,15\n"
+        # Mid-COPY the bot can still pay users
+        async with postgres.acquire() as conn:
+            await conn.execute("SET lock_timeout = '1s'")
+            writes.append(await conn.execute("UPDATE users SET points = points + 1 WHERE user_id = 2"))
+        yield b"2,25\n"
+
+    async with postgres.acquire() as conn:
+        result = await import_table(conn, "users", source())
+
+    assert writes == ["UPDATE 1"]
+    assert (result.rows, result.updated) == (2, 2)
+    assert dict(await postgres.fetch("SELECT user_id, points FROM users ORDER BY user_id")) == {1: 15, 2: 25}
+
@@ -0,0 +1,86 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fakes import FakeBot, FakeChannel, FakeContext, FakeGuild
+from benchmarks.memory_db import MemoryDatabase
+from cogs.candyspin import ROLES, CandySpin
+
+
+class FakeScheduler:
+    def __init__(self, stored=None):
+        self.stored = stored
+        self.cron = []
+        self.once = []
+
+    async def payload(self, key):
+        return self.stored
+
+    async def schedule_cron(self, key, handler, cron, payload=None):
+        self.cron.append(payload)
+        self.stored = payload
+
+    async def schedule_once(self, handler, run_at, payload=None, key=None):
+        self.once.append((handler, payload))
+
+
+@pytest.fixture
+def cog():
+    bot = FakeBot(None, MemoryDatabase())
+    bot.scheduler = FakeScheduler()
+    return CandySpin(bot)
+
+
+def channel(channel_id, guild=None):
+    return FakeChannel(channel_id, guild or FakeGuild(1))
+
+
+async def test_weekly_role_expiry_covers_only_members_given_the_role(cog):
+    guild = FakeGuild(1)
+    guild.roles = [SimpleNamespace(id=k, name=name) for k, name in enumerate(ROLES.values())]
+    losers_role = next(r for r in guild.roles if r.name == ROLES["losers_week"])
+    week = datetime.datetime.utcnow()
+    await cog.bot.db_handler.load_spins([(user_id, 10, 1, week, 100 - user_id) for user_id in range(1, 9)])
+    for user_id in range(1, 9):
+        guild.member(user_id)
+    # Already holds the role from elsewhere; it must not be taken away later
+    guild.member(7).roles.append(losers_role)
+    cog._last_spin_channel = channel(5, guild)
+
+    await cog.weekly_announce({})
+
+    expiries = {payload["role_id"]: payload["member_ids"] for _, payload in cog.bot.scheduler.once}
+    assert sorted(expiries[losers_role.id]) == [4, 5, 6, 8]
+    for rank, key in enumerate(["top1_week", "top2_week", "top3_week"], start=1):
+        role = next(r for r in guild.roles if r.name == ROLES[key])
+        assert expiries[role.id] == [rank]
+
+
+async def test_spins_store_the_channel_only_when_it_changes(cog):
+    scheduler = cog.bot.scheduler
+    scheduler.stored = {"channel_id": 5}
+    await cog.on_ready()
+    assert scheduler.cron == [{"channel_id": 5}]
+
+    guild = FakeGuild(1)
+    same, other = channel(5, guild), channel(6, guild)
+    for user_id, where in [(1, same), (2, same), (3, other), (4, other), (5, same)]:
+        await cog.spin.callback(cog, FakeContext(cog.bot, guild.member(user_id), where))
+
+    assert scheduler.cron == [{"channel_id": 5}, {"channel_id": 6}, {"channel_id": 5}]
+
+
+async def test_failed_channel_store_is_retried(cog):
+    async def broken(*args, **kwargs):
+        raise ConnectionError("db down")
+
+    guild = FakeGuild(1)
+    where = channel(5, guild)
+    cog.bot.scheduler.schedule_cron = broken
+    await cog.spin.callback(cog, FakeContext(cog.bot, guild.member(1), where))
+    assert cog._announce_channel_id is None
+
+    del cog.bot.scheduler.schedule_cron
+    await cog.spin.callback(cog, FakeContext(cog.bot, guild.member(2), where))
+    assert cog.bot.scheduler.cron == [{"channel_id": 5}]
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from cogs.gamba import CHAMBER, ROULETTE_RETURN, SLOTS_SYMBOLS, WIN_MULTIPLIER
+from core.gamba_engine import roulette_game, roulette_payout, simulate, slots_game, slots_payout, spin_reels
+
+PLAYS = 200_000
+
+
+@pytest.mark.parametrize("game", [
+    slots_game(SLOTS_SYMBOLS, WIN_MULTIPLIER),
+    roulette_game(1, CHAMBER, 100, ROULETTE_RETURN),
+    roulette_game(4, CHAMBER, 7, ROULETTE_RETURN),
+])
+def test_simulated_plays_agree_with_the_closed_form(game):
+    result = simulate(game, PLAYS, budget=60, seed=7)
+
+    assert result.plays == PLAYS
+    assert abs(result.mean - game.expected_value()) < 4 * result.stderr
+
+
+def test_roulette_expected_value_counts_the_rounded_down_payout():
+    game = roulette_game(1, CHAMBER, 100, ROULETTE_RETURN)
+
+    # 100 * 0.95 / (5/6) is 114 on paper but pays 113
+    assert game.outcomes[0].payout == roulette_payout(100, 1, CHAMBER, ROULETTE_RETURN) == 113
+    assert game.expected_value() == pytest.approx(113 * 5 / 6)
+
+
+def test_plays_run_the_command_code():
+    game = slots_game(SLOTS_SYMBOLS, WIN_MULTIPLIER)
+    payouts = [game.play(random.Random(k)) for k in range(500)]
+    expected = [slots_payout(spin_reels(SLOTS_SYMBOLS, rng=random.Random(k)), 100, WIN_MULTIPLIER) for k in range(500)]
+
+    assert payouts == expected
+
+
+@pytest.mark.parametrize("game", [slots_game(SLOTS_SYMBOLS, WIN_MULTIPLIER), roulette_game(4, CHAMBER, 7, ROULETTE_RETURN)])
+def test_draws_cover_every_result_and_pay_the_winning_outcomes(game):
+    assert sum(d.probability for d in game.draws) == pytest.approx(1)
+    assert sum(d.probability * d.payout for d in game.draws) == pytest.approx(game.expected_value())
+
+
+def test_draws_pay_what_a_play_pays():
+    game = slots_game(SLOTS_SYMBOLS, WIN_MULTIPLIER)
+    draws = {d.name: d.payout for d in game.draws}
+
+    for k in range(500):
+        results = spin_reels(SLOTS_SYMBOLS, rng=random.Random(k))
+        assert draws["".join(results)] == game.play(random.Random(k))
@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from core.ledger import LedgerBuffer, LedgerDriftError, rebuild
+from core.metrics import MetricsRegistry
+
+
+class StuckPool:
+    """COPYs wait until ``unstuck`` is set."""
+
+    def __init__(self):
+        self.unstuck = asyncio.Event()
+        self.rows = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def copy_records_to_table(self, table_name, *, records, columns=None):
+        await self.unstuck.wait()
+        self.rows.extend(records)
+        return f"COPY {len(records)}"
+
+
+async def test_full_buffer_waits_for_the_writer_instead_of_dropping():
+    pool = StuckPool()
+    ledger = LedgerBuffer(pool, max_size=2, batch_size=1, flush_interval_ms=1, warn_after=0.01, registry=MetricsRegistry())
+    ledger.start()
+    await ledger.record(1, 5, "add")
+    await asyncio.sleep(0.01)
+    # 1 is stuck in its COPY, 2 and 3 fill the buffer
+    await ledger.record(2, 5, "add")
+    await ledger.record(3, 5, "add")
+
+    waiting = asyncio.create_task(ledger.record(4, 5, "add"))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    pool.unstuck.set()
+    await waiting
+    await ledger.close()
+    assert [row[0] for row in pool.rows] == [1, 2, 3, 4]
+
+
+async def test_rebuild_refuses_to_write_over_drift_unless_forced(postgres):
+    await postgres.execute("INSERT INTO users (user_id, points) VALUES (1, 50)")
+    # The +20 of a crash that never reached the ledger
+    await postgres.execute("INSERT INTO ledger (user_id, delta, reason) VALUES (1, 30, 'add')")
+
+    async with postgres.acquire() as conn:
+        with pytest.raises(LedgerDriftError) as e:
+            await rebuild(conn)
+        assert e.value.drifted == 1
+        assert e.value.records[0]["ledger_points"] == 30
+        assert await conn.fetchval("SELECT points FROM users WHERE user_id = 1") == 50
+
+        assert await rebuild(conn, force=True) == (1, 0)
+        assert await conn.fetchval("SELECT points FROM users WHERE user_id = 1") == 30
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from core.databasehandler import BalanceCache
+from core.keep_alive import HealthServer
+from core.metrics import MetricsRegistry
+from tests.fakes import FakePool
+
+
+class FakeBot:
+    guilds = ()
+    latency = 0.05
+    db_pool = None
+    pool_manager = None
+
+    def __init__(self, cache):
+        self.db_handler = SimpleNamespace(cache=cache)
+
+    def is_ready(self):
+        return True
+
+
+def samples(text: str, name: str) -> dict:
+    lines = [line for line in text.splitlines() if line.startswith(name + "{") or line.startswith(name + " ")]
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in lines}
+
+
+async def test_cache_counters_and_hit_rate_are_separate_metrics():
+    cache = BalanceCache(FakePool())
+
+    async def load(user_id):
+        return {"points": 5, "daily_count": 0}
+
+    for _ in range(3):
+        await cache.get(1, load)
+    registry = MetricsRegistry()
+    HealthServer(FakeBot(cache), registry=registry)
+
+    text = registry.render()
+
+    assert "# TYPE balance_cache_events_total counter" in text
+    events = samples(text, "balance_cache_events_total")
+    assert events['balance_cache_events_total{event="hits"}'] == 2
+    assert events['balance_cache_events_total{event="misses"}'] == 1
+    assert not any("hit_rate" in key or "size" in key or "pending" in key for key in events)
+    assert "# TYPE balance_cache_hit_ratio gauge" in text
+    assert samples(text, "balance_cache_hit_ratio") == {"balance_cache_hit_ratio": 2 / 3}
+    assert samples(text, "balance_cache_entries") == {"balance_cache_entries": 1}
@@ -0,0 +1,73 @@
+from core.migrations import FETCH_APPLIED_MIGRATIONS, MIGRATIONS, Migration, MigrationRunner
+
+
+class FakeConnection:
+    """Records each statement and whether it ran inside a transaction."""
+
+    def __init__(self):
+        self.executed = []
+        self.applied = []
+        self._depth = 0
+
+    def transaction(self):
+        connection = self
+
+        class Transaction:
+            async def __aenter__(self):
+                connection._depth += 1
+
+            async def __aexit__(self, *exc):
+                connection._depth -= 1
+                return False
+
+        return Transaction()
+
+    async def fetch(self, query, *args):
+        assert query == FETCH_APPLIED_MIGRATIONS
+        return self.applied
+
+    async def execute(self, query, *args):
+        self.executed.append((query, self._depth > 0))
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Acquire()
+
+
+async def test_concurrent_index_builds_run_one_by_one_outside_a_transaction():
+    conn = FakeConnection()
+    migrations = [
+        Migration(1, "table", "CREATE TABLE t (a INT, b INT);"),
+        Migration(2, "indexes", """
+            CREATE INDEX CONCURRENTLY t_a_idx ON t (a);
+            CREATE INDEX CONCURRENTLY t_b_idx ON t (b);
+        """, transaction=False),
+    ]
+
+    await MigrationRunner(FakePool(conn), migrations).run()
+
+    ran = [(query, in_transaction) for query, in_transaction in conn.executed if "CONCURRENTLY" in query]
+    assert ran == [
+        ("CREATE INDEX CONCURRENTLY t_a_idx ON t (a)", False),
+        ("CREATE INDEX CONCURRENTLY t_b_idx ON t (b)", False),
+    ]
+    assert ("CREATE TABLE t (a INT, b INT);", True) in conn.executed
+
+
+def test_non_transactional_migrations_split_into_plain_statements():
+    for migration in MIGRATIONS:
+        if not migration.transaction:
+            assert all("$$" not in statement for statement in migration.statements)
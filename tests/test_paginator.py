@@ -0,0 +1,55 @@
+import asyncio
+from typing import Optional
+
+import discord
+
+from core.paginator import PageSource, PaginatorView
+
+
+class SlowCountSource(PageSource):
+    """Five pages; counting them waits until ``counted`` is set."""
+
+    def __init__(self):
+        self.counted = asyncio.Event()
+
+    async def get_page(self, index: int) -> Optional[discord.Embed]:
+        return discord.Embed(title=f"Page {index + 1}") if 0 <= index < 5 else None
+
+    async def page_count(self) -> int:
+        await self.counted.wait()
+        return 5
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, **kwargs):
+        self.sent.append(kwargs)
+        return FakeMessage()
+
+
+async def test_first_page_is_sent_before_the_pages_are_counted():
+    source = SlowCountSource()
+    view = PaginatorView(source=source)
+    channel = FakeChannel()
+
+    message = await view.start(channel)
+
+    assert channel.sent[0]["embed"].title == "Page 1"
+    assert view.jump.label == "1/?"
+    assert not view.next.disabled and not view.last.disabled
+
+    source.counted.set()
+    await view._counting
+    assert view.jump.label == "1/5"
+    assert message.edits == [{"view": view}]
+    view.stop()
@@ -0,0 +1,65 @@
+import pytest
+
+from core.metrics import MetricsRegistry
+from core.migrations import MigrationError
+from core.pool_manager import PoolConfig, PoolManager
+from core.query_tracer import QueryTracer
+
+
+class FakeRawPool:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+def manager(on_connect) -> PoolManager:
+    registry = MetricsRegistry()
+    manager = PoolManager(
+        PoolConfig("postgresql://fake"), QueryTracer(registry=registry), on_connect=on_connect,
+        backoff_base=60, registry=registry,
+    )
+    manager.opened = []
+
+    async def create():
+        pool = FakeRawPool()
+        manager.opened.append(pool)
+        return pool
+
+    manager._create = create
+    return manager
+
+
+async def test_failed_migration_aborts_connect_and_keeps_the_pool_out_of_service():
+    async def migrate(pool):
+        raise MigrationError("migration 3 (memetics) changed after it was applied")
+
+    pools = manager(migrate)
+    with pytest.raises(MigrationError):
+        await pools.connect()
+
+    assert pools.pool.raw is None
+    assert not pools.available
+    assert "MigrationError" in pools.status()
+    # Failing acquires must not start reconnecting behind the error
+    pools.breaker.open()
+    assert pools._task is None
+    await pools.close()
+    assert pools.opened[0].closed
+
+
+async def test_connection_lost_during_the_hook_is_retried_in_the_background():
+    async def migrate(pool):
+        raise ConnectionResetError("server closed the connection")
+
+    pools = manager(migrate)
+    assert not await pools.connect()
+
+    assert pools.pool.raw is None
+    assert pools.fatal_error is None
+    assert pools._task is not None and not pools._task.done()
+    await pools.close()
@@ -0,0 +1,56 @@
+from core.metrics import MetricsRegistry
+from core.query_tracer import QueryTracer, TracedConnection
+
+
+class FakeTransaction:
+    def __init__(self, log):
+        self.log = log
+
+    async def start(self):
+        self.log.append("start")
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def rollback(self):
+        self.log.append("rollback")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def transaction(self):
+        return FakeTransaction(self.log)
+
+    async def execute(self, query, *args):
+        self.log.append(query)
+        return "INSERT 0 1"
+
+    async def copy_records_to_table(self, table_name, *, records, columns=None):
+        self.log.append(("copy", table_name, list(records)))
+        return f"COPY {len(records)}"
+
+
+async def test_copies_and_transactions_are_traced():
+    raw = FakeConnection()
+    tracer = QueryTracer(registry=MetricsRegistry())
+    conn = TracedConnection(raw, tracer)
+
+    async with conn.transaction():
+        await conn.copy_records_to_table("ledger", records=[(1,), (2,)], columns=["user_id"])
+    try:
+        async with conn.transaction():
+            await conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert raw.log == [
+        "start", ("copy", "ledger", [(1,), (2,)]), "commit",
+        "start", "INSERT INTO t VALUES (1)", "rollback",
+    ]
+    stats = tracer.stats
+    assert stats["COPY ledger FROM STDIN"].rows == 2
+    assert stats["BEGIN"].calls == 2
+    assert stats["COMMIT"].calls == 1 and stats["ROLLBACK"].calls == 1
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from core.role_assigner import RoleAssigner
+
+ROLE = SimpleNamespace(id=1, name="🍩LostCandy")
+
+
+def http_error(cls, status: int, retry_after: float = None):
+    headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+    response = SimpleNamespace(status=status, reason="", headers=headers)
+    return cls(response, {"message": "fake", "code": 0})
+
+
+class FakeHTTP:
+    """
+    The role routes of a guild: one shared bucket of ``limit`` requests per
+    ``window`` seconds, answering 429 with Retry-After once it is empty.
+    ``errors`` maps a member id to exceptions raised on its next calls.
+    """
+
+    def __init__(self, limit: int = 1000, window: float = 0.05):
+        self.limit = limit
+        self.window = window
+        self.errors = {}
+        self.calls = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._reset_at = 0.0
+        self._remaining = limit
+
+    async def change_role(self, member: "FakeMember", role, add: bool) -> None:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            queued = self.errors.get(member.id)
+            if queued:
+                raise queued.pop(0)
+            now = time.monotonic()
+            if now >= self._reset_at:
+                self._reset_at, self._remaining = now + self.window, self.limit
+            if not self._remaining:
+                self.rate_limited += 1
+                raise http_error(discord.HTTPException, 429, round(self._reset_at - now, 4))
+            self._remaining -= 1
+            if add:
+                member.roles.append(role)
+            else:
+                member.roles.remove(role)
+        finally:
+            self.in_flight -= 1
+
+
+class FakeMember:
+    def __init__(self, member_id: int, http: FakeHTTP, roles=()):
+        self.id = member_id
+        self.http = http
+        self.roles = list(roles)
+
+    async def add_roles(self, role, reason=None, atomic=True):
+        await self.http.change_role(self, role, True)
+
+    async def remove_roles(self, role, reason=None, atomic=True):
+        await self.http.change_role(self, role, False)
+
+
+def ids(members):
+    return sorted(m.id for m in members)
+
+
+async def test_assign_changes_only_members_without_the_role():
+    http = FakeHTTP()
+    members = [FakeMember(i, http, [ROLE] if i % 3 == 0 else []) for i in range(30)]
+    progress = []
+
+    async def report(done, total):
+        progress.append((done, total))
+
+    result = await RoleAssigner(concurrency=4, progress_every=5).assign(members + members[:5], ROLE, progress=report)
+
+    assert ids(result.changed) == [i for i in range(30) if i % 3]
+    assert ids(result.skipped) == [i for i in range(30) if i % 3 == 0]
+    assert not result.failed
+    assert http.calls == len(result.changed)
+    assert all(ROLE in m.roles for m in members)
+    assert http.max_in_flight <= 4
+    assert progress[0] == (10, 30) and progress[-1] == (30, 30)
+
+
+async def test_remove_skips_members_without_the_role():
+    http = FakeHTTP()
+    members = [FakeMember(i, http, [ROLE] if i % 2 else []) for i in range(10)]
+
+    result = await RoleAssigner().remove(members, ROLE)
+
+    assert ids(result.changed) == [1, 3, 5, 7, 9]
+    assert ids(result.skipped) == [0, 2, 4, 6, 8]
+    assert not any(ROLE in m.roles for m in members)
+
+
+async def test_rate_limited_calls_wait_and_retry():
+    http = FakeHTTP(limit=10, window=0.05)
+    members = [FakeMember(i, http) for i in range(40)]
+
+    result = await RoleAssigner(concurrency=8, max_attempts=10).assign(members, ROLE)
+
+    assert http.rate_limited > 0
+    assert ids(result.changed) == list(range(40))
+    assert http.calls == 40 + http.rate_limited
+    assert all(ROLE in m.roles for m in members)
+
+
+@pytest.mark.parametrize("status", [429, 502])
+async def test_retry_gives_up_after_max_attempts(status):
+    http = FakeHTTP()
+    stuck, fine = FakeMember(1, http), FakeMember(2, http)
+    http.errors[stuck.id] = [http_error(discord.HTTPException, status, 0.001) for _ in range(3)]
+
+    result = await RoleAssigner(max_attempts=3).assign([stuck, fine], ROLE)
+
+    assert ids(result.failed) == [1]
+    assert ids(result.changed) == [2]
+    assert http.calls == 4
+
+
+@pytest.mark.parametrize("error", [
+    http_error(discord.Forbidden, 403),
+    http_error(discord.NotFound, 404),
+    http_error(discord.HTTPException, 400),
+])
+async def test_client_errors_are_not_retried(error):
+    http = FakeHTTP()
+    member = FakeMember(1, http)
+    http.errors[member.id] = [error]
+
+    result = await RoleAssigner().assign([member], ROLE)
+
+    assert ids(result.failed) == [1]
+    assert http.calls == 1
@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+
+from core.scheduler import Scheduler, utcnow
+
+
+async def rows(pool):
+    return {r["job_key"]: r["run_at"] for r in await pool.fetch("SELECT job_key, run_at FROM scheduled_jobs")}
+
+
+async def test_one_shot_jobs_are_deleted_only_after_their_handler_returns(postgres):
+    scheduler = Scheduler(postgres, lease=60)
+    runs = []
+
+    async def flaky(payload):
+        runs.append(payload["n"])
+        if len(runs) == 1:
+            raise RuntimeError("discord is down")
+
+    scheduler.register("flaky", flaky)
+    due = utcnow() - datetime.timedelta(seconds=1)
+    await scheduler.schedule_once("flaky", due, {"n": 1}, key="flaky")
+    # Its handler is not registered, e.g. its cog is being reloaded
+    await scheduler.schedule_once("reloading", due, key="reloading")
+
+    scheduler.start()
+    while not runs:
+        await asyncio.sleep(0.01)
+    await scheduler.close()
+    # The failed run left the job in place, leased, and the other one untouched
+    stored = await rows(postgres)
+    assert stored["flaky"] > utcnow() + datetime.timedelta(seconds=50)
+    assert stored["reloading"] == due
+
+    # Lease over: the next start runs it again and removes it
+    await postgres.execute("UPDATE scheduled_jobs SET run_at = $1 WHERE job_key = 'flaky'", due)
+    scheduler.start()
+    while len(runs) < 2:
+        await asyncio.sleep(0.01)
+    await scheduler.close()
+    assert runs == [1, 1]
+    assert set(await rows(postgres)) == {"reloading"}
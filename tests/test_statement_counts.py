@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from core.databasehandler import BalanceCache, DatabaseHandler
+from tests.fakes import FakePool
+
+NOW = datetime.datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def pool():
+    return FakePool()
+
+
+@pytest.fixture
+def handler(pool):
+    return DatabaseHandler(pool)
+
+
+@pytest.fixture
+async def cached(pool):
+    handler = DatabaseHandler(pool, cache=BalanceCache(pool, flush_interval_ms=60_000))
+    yield handler
+    await handler.close()
+
+
+async def count(pool: FakePool, call) -> int:
+    pool.reset()
+    await call
+    return pool.statements()
+
+
+async def test_every_call_is_one_statement(pool, handler):
+    for user_id in (2, 3, 4):
+        pool.users[user_id] = {"points": 0, "daily_count": 0}
+    assert await count(pool, handler.get_user_balance(1)) == 1
+    assert await count(pool, handler.get_user_streak_count(1)) == 1
+    assert await count(pool, handler.add_points(1, 100)) == 1
+    assert await count(pool, handler.reduce_points(1, 10)) == 1
+    assert await count(pool, handler.process_daily_claim(1, 100, 0.1, 86400)) == 1
+    assert await count(pool, handler.transfer_point(1, 2, 5)) == 1
+    assert await count(pool, handler.rain_points(1, [2, 3, 4], 5)) == 1
+    assert await count(pool, handler.settle_bets(1, "slots", 1, [(5, "win"), (0, "loss")])) == 1
+    assert await count(pool, handler.spin(1, 10, NOW, 3, 24)) == 1
+
+
+async def test_new_accounts_take_one_statement(pool, handler):
+    assert await count(pool, handler.add_points(10, 5)) == 1
+    assert await count(pool, handler.process_daily_claim(11, 100, 0.1, 86400)) == 1
+    assert await count(pool, handler.spin(12, 10, NOW, 3, 24)) == 1
+    assert pool.balance(10) == 5
+    assert pool.balance(11) == 100
+
+
+async def test_paying_a_new_account_creates_it_first(pool, handler):
+    await handler.add_points(1, 100)
+    # The payment finds no row, the row is created, the payment runs again
+    assert await count(pool, handler.transfer_point(1, 20, 5)) == 3
+    assert await count(pool, handler.transfer_point(1, 20, 5)) == 1
+    assert await count(pool, handler.rain_points(1, [20, 21, 22], 5)) == 3
+    assert pool.balance(20) == 15
+    assert pool.balance(22) == 5
+
+
+async def test_cache_serves_reads_and_batches_deltas(pool, cached):
+    assert await count(pool, cached.get_user_balance(1)) == 1
+    assert await count(pool, cached.get_user_balance(1)) == 0
+    assert await count(pool, cached.get_user_streak_count(1)) == 0
+    assert await count(pool, cached.add_points(1, 100)) == 0
+    assert await count(pool, cached.reduce_points(1, 10)) == 0
+    assert pool.balance(1) == 0
+
+    pool.users[2] = {"points": 0, "daily_count": 0}
+    # A direct write needs the sender's deltas in the table first
+    assert await count(pool, cached.transfer_point(1, 2, 5)) == 2
+    assert pool.balance(1) == 85
+    assert await count(pool, cached.transfer_point(1, 2, 5)) == 1
@@ -0,0 +1,104 @@
+import asyncio
+import random
+from collections import defaultdict
+
+import pytest
+
+from core.databasehandler import BalanceCache, DatabaseHandler
+from tests.fakes import FakePool
+
+USERS = 20
+# Recipients past the existing accounts, created by the first payment
+NEW_USERS = 30
+OPENING = 10_000
+OPS = 2000
+
+
+async def stress(handler: DatabaseHandler, cache, balances, seed: int = 0, ops: int = OPS):
+    """``ops`` random adds, transfers, rains and flushes at once; balances must come out exact."""
+    await handler.start()
+    rng = random.Random(seed)
+    expected = defaultdict(int, {user_id: OPENING for user_id in range(USERS)})
+    everyone = range(USERS + NEW_USERS)
+    new = range(USERS, USERS + NEW_USERS)
+
+    async def add(user_id: int, amount: int):
+        await handler.add_points(user_id, amount)
+        expected[user_id] += amount
+
+    async def transfer(src: int, dst: int, amount: int):
+        ok, balance = await handler.transfer_point(src, dst, amount)
+        assert ok
+        if balance is not None:
+            assert balance >= 0
+            expected[src] -= amount
+            expected[dst] += amount
+
+    async def rain(src: int, recipients, amount: int):
+        ok, balance, paid = await handler.rain_points(src, recipients, amount)
+        assert ok
+        if balance is not None:
+            assert balance >= 0
+            expected[src] -= amount * paid
+            for recipient in recipients:
+                expected[recipient] += amount
+
+    async def flush():
+        if cache is not None:
+            await cache.flush()
+
+    calls = []
+    for _ in range(ops):
+        src = rng.randrange(USERS)
+        dst = rng.choice([u for u in everyone if u != src])
+        kind = rng.random()
+        if kind < 0.3:
+            calls.append(transfer(src, dst, rng.randint(1, 60)))
+        elif kind < 0.5:
+            calls.append(add(src, rng.randint(1, 20)))
+        elif kind < 0.9:
+            # Half the rains pay only accounts that may not exist yet, the contended case
+            recipients = rng.sample(new if rng.random() < 0.5 else [u for u in everyone if u != src], 8)
+            calls.append(rain(src, recipients, rng.randint(1, 20)))
+        else:
+            calls.append(flush())
+    await asyncio.gather(*calls)
+    await handler.close()
+
+    assert await balances(everyone) == {user_id: expected[user_id] for user_id in everyone}
+    if cache is not None:
+        assert not any(cache.unflushed(user_id) for user_id in everyone)
+        for user_id in everyone:
+            assert (await handler.get_user_balance(user_id))["points"] == expected[user_id]
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["direct", "cached"])
+async def test_concurrent_transfers_keep_balances_exact(cached):
+    pool = FakePool()
+    cache = BalanceCache(pool, max_size=8, flush_interval_ms=1, max_pending=4) if cached else None
+    for user_id in range(USERS):
+        pool.users[user_id] = {"points": OPENING, "daily_count": 0}
+
+    async def balances(user_ids):
+        return {user_id: pool.balance(user_id) or 0 for user_id in user_ids}
+
+    await stress(DatabaseHandler(pool, cache=cache), cache, balances)
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["direct", "cached"])
+async def test_concurrent_transfers_on_postgres_never_deadlock(postgres, cached):
+    # Real row locks: every statement that fails (a deadlock victim included) fails the test
+    pool = postgres
+    cache = BalanceCache(pool, max_size=8, flush_interval_ms=1, max_pending=4) if cached else None
+    await pool.executemany("INSERT INTO users (user_id, points) VALUES ($1, $2)", [(u, OPENING) for u in range(USERS)])
+
+    async def balances(user_ids):
+        rows = await pool.fetch("SELECT user_id, points FROM users WHERE user_id = ANY($1::bigint[])", list(user_ids))
+        found = {r["user_id"]: r["points"] for r in rows}
+        return {user_id: found.get(user_id, 0) for user_id in user_ids}
+
+    # Short rounds, so many payments race to create the same new accounts
+    for seed in range(20):
+        await stress(DatabaseHandler(pool, cache=cache), cache, balances, seed, ops=100)
+        await pool.execute("UPDATE users SET points = $1", OPENING)
+        await pool.execute("DELETE FROM users WHERE user_id >= $1", USERS)
@@ -0,0 +1,121 @@
+from benchmarks.fakes import FakeChannel, FakeGuild, FakeMessage
+from core.word_index import WordIndex
+from tests.fakes import WordIndexPool
+
+CHANNEL = 10
+# Snowflakes: one session per million
+SESSIONS = [1_000_000, 2_000_000, 3_000_000, 4_000_000]
+
+
+class Chat:
+    """A channel whose history is every message posted so far."""
+
+    def __init__(self, channel_id: int = CHANNEL):
+        self.channel = FakeChannel(channel_id, FakeGuild(1))
+        self.messages = []
+
+    def post(self, message_id: int, content: str = "zamn", author: int = 1) -> FakeMessage:
+        message = FakeMessage(message_id, content, self.channel.guild.member(author), self.channel)
+        self.messages.append(message)
+        self.channel.fill_history(self.messages)
+        return message
+
+
+async def session(pool: WordIndexPool, start: int) -> WordIndex:
+    index = WordIndex(pool, "z!")
+    index.session_start_id = start
+    await index._load_stale()
+    return index
+
+
+async def test_live_counts_of_an_unsynced_channel_are_not_counted_again():
+    pool, chat = WordIndexPool(), Chat()
+    for k in range(5):
+        chat.post(SESSIONS[0] - 100 + k)
+
+    first = await session(pool, SESSIONS[0])
+    await first.sync_channel(chat.channel)
+    for k in range(2):
+        first.record(chat.post(SESSIONS[0] + 1 + k))
+    await first.close()
+    assert pool.count(CHANNEL, "zamn") == 7
+
+    # Posted while offline, then a session that never scans the channel
+    chat.post(SESSIONS[1] - 10)
+    second = await session(pool, SESSIONS[1])
+    second.record(chat.post(SESSIONS[1] + 1))
+    await second.close()
+    assert pool.count(CHANNEL, "zamn") == 7
+
+    third = await session(pool, SESSIONS[2])
+    third.record(chat.post(SESSIONS[2] + 1))
+    await third.flush()
+    assert pool.count(CHANNEL, "zamn") == 7
+    await third.sync_channel(chat.channel)
+    third.record(chat.post(SESSIONS[2] + 2))
+    await third.close()
+
+    assert pool.count(CHANNEL, "zamn") == len(chat.messages) == 11
+    assert pool.channels[CHANNEL]["message_count"] == 11
+    assert pool.channels[CHANNEL]["synced_id"] == SESSIONS[2] + 2
+
+
+async def test_live_counts_start_the_range_of_a_new_channel():
+    pool, chat = WordIndexPool(), Chat()
+    for k in range(3):
+        chat.post(SESSIONS[0] - 100 + k)
+
+    first = await session(pool, SESSIONS[0])
+    first.record(chat.post(SESSIONS[0] + 1))
+    await first.close()
+    assert pool.channels[CHANNEL]["oldest_id"] == SESSIONS[0]
+    assert pool.channels[CHANNEL]["synced_id"] == SESSIONS[0] + 1
+
+    second = await session(pool, SESSIONS[1])
+    await second.sync_channel(chat.channel)
+    await second.close()
+    assert pool.count(CHANNEL, "zamn") == 4
+    assert pool.channels[CHANNEL]["backfill_done"]
+
+
+async def test_held_counts_survive_a_failed_checkpoint():
+    pool, chat = WordIndexPool(), Chat()
+    first = await session(pool, SESSIONS[0])
+    first.record(chat.post(SESSIONS[0] + 1))
+    await first.close()
+
+    chat.post(SESSIONS[1] - 10)
+    second = await session(pool, SESSIONS[1])
+    second.record(chat.post(SESSIONS[1] + 1))
+    pool.fail = True
+    try:
+        await second.sync_channel(chat.channel, backfill=False)
+    except ConnectionError:
+        pass
+    pool.fail = False
+    await second.sync_channel(chat.channel, backfill=False)
+    await second.close()
+
+    assert pool.count(CHANNEL, "zamn") == 3
+
+
+async def test_edits_outside_the_covered_range_are_left_to_the_crawl():
+    pool, chat = WordIndexPool(), Chat()
+    old = chat.post(SESSIONS[0] - 50, "zamn")
+
+    index = await session(pool, SESSIONS[0])
+    index.record(chat.post(SESSIONS[0] + 1, "hello"))
+    await index.flush()
+    edited = FakeMessage(old.id, "bruh", old.author, chat.channel)
+    await index.replace(old, edited)
+    chat.messages[0] = edited
+    chat.channel.fill_history(chat.messages)
+    await index.sync_channel(chat.channel)
+
+    live = chat.messages[1]
+    await index.replace(live, FakeMessage(live.id, "zamn", live.author, chat.channel))
+    await index.close()
+
+    assert pool.count(CHANNEL, "bruh") == 1
+    assert pool.count(CHANNEL, "zamn") == 1
+    assert pool.count(CHANNEL, "hello") == 0